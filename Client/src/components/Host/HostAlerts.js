@@ -20,6 +20,7 @@ function mapApiAlertsToUI(apiAlerts) {
       type: alertType,
       bnbId: alert.bnbId,
       snapshot: alert.snapshot,
+      snapshotMedium: alert.snapshotMedium,
     };
   });
 }
@@ -204,11 +205,21 @@ export function HostAlerts() {
                       {/* Image Display Block */}
                       {alert.snapshot && (
                         <div className="w-full max-w-xs">
-                          <img
-                            src={alert.snapshot}
-                            alt={`Snapshot for alert ${alert.id}`}
-                            className="w-full h-auto max-h-40 object-cover rounded-lg border border-slate-200 shadow-sm"
-                          />
+                          {/* Medium rendition in the list; the original opens on click */}
+                          <a href={alert.snapshot} target="_blank" rel="noreferrer">
+                            <img
+                              src={alert.snapshotMedium || alert.snapshot}
+                              onError={(e) => {
+                                // renditions may be missing for older snapshots
+                                if (e.currentTarget.getAttribute("src") !== alert.snapshot) {
+                                  e.currentTarget.src = alert.snapshot;
+                                }
+                              }}
+                              alt={`Snapshot for alert ${alert.id}`}
+                              loading="lazy"
+                              className="w-full h-auto max-h-40 object-cover rounded-lg border border-slate-200 shadow-sm"
+                            />
+                          </a>
                         </div>
                       )}
 
@@ -10,6 +10,13 @@ const toTitle = (str) =>
     .map((w) => w.charAt(0).toUpperCase() + w.slice(1))
     .join(" ");
 
+// helper: renditions may be missing for older snapshots, so retry once with the original
+const fallBackToOriginal = (e, original) => {
+  if (e.currentTarget.getAttribute("src") !== original) {
+    e.currentTarget.src = original;
+  }
+};
+
 // helper: map backend status to category + label
 const mapStatus = (raw) => {
   if (!raw) {
@@ -45,8 +52,31 @@ const mapStatus = (raw) => {
   return { category: "Other", label: toTitle(s) };
 };
 
+// helper: backend log -> row shown in the table / list
+const normaliseLog = (log, index) => {
+  const { category, label } = mapStatus(log.status);
+
+  return {
+    id: log.id ?? index,
+    time: log.timestamp,
+    guestName: log.user || "Unknown",
+    property: log.bnbName || "Unknown property",
+    // method removed from UI, but we can still keep it here if needed later
+    method: log.method || "Unknown",
+    snapshotPath: log.snapshot,
+    snapshotThumb: log.snapshotThumb,
+    snapshotMedium: log.snapshotMedium,
+    statusRaw: log.status,
+    statusCategory: category,
+    statusLabel: label,
+  };
+};
+
 export function HostLogs() {
   const [logs, setLogs] = useState([]);
+  // Cursor for the next (older) page; null once everything is loaded
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const [statusFilter, setStatusFilter] = useState("All"); // All | Success | Failed
   const [openFilter, setOpenFilter] = useState(false);
@@ -60,24 +90,8 @@ export function HostLogs() {
 
         const res = await api.get("/host/access/logs");
 
-        const normalised = res.data.map((log, index) => {
-          const { category, label } = mapStatus(log.status);
-
-          return {
-            id: log.id ?? index,
-            time: log.timestamp,
-            guestName: log.user || "Unknown",
-            property: log.bnbName || "Unknown property",
-            // method removed from UI, but we can still keep it here if needed later
-            method: log.method || "Unknown",
-            snapshotPath: log.snapshot,
-            statusRaw: log.status,
-            statusCategory: category, 
-            statusLabel: label,
-          };
-        });
-
-        setLogs(normalised);
+        setLogs(res.data.map(normaliseLog));
+        setNextCursor(res.headers["x-next-cursor"] || null);
       } catch (err) {
         console.error("Failed to fetch access logs:", err);
         setError("Failed to load access logs.");
@@ -89,6 +103,23 @@ export function HostLogs() {
     fetchLogs();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      setLoadingMore(true);
+      const res = await api.get("/host/access/logs", {
+        params: { cursor: nextCursor },
+      });
+
+      setLogs((prev) => [...prev, ...res.data.map(normaliseLog)]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (err) {
+      console.error("Failed to fetch more access logs:", err);
+      setError("Failed to load more access logs.");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const filteredLogs =
     statusFilter === "All"
       ? logs
@@ -256,11 +287,15 @@ export function HostLogs() {
                           <td className="py-2 pr-4">
                             {log.snapshotPath &&
                               !log.snapshotPath.startsWith('/uploads/error_') ? (
-                              <img
-                                src={log.snapshotPath}
-                                alt={`Snapshot for ${log.guestName}`}
-                                className="w-12 h-auto rounded-md object-cover"
-                              />
+                              <a href={log.snapshotPath} target="_blank" rel="noreferrer">
+                                <img
+                                  src={log.snapshotThumb || log.snapshotPath}
+                                  onError={(e) => fallBackToOriginal(e, log.snapshotPath)}
+                                  alt={`Snapshot for ${log.guestName}`}
+                                  loading="lazy"
+                                  className="w-12 h-auto rounded-md object-cover"
+                                />
+                              </a>
                             ) : (
                               <span className="text-xs text-slate-400">N/A</span>
                             )}
@@ -298,11 +333,15 @@ export function HostLogs() {
                     <div className="px-4 py-4 space-y-3">
                       {log.snapshotPath &&
                         !log.snapshotPath.startsWith('/uploads/error_') && (
-                        <img
-                          src={log.snapshotPath}
-                          alt={`Snapshot for ${log.guestName}`}
-                          className="w-full h-auto max-h-32 rounded-md object-cover mb-3"
-                        />
+                        <a href={log.snapshotPath} target="_blank" rel="noreferrer">
+                          <img
+                            src={log.snapshotMedium || log.snapshotPath}
+                            onError={(e) => fallBackToOriginal(e, log.snapshotPath)}
+                            alt={`Snapshot for ${log.guestName}`}
+                            loading="lazy"
+                            className="w-full h-auto max-h-32 rounded-md object-cover mb-3"
+                          />
+                        </a>
                       )}
 
                       <div className="flex items-start justify-between">
@@ -330,6 +369,18 @@ export function HostLogs() {
                 );
               })}
             </div>
+
+            {nextCursor && (
+              <div className="flex justify-center">
+                <button
+                  onClick={loadMore}
+                  disabled={loadingMore}
+                  className="px-4 py-2 rounded-lg border border-slate-200 text-sm hover:bg-slate-50 disabled:opacity-50"
+                >
+                  {loadingMore ? "Loading..." : "Load older events"}
+                </button>
+              </div>
+            )}
           </>
         )}
       </main>
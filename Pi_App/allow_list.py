@@ -0,0 +1,118 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+ALLOW_LIST_SIGNING_KEY = os.getenv("ALLOW_LIST_SIGNING_KEY")
+ALLOW_LIST_PATH = os.getenv("ALLOW_LIST_PATH", "/home/pi/allow_list.json")
+# An old list may miss revocations, so stop granting from it after this long without an update
+ALLOW_LIST_MAX_AGE_HOURS = float(os.getenv("ALLOW_LIST_MAX_AGE_HOURS", "24"))
+
+
+def _signature(payload, key):
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hmac.new(key.encode(), canonical.encode(), hashlib.sha256).hexdigest()
+
+
+def verify(message, key=ALLOW_LIST_SIGNING_KEY):
+    """True if the message carries a valid server signature."""
+    if not key or "sig" not in message:
+        return False
+    payload = {k: v for k, v in message.items() if k not in ("sig", "source")}
+    return hmac.compare_digest(message["sig"], _signature(payload, key))
+
+
+# ----------------------
+# Local Allow-list
+# ----------------------
+class AllowList:
+    """
+    Signed list of fob windows pushed by the server (UID -> [[from, until], ...]).
+
+    Full copies replace the list; deltas apply on top of the version they were
+    built from. A delta for another version is rejected so the caller can ask
+    for a full copy, and so is a full copy older than the current list (a
+    replayed message could otherwise bring back revoked fobs). The signed messages since the last full copy are saved
+    to ALLOW_LIST_PATH and replayed on boot, so the door still works after a
+    reboot without network and a tampered file is ignored.
+    """
+    def __init__(self, path=ALLOW_LIST_PATH, key=ALLOW_LIST_SIGNING_KEY):
+        self._path = path
+        self._key = key
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._messages = []      # last full copy + deltas applied since, as received
+        self.version = 0
+        self.updated_at = 0.0
+        self._load()
+
+    def apply(self, message):
+        """Returns False if the message is unsigned/invalid, an older full copy, or a delta that does not follow our version."""
+        if not verify(message, self._key):
+            print("Allow-list update rejected: bad signature.")
+            return False
+
+        with self._lock:
+            if not self._apply(message):
+                return False
+            self.updated_at = message.get("issued_at", time.time())
+            self._save()
+        return True
+
+    def _apply(self, message):
+        """Caller holds _lock and has verified the signature."""
+        if message.get("kind") == "full" and message.get("version", 0) >= self.version:
+            self._entries = dict(message.get("entries", {}))
+            self._messages = [message]
+        elif message.get("kind") == "delta" and message.get("base_version") == self.version:
+            for uid, windows in message.get("upsert", {}).items():
+                self._entries[uid] = windows
+            for uid in message.get("remove", []):
+                self._entries.pop(uid, None)
+            self._messages.append(message)
+        else:
+            return False
+
+        self.version = message["version"]
+        return True
+
+    def check(self, uid, now=None):
+        """Constant-time lookup: True if the UID has a window covering now."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if not self.version or now - self.updated_at > ALLOW_LIST_MAX_AGE_HOURS * 3600:
+                return False
+            windows = self._entries.get(uid)
+        return bool(windows) and any(start <= now <= end for start, end in windows)
+
+    def _save(self):
+        try:
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w") as list_file:
+                json.dump({"messages": self._messages}, list_file)
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            print(f"Could not save allow-list: {e}")
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path) as list_file:
+                saved = json.load(list_file)
+        except (OSError, ValueError) as e:
+            print(f"Could not read allow-list: {e}")
+            return
+
+        with self._lock:
+            for message in saved.get("messages", []):
+                if not verify(message, self._key) or not self._apply(message):
+                    break
+                # Age is taken from the signed messages, not the file
+                self.updated_at = message.get("issued_at", 0)
+        print(f"Loaded allow-list version {self.version} ({len(self._entries)} fobs).")
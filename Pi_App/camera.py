@@ -0,0 +1,236 @@
+import os
+import time
+import argparse
+import threading
+import subprocess
+from collections import deque
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+CAMERA_BACKEND = os.getenv("CAMERA_BACKEND", "rpicam")          # rpicam | simulated
+CAMERA_WIDTH = int(os.getenv("CAMERA_WIDTH", "1920"))
+CAMERA_HEIGHT = int(os.getenv("CAMERA_HEIGHT", "1080"))
+CAMERA_FPS = float(os.getenv("CAMERA_FPS", "5"))
+CAMERA_RING_FRAMES = int(os.getenv("CAMERA_RING_FRAMES", "15"))  # ~3s of history at 5 fps
+CAMERA_PRE_ROLL_SECONDS = float(os.getenv("CAMERA_PRE_ROLL_SECONDS", "0.2"))
+CAMERA_FRAME_TIMEOUT_SECONDS = float(os.getenv("CAMERA_FRAME_TIMEOUT_SECONDS", "2"))
+CAMERA_SIM_FRAME_KB = int(os.getenv("CAMERA_SIM_FRAME_KB", "250"))
+
+CAPTURE_DIR = os.getenv("CAPTURE_DIR", "/home/pi/captures")
+
+RPICAM_VID = "/usr/bin/rpicam-vid"
+
+JPEG_SOI = b"\xff\xd8"
+JPEG_EOI = b"\xff\xd9"
+
+
+# ----------------------
+# Frame Ring Buffer
+# ----------------------
+class FrameRing:
+    """Last N JPEG frames with their capture time; readers can wait for a newer frame."""
+    def __init__(self, size=CAMERA_RING_FRAMES):
+        self._frames = deque(maxlen=size)    # (timestamp, jpeg bytes)
+        self._cond = threading.Condition()
+        self.total = 0
+
+    def push(self, jpeg):
+        with self._cond:
+            self._frames.append((time.time(), jpeg))
+            self.total += 1
+            self._cond.notify_all()
+
+    def frame_at(self, when, timeout=CAMERA_FRAME_TIMEOUT_SECONDS):
+        """
+        Returns (timestamp, jpeg) closest to 'when'. If no frame that recent
+        exists yet, waits up to timeout for one. None if the camera has no frames.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._frames or self._frames[-1][0] < when:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            if not self._frames:
+                return None
+            return min(self._frames, key=lambda frame: abs(frame[0] - when))
+
+    def __len__(self):
+        with self._cond:
+            return len(self._frames)
+
+
+# ----------------------
+# Camera Backends
+# ----------------------
+class CameraBackend:
+    """
+    Keeps the camera open and fills a FrameRing from a background thread,
+    so a tap takes a frame that already exists instead of starting the camera.
+    """
+    name = "base"
+
+    def __init__(self):
+        self.ring = FrameRing()
+        self._running = threading.Event()
+        self._thread = None
+        self.restarts = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f"camera-{self.name}", daemon=True)
+        self._thread.start()
+        print(f"Camera ({self.name}) started: {CAMERA_WIDTH}x{CAMERA_HEIGHT} @ {CAMERA_FPS} fps, "
+              f"ring of {CAMERA_RING_FRAMES} frames.")
+
+    def stop(self):
+        self._running.clear()
+
+    def _run(self):
+        raise NotImplementedError
+
+    def capture(self, id_tag, at=None):
+        """
+        Saves the frame nearest to the event (at = event time, default now,
+        minus CAMERA_PRE_ROLL_SECONDS) and returns (path, filename) like the
+        old rpicam-still capture. Returns (None, None) if no frame is available.
+        """
+        at = time.time() if at is None else at
+        frame = self.ring.frame_at(at - CAMERA_PRE_ROLL_SECONDS)
+        if frame is None:
+            print("Camera has no frames to capture.")
+            return None, None
+
+        timestamp, jpeg = frame
+        filename = f"{id_tag}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(timestamp))}.jpg"
+        path = os.path.join(CAPTURE_DIR, filename)
+        with open(path, "wb") as image_file:
+            image_file.write(jpeg)
+        return path, filename
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "frames": self.ring.total,
+            "buffered": len(self.ring),
+            "restarts": self.restarts,
+        }
+
+
+class RpicamCamera(CameraBackend):
+    """
+    One long-lived rpicam-vid process streaming MJPEG to stdout; the stream
+    is split into JPEG frames on the start/end-of-image markers. The process
+    is restarted if it exits.
+    """
+    name = "rpicam"
+
+    def _run(self):
+        failures = 0
+        while self._running.is_set():
+            frames_before = self.ring.total
+            try:
+                self._stream()
+            except Exception as e:
+                print(f"Camera stream error: {e}")
+            if not self._running.is_set():
+                break
+
+            self.restarts += 1
+            failures = 0 if self.ring.total > frames_before else failures + 1
+            time.sleep(min(2 ** failures, 30))
+
+    def _stream(self):
+        proc = subprocess.Popen([
+            RPICAM_VID,
+            "-t", "0",
+            "--codec", "mjpeg",
+            "--nopreview",
+            "--width", str(CAMERA_WIDTH),
+            "--height", str(CAMERA_HEIGHT),
+            "--framerate", str(CAMERA_FPS),
+            "-o", "-",
+        ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        buffer = b""
+        try:
+            while self._running.is_set():
+                chunk = proc.stdout.read(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+
+                while True:
+                    start = buffer.find(JPEG_SOI)
+                    if start < 0:
+                        buffer = buffer[-1:]    # keep a possible half marker
+                        break
+                    end = buffer.find(JPEG_EOI, start + 2)
+                    if end < 0:
+                        buffer = buffer[start:]
+                        break
+                    self.ring.push(buffer[start:end + 2])
+                    buffer = buffer[end + 2:]
+        finally:
+            proc.kill()
+            proc.wait()
+
+
+class SimulatedCamera(CameraBackend):
+    """Produces fake JPEG-sized frames at CAMERA_FPS, for benchmarking without camera hardware."""
+    name = "simulated"
+
+    def _run(self):
+        interval = 1.0 / CAMERA_FPS
+        while self._running.is_set():
+            self.ring.push(JPEG_SOI + os.urandom(CAMERA_SIM_FRAME_KB * 1024) + JPEG_EOI)
+            time.sleep(interval)
+
+
+CAMERA_BACKENDS = {
+    "rpicam": RpicamCamera,
+    "simulated": SimulatedCamera,
+}
+
+
+def create_camera(backend=CAMERA_BACKEND):
+    os.makedirs(CAPTURE_DIR, exist_ok=True)
+    if backend not in CAMERA_BACKENDS:
+        print(f"Unknown CAMERA_BACKEND '{backend}', using rpicam.")
+        backend = "rpicam"
+    return CAMERA_BACKENDS[backend]()
+
+
+# ----------------------
+# Benchmark
+# ----------------------
+if __name__ == "__main__":
+    # python camera.py --backend simulated --taps 20
+    parser = argparse.ArgumentParser(description="Measure tap-to-frame latency of a camera backend.")
+    parser.add_argument("--backend", default=CAMERA_BACKEND, choices=sorted(CAMERA_BACKENDS))
+    parser.add_argument("--taps", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between simulated taps")
+    args = parser.parse_args()
+
+    camera = create_camera(args.backend)
+    camera.start()
+    time.sleep(1.0)  # warm-up happens once at boot, not per tap
+
+    latencies = []
+    for i in range(args.taps):
+        started = time.perf_counter()
+        path, _ = camera.capture(f"BENCH{i}")
+        latencies.append((time.perf_counter() - started) * 1000)
+        if path:
+            os.remove(path)
+        time.sleep(args.interval)
+
+    latencies.sort()
+    print(f"{args.backend}: {args.taps} captures, "
+          f"p50 {latencies[len(latencies) // 2]:.1f} ms, max {latencies[-1]:.1f} ms, {camera.stats()}")
+    camera.stop()
@@ -0,0 +1,166 @@
+import time
+import argparse
+import threading
+from gpio_backend import IDLE_STATE, create_gpio
+
+# ----------------------
+# Effect Patterns
+# ----------------------
+# Each step is (seconds, outputs); outputs not named in a step fall back to IDLE_STATE.
+# When a pattern ends (or is preempted) the outputs return to idle: red on, door locked.
+def _repeat(steps, times):
+    return [step for _ in range(times) for step in steps]
+
+
+PRIORITY_TAP = 10
+PRIORITY_DECISION = 20
+PRIORITY_TAMPER = 100
+
+EFFECTS = {
+    # Card read, waiting for a decision: beep, then yellow until the server answers
+    "tap": (PRIORITY_TAP, [
+        (1.0, {"red": False, "yel": True, "buzz": 4000}),
+        (4.0, {"red": False, "yel": True}),
+    ]),
+    "granted": (PRIORITY_DECISION, [
+        (5.0, {"red": False, "grn": True, "relay": "open"}),
+    ]),
+    "granted_no_face": (PRIORITY_DECISION, _repeat([
+        (0.3, {"red": False, "grn": True, "yel": True, "buzz": 3000, "relay": "open"}),
+        (0.3, {"red": False, "grn": True, "buzz": 3000, "relay": "open"}),
+    ], 3) + [
+        (2.0, {"red": False, "grn": True, "relay": "open"}),
+    ]),
+    "denied": (PRIORITY_DECISION, _repeat([
+        (0.3, {"red": True}),
+        (0.3, {"red": False, "buzz": 3000}),
+    ], 3)),
+    # Face check failed after a grant: lock straight away (idle is locked), then the deny pattern
+    "revoked": (PRIORITY_DECISION, _repeat([
+        (0.3, {"red": True}),
+        (0.3, {"red": False, "buzz": 3000}),
+    ], 3)),
+    "tamper": (PRIORITY_TAMPER, _repeat([
+        (0.1, {"red": True, "buzz": 3000}),
+        (0.1, {"red": False, "yel": True}),
+    ], 10)),
+}
+
+
+# ----------------------
+# Effect Scheduler
+# ----------------------
+class EffectScheduler:
+    """
+    Plays LED/buzzer/relay patterns on one background thread so PubNub
+    callbacks and the NFC loop never sleep.
+
+    play() returns at once. A request of equal or higher priority preempts
+    the running pattern (a newer decision replaces an older one, tamper
+    overrides a grant); a lower-priority request is dropped. Only the newest
+    pending request is kept. latch() holds a minimum priority until
+    release(), so nothing can unlock the door while the tamper alarm is on.
+    on_start, if given, is called on the effects thread once the pattern's
+    first step is on the outputs (used to time relay actuation).
+    """
+    def __init__(self, gpio):
+        self._gpio = gpio
+        self._cond = threading.Condition()
+        self._current = None     # (name, priority) being played
+        self._next = None        # (name, priority, steps, on_start) waiting to start
+        self._latched = 0
+        self.played = 0
+        self.preempted = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="effects", daemon=True)
+        self._thread.start()
+
+    def play(self, name, on_start=None):
+        """Queues an effect; False if it was dropped for a higher-priority one."""
+        priority, steps = EFFECTS[name]
+        with self._cond:
+            floor = max(self._latched, self._current[1] if self._current else 0)
+            if self._next is not None:
+                floor = max(floor, self._next[1])
+            if priority < floor:
+                self.dropped += 1
+                return False
+
+            self._next = (name, priority, steps, on_start)
+            self._cond.notify_all()
+        return True
+
+    def latch(self, priority=PRIORITY_TAMPER):
+        with self._cond:
+            self._latched = priority
+
+    def release(self):
+        """Clears the latch and anything still playing, returning to idle."""
+        with self._cond:
+            self._latched = 0
+            self._next = ("idle", 0, [], None)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._next is not None)
+                name, priority, steps, on_start = self._next
+                self._next = None
+                self._current = (name, priority)
+
+            self._perform(steps, on_start)
+
+            with self._cond:
+                self._current = None
+                self.played += 1
+
+    def _perform(self, steps, on_start=None):
+        for seconds, outputs in steps:
+            self._gpio.write({**IDLE_STATE, **outputs})
+            if on_start is not None:
+                on_start()
+                on_start = None
+            with self._cond:
+                if self._cond.wait_for(lambda: self._next is not None, timeout=seconds):
+                    self.preempted += 1
+                    break
+        self._gpio.write(IDLE_STATE)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "current": self._current[0] if self._current else None,
+                "played": self.played,
+                "preempted": self.preempted,
+                "dropped": self.dropped,
+                "latched": self._latched,
+            }
+
+
+# ----------------------
+# Timing Check
+# ----------------------
+if __name__ == "__main__":
+    # python effects.py -> plays a grant, preempts it with a tamper, then tries to grant during the latch
+    parser = argparse.ArgumentParser(description="Play effects on the simulated GPIO and print the output timeline.")
+    parser.add_argument("--backend", default="simulated")
+    args = parser.parse_args()
+
+    gpio = create_gpio(args.backend)
+    effects = EffectScheduler(gpio)
+    started = time.monotonic()
+
+    effects.play("granted")
+    time.sleep(0.5)
+    effects.play("tamper")
+    effects.latch()
+    time.sleep(0.1)
+    print("grant during tamper accepted:", effects.play("granted"))
+    time.sleep(2.5)
+    effects.release()
+    time.sleep(0.1)
+
+    for at, changed in getattr(gpio, "log", []):
+        print(f"{(at - started) * 1000:8.1f} ms  {changed}")
+    print(effects.stats())
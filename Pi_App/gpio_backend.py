@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+GPIO_BACKEND = os.getenv("GPIO_BACKEND", "rpi")      # rpi | simulated
+
+# ----------------------
+# Pins (BCM)
+# ----------------------
+LED_RED = 22
+LED_YEL = 23
+LED_GRN = 24
+BUZZ = 18
+RELAY_PIN = 17
+TAMP = 27
+
+# Everything off, red on, door locked
+IDLE_STATE = {"red": True, "yel": False, "grn": False, "buzz": 0, "relay": "locked"}
+
+
+# ----------------------
+# Raspberry Pi GPIO
+# ----------------------
+class RPiGPIO:
+    """LEDs, buzzer (PWM) and relay on the real board."""
+    name = "rpi"
+
+    def __init__(self):
+        import RPi.GPIO as GPIO
+        from gpiozero import OutputDevice
+
+        self._GPIO = GPIO
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(LED_RED, GPIO.OUT)
+        GPIO.setup(LED_YEL, GPIO.OUT)
+        GPIO.setup(LED_GRN, GPIO.OUT)
+        GPIO.setup(BUZZ, GPIO.OUT)
+        GPIO.setup(TAMP, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+        self._relay = OutputDevice(RELAY_PIN, active_high=False)
+        self._buzzer_pwm = GPIO.PWM(BUZZ, 3000)
+        self._buzzer_pwm_started = False
+        self._state = {}
+
+    def write(self, state):
+        """Applies an output state, touching only the outputs that changed."""
+        changed = {key: value for key, value in state.items() if self._state.get(key) != value}
+        for key, value in changed.items():
+            if key == "red":
+                self._GPIO.output(LED_RED, value)
+            elif key == "yel":
+                self._GPIO.output(LED_YEL, value)
+            elif key == "grn":
+                self._GPIO.output(LED_GRN, value)
+            elif key == "buzz":
+                self._buzzer(value)
+            elif key == "relay" and value == "locked":
+                self._relay.on()
+            elif key == "relay":
+                self._relay.off()
+        self._state.update(changed)
+
+    def _buzzer(self, freq, duty=50):
+        if freq:
+            self._buzzer_pwm.ChangeFrequency(freq)
+            if not self._buzzer_pwm_started:
+                self._buzzer_pwm.start(duty)
+                self._buzzer_pwm_started = True
+            else:
+                self._buzzer_pwm.ChangeDutyCycle(duty)
+        elif self._buzzer_pwm_started:
+            self._buzzer_pwm.ChangeDutyCycle(0)
+
+    def read(self, pin):
+        return self._GPIO.input(pin) == self._GPIO.HIGH
+
+    def watch(self, pin, callback):
+        """Calls callback() from the GPIO thread on every rising or falling edge."""
+        self._GPIO.add_event_detect(pin, self._GPIO.BOTH, callback=lambda channel: callback())
+
+    def cleanup(self):
+        self._buzzer(0)
+        self._buzzer_pwm.stop()
+        self._GPIO.cleanup()
+
+
+# ----------------------
+# Simulated GPIO
+# ----------------------
+class SimulatedGPIO:
+    """
+    Records every output change with a timestamp instead of driving pins,
+    so effect timing can be checked on a machine without the hardware.
+    Inputs are set with set_input(), which fires edge callbacks like the
+    real pins do.
+    """
+    name = "simulated"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = {}
+        self.log = []            # (monotonic time, {changed outputs})
+        self._inputs = {TAMP: False}
+        self._watchers = {}      # pin -> [callback]
+
+    def write(self, state):
+        with self._lock:
+            changed = {key: value for key, value in state.items() if self.state.get(key) != value}
+            if changed:
+                self.state.update(changed)
+                self.log.append((time.monotonic(), changed))
+
+    def read(self, pin):
+        with self._lock:
+            return self._inputs.get(pin, False)
+
+    def watch(self, pin, callback):
+        with self._lock:
+            self._watchers.setdefault(pin, []).append(callback)
+
+    def set_input(self, pin, value):
+        with self._lock:
+            changed = self._inputs.get(pin, False) != value
+            self._inputs[pin] = value
+            callbacks = list(self._watchers.get(pin, [])) if changed else []
+        for callback in callbacks:
+            callback()
+
+    def cleanup(self):
+        pass
+
+
+GPIO_BACKENDS = {
+    "rpi": RPiGPIO,
+    "simulated": SimulatedGPIO,
+}
+
+
+def create_gpio(backend=GPIO_BACKEND):
+    if backend not in GPIO_BACKENDS:
+        print(f"Unknown GPIO_BACKEND '{backend}', using rpi.")
+        backend = "rpi"
+    gpio = GPIO_BACKENDS[backend]()
+    gpio.write(IDLE_STATE)
+    return gpio
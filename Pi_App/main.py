@@ -1,16 +1,26 @@
 import os
 import time
-import subprocess
+import uuid
+import queue
+import threading
+from collections import OrderedDict
 import board
 import busio
 import boto3
-import RPi.GPIO as GPIO
-from gpiozero import OutputDevice
 from adafruit_pn532.i2c import PN532_I2C
 
 from dotenv import load_dotenv
 load_dotenv()
 
+from camera import create_camera
+from gpio_backend import create_gpio
+from effects import EFFECTS, EffectScheduler
+from tamper import TamperMonitor, TAMPERED, CLEARED
+from upload_spool import UploadSpool
+from tap_guard import TapGuard
+from tap_trace import TraceBook
+from allow_list import AllowList
+
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub import PubNub
 from pubnub.callbacks import SubscribeCallback
@@ -31,6 +41,11 @@ AWS_BUCKET = os.getenv("AWS_BUCKET")
 
 # Flag to track if the alarm is currently active
 tamper_alarm_active = False 
+alarm_cleared = threading.Event()
+alarm_cleared.set()
+
+# One access attempt per card presentation (tap_guard.py); suppressed reads are counted
+tap_guard = TapGuard()
 
 # ----------------------
 # AWS S3 SETUP
@@ -42,24 +57,6 @@ s3 = boto3.client(
     aws_secret_access_key=AWS_SECRET_KEY
 )
 
-def upload_to_s3(filepath, filename):
-    try:
-        s3.upload_file(
-            filepath,
-            AWS_BUCKET,
-            filename,
-            ExtraArgs={}
-        )
-        print(f"Upload complete for {filename}.")
-
-        # Delete local file after successful upload
-        os.remove(filepath)
-        return filename
-
-    except Exception as e:
-        print(f"Upload failed for {filepath}: {e}")
-        return None
-
 # ----------------------
 # PubNub Setup
 # ----------------------
@@ -74,43 +71,72 @@ pnconfig.crypto_module = AesCbcCryptoModule(pnconfig)
 
 pubnub = PubNub(pnconfig)
 
+# Per-tap stage timings (tap_trace.py); any message with a tap_id carries the spans recorded since the last one
+traces = TraceBook()
+
+def publish_message(message):
+    # Every message carries an event_id so the server can drop redeliveries and retries
+    message.setdefault("event_id", uuid.uuid4().hex)
+    traces.attach(message)
+    pubnub.publish().channel(CHANNEL).message(message).sync()
+
+# ----------------------
+# Upload Spool
+# ----------------------
+# Captures are journalled on disk and uploaded with retries (upload_spool.py); the
+# follow-up message linking each upload to its tap/tamper event is sent once it lands
+spool = UploadSpool(s3, AWS_BUCKET, publish_message,
+                    on_upload=lambda message, started, finished: traces.mark(message.get("tap_id"), "upload", started, finished))
+
 # ----------------------
 # GPIO Setup
 # ----------------------
-GPIO.setmode(GPIO.BCM)
-
-LED_RED = 22
-LED_YEL = 23
-LED_GRN = 24
-BUZZ = 18
-RELAY = OutputDevice(17, active_high=False)
-TAMP = 27
-
-GPIO.setup(LED_RED, GPIO.OUT)
-GPIO.setup(LED_YEL, GPIO.OUT)
-GPIO.setup(LED_GRN, GPIO.OUT)
-GPIO.setup(BUZZ, GPIO.OUT)
-buzzer_pwm = GPIO.PWM(BUZZ, 3000) 
-buzzer_pwm_started = False
-
-GPIO.setup(TAMP, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-GPIO.output(LED_RED, True)  #Default state: Red ON
-RELAY.on() #Door locked 
-
-def buzzer_on(freq=3000, duty=50):
-    global buzzer_pwm_started
-    buzzer_pwm.ChangeFrequency(freq)
-    if not buzzer_pwm_started:
-        buzzer_pwm.start(duty)
-        buzzer_pwm_started = True
-    else:
-        buzzer_pwm.ChangeDutyCycle(duty)
-
-def buzzer_off():
-    global buzzer_pwm_started
-    if buzzer_pwm_started:
-        buzzer_pwm.ChangeDutyCycle(0)
+# Pins and drivers live in gpio_backend.py (GPIO_BACKEND=rpi | simulated); starts red, door locked
+gpio = create_gpio()
+
+# LED/buzzer/relay patterns run on their own thread (effects.py), so nothing here sleeps
+effects = EffectScheduler(gpio)
+
+# Decision effects report when they reach the outputs, so the trace shows the relay actuation
+trace_reports = queue.Queue()
+
+def play_effect(name, tap_id=None, report=True):
+    """effects.play() that records on the tap's trace how long the pattern took to reach the outputs."""
+    if tap_id is None:
+        return effects.play(name)
+    requested = time.monotonic()
+
+    def started():
+        traces.mark(tap_id, f"effect_{name}", requested, time.monotonic())
+        if report:
+            trace_reports.put(tap_id)
+
+    return effects.play(name, on_start=started)
+
+def trace_report_worker():
+    while True:
+        tap_id = trace_reports.get()
+        message = traces.attach({"type": "trace", "tap_id": tap_id})
+        if "trace" not in message:
+            continue
+        try:
+            publish_message(message)
+        except Exception as e:
+            print(f"Failed to send trace for tap {tap_id}: {e}")
+
+threading.Thread(target=trace_report_worker, name="trace-report", daemon=True).start()
+
+# Decision each recent tap is showing, so a final decision that only confirms it is not replayed
+shown_decisions = OrderedDict()
+
+def show_decision(access, tap_id=None):
+    if tap_id is not None:
+        if shown_decisions.get(tap_id) == access:
+            return
+        shown_decisions[tap_id] = access
+        while len(shown_decisions) > 200:
+            shown_decisions.popitem(last=False)
+    play_effect(access, tap_id)
 
 # ----------------------
 # PN532 NFC Reader
@@ -122,123 +148,86 @@ pn532.SAM_configuration()
 # ----------------------
 # Camera
 # ----------------------
-CAPTURE_DIR = "/home/pi/captures"
-os.makedirs(CAPTURE_DIR, exist_ok=True)
-
-RPICAM = "/usr/bin/rpicam-still"
-
-def take_photo(id_tag):
-    filename = f"{id_tag}_{time.strftime('%Y%m%d_%H%M%S')}.jpg"
-    path = os.path.join(CAPTURE_DIR, filename)
-
-    subprocess.run([
-        RPICAM,
-        "-o", path,
-        "-t", "1000",
-        "--nopreview",
-        "--width", "1920",
-        "--height", "1080"
-    ], check=True)
+# Kept open for the life of the process; see camera.py (CAMERA_BACKEND=rpicam | simulated)
+camera = create_camera()
+camera.start()
 
-    return path, filename
+def take_photo(id_tag, at=None):
+    """Frame from the camera's ring buffer nearest to 'at' (default now)."""
+    return camera.capture(id_tag, at)
 
 # ----------------------
 # Tamper Switch & Logic
 # ----------------------
-def tampered_with():
-    return GPIO.input(TAMP) == GPIO.HIGH
+# Edge callbacks with debounce on the TAMP pin (tamper.py); events arrive on tamper.events
+tamper = TamperMonitor(gpio)
 
 def reset_tamper_alarm():
+    global tamper_alarm_active
+
     print("Tamper alarm reset")
-    
-    GPIO.output(LED_RED, True)
-    GPIO.output(LED_YEL, False)
-    GPIO.output(LED_GRN, False)
-    buzzer_off()
-    RELAY.on()
+    effects.release()
+    tamper_alarm_active = False #Reset the state
+    alarm_cleared.set()
 
 
-def handle_tamper():
+def handle_tamper(triggered_at):
     global tamper_alarm_active
     
     print("TAMPER DETECTED! Initiating alarm and capture.")
     tamper_alarm_active = True #global state
-    
-    RELAY.on()
-    GPIO.output(LED_GRN, False)
-    for _ in range(10):
-        GPIO.output(LED_RED, True)
-        GPIO.output(LED_YEL, False)
-        buzzer_on(freq=3000, duty=50)
-        time.sleep(0.1)
-        GPIO.output(LED_RED, False)
-        GPIO.output(LED_YEL, True)
-       
-        buzzer_off()
-        time.sleep(0.1)
-        
-    GPIO.output(LED_RED, True)
-    GPIO.output(LED_YEL, False)
-    GPIO.output(LED_GRN, False)
-    
-    buzzer_off()
-    
-    img_path, img_name = take_photo("TAMPER")
+    alarm_cleared.clear()
 
-    s3_key = upload_to_s3(img_path, img_name)
+    # Preempts any grant in progress and locks the door until the alarm is reset
+    effects.play("tamper")
+    effects.latch()
 
+    threading.Thread(target=send_tamper_alert, args=(triggered_at,), daemon=True).start()
+
+def send_tamper_alert(triggered_at):
+    event_id = uuid.uuid4().hex
+    img_path, img_name = take_photo("TAMPER", triggered_at)
+
+    # Alert first; the photo follows as 'tamper_snapshot' with the same event_id
     try:
-        pubnub.publish().channel(CHANNEL).message({
+        publish_message({
             "event": "tamper",
-            "timestamp": time.time(),
-            "s3_key": s3_key 
-        }).sync()
+            "event_id": event_id,
+            "timestamp": triggered_at,
+            "s3_key": None
+        })
     except Exception as e:
         print(f"Failed to send tamper alert: {e}")
+
+    if img_path:
+        spool.add(img_path, img_name, {"type": "tamper_snapshot", "event_id": event_id})
+
+def tamper_worker():
+    # Reacts as soon as the switch settles, whatever the NFC loop is doing
+    while True:
+        kind, at = tamper.events.get()
+        if kind == TAMPERED and not tamper_alarm_active:
+            handle_tamper(at)
+        elif kind == CLEARED and tamper_alarm_active:
+            reset_tamper_alarm()
+
+threading.Thread(target=tamper_worker, name="tamper", daemon=True).start()
         
         
 # ----------------------
-# Access Control LEDs/Buzzer
+# Offline Allow-list
 # ----------------------
+# Signed fob windows pushed by the server, so known fobs unlock without a round trip
+allow_list = AllowList()
 
-def grant_access():
-    
-    GPIO.output(LED_RED, False)
-    GPIO.output(LED_YEL, False)
-    GPIO.output(LED_GRN, True)
-    RELAY.off() #Unlock door
-    time.sleep(5)
-    GPIO.output(LED_GRN, False)
-    GPIO.output(LED_RED, True)
-    RELAY.on() #Lock door
-    
-def grant_access_no_face():
-    
-    GPIO.output(LED_RED, False)
-    GPIO.output(LED_GRN, True)
-    buzzer_on(freq=3000, duty=50)
-    RELAY.off()
-    for _ in range(3):
-        GPIO.output(LED_YEL, True); time.sleep(0.3)
-        GPIO.output(LED_YEL, False); time.sleep(0.3)
-    buzzer_off()
-    time.sleep(2)
-    GPIO.output(LED_GRN, False)
-    GPIO.output(LED_RED, True)
-    RELAY.on()
-
-def deny_access():
-
-    GPIO.output(LED_YEL, False)
-    for _ in range(3):
-        GPIO.output(LED_RED, True); time.sleep(0.3)
-        buzzer_on(freq=3000, duty=50)
-        GPIO.output(LED_RED, False); time.sleep(0.3)
-        buzzer_off()
-    
-    GPIO.output(LED_GRN, False)
-    GPIO.output(LED_RED, True)
-    
+def request_allow_list():
+    try:
+        publish_message({
+            "type": "allow_list_request",
+            "version": allow_list.version
+        })
+    except Exception as e:
+        print(f"Failed to request allow-list: {e}")
 
 # ----------------------
 # Listener Access Decisions + Heartbeat
@@ -253,32 +242,73 @@ class MyListener(SubscribeCallback):
         if msg.get("type") == "heartbeat_request":
             print("Heartbeat request- sending response...")
             self.send_heartbeat()
+
+        #Handle Allow-list Updates (ask for a full copy if a delta does not apply)
+        if msg.get("type") == "allow_list":
+            if not allow_list.apply(msg):
+                request_allow_list()
+            return
             
-        #Handle Access Decisions
+        #Handle Access Decisions (granted | granted_no_face | denied | revoked); returns at once
         if "access" in msg:
             print(f"Server decision received: {msg['access']}")
-            if msg["access"] == "granted":
-                grant_access()
-            elif msg["access"] == "granted_no_face":
-                grant_access_no_face()
-            else:
-                deny_access()
+            tap_id = msg.get("tap_id")
+            if tap_id:
+                traces.mark(tap_id, f"decision_{msg.get('stage', 'final')}", time.monotonic())
+            access = msg["access"] if msg["access"] in EFFECTS else "denied"
+            show_decision(access, tap_id)
+            # A provisional grant is followed by the final decision; the card stays in flight until then.
+            # A denial is never overturned, so it frees the card straight away.
+            if msg.get("stage") != "provisional" or not access.startswith("granted"):
+                tap_guard.done(msg.get("uid"))
     
     def send_heartbeat(self):
         response = {
             "type": "heartbeat_response",
             "message": "Pi is online",
-            "timestamp": time.time()
+            "timestamp": time.time(),
+            "taps": tap_guard.stats()
         }
 
         try:
-            pubnub.publish().channel(CHANNEL).message(response).sync()
+            publish_message(response)
             print("Sent heartbeat to server.")
         except Exception as e:
             print(f"Error sending heartbeat to server: {e}")
 
 pubnub.add_listener(MyListener())
 pubnub.subscribe().channels(CHANNEL).execute()
+request_allow_list()
+
+# ----------------------
+# Tap Capture/Upload Worker
+# ----------------------
+# Taps are published as soon as the card is read; the photo is saved here and
+# handed to the upload spool, which sends it as a follow-up with the same tap_id.
+tap_uploads = queue.Queue()
+
+def tap_upload_worker():
+    while True:
+        tap_id, uid_hex, tapped_at = tap_uploads.get()
+        started = time.monotonic()
+        try:
+            img_path, img_name = take_photo(uid_hex, tapped_at)
+        except Exception as e:
+            print(f"Capture failed for tap {tap_id}: {e}")
+            img_path, img_name = None, None
+        traces.mark(tap_id, "capture", started, time.monotonic())
+
+        if img_path:
+            spool.add(img_path, img_name, {"type": "tap_snapshot", "tap_id": tap_id})
+            continue
+
+        # No photo at all: tell the server so it stops waiting for one
+        try:
+            publish_message({"type": "tap_snapshot", "tap_id": tap_id, "s3_key": None})
+        except Exception as e:
+            print(f"Failed to send snapshot for tap {tap_id}: {e}")
+
+threading.Thread(target=tap_upload_worker, name="tap-upload", daemon=True).start()
 
 # ----------------------
 # MAIN LOOP
@@ -287,49 +317,61 @@ print("System ready. Waiting for NFC tag...")
 try:
     while True:
         
-        #ALARM TRIGGER
-        if tampered_with() and not tamper_alarm_active:
-            handle_tamper()
-            
-        #ALARM RESET
-        if tamper_alarm_active and not tampered_with():
-            reset_tamper_alarm()
-            tamper_alarm_active = False #Reset the state
-            
-        #SKIP NFC: If the alarm is active, monitor the switch and skip all other logic.
+        #SKIP NFC: while the alarm is active, sleep until the tamper worker clears it
         if tamper_alarm_active:
-            time.sleep(0.5)
+            alarm_cleared.wait()
             continue
     
         #NFC, only runs when alarm is inactive
         uid = pn532.read_passive_target(timeout=0.5)
 
         if uid:
+            tapped_at = time.time()
+            read_at = time.monotonic()
             uid_hex = uid.hex().upper()
+
+            # Card still held on the reader, or its last attempt is still waiting on the server
+            if not tap_guard.admit(uid_hex):
+                time.sleep(0.1)
+                continue
+
             print(f"Tag detected: {uid_hex}")
-            GPIO.output(LED_RED, False)
-            GPIO.output(LED_YEL, True)
-            
-            # Flash yellow + beep
-            buzzer_on(freq=4000, duty=50)
-            time.sleep(1)
-            buzzer_off()
-
-            # Take photo
-            img_path, img_name = take_photo(uid_hex)
-            # Upload to AWS
-            s3_key = upload_to_s3(img_path, img_name)
-
-            # Send NFC + s3key to server
-            pubnub.publish().channel(CHANNEL).message({
+            tap_id = uuid.uuid4().hex
+            traces.start(tap_id, read_at, tapped_at)
+
+            # Known fob inside its window: unlock now, the server still logs and checks the face
+            started = time.monotonic()
+            local_grant = allow_list.check(uid_hex, tapped_at)
+            traces.mark(tap_id, "local_check", started, time.monotonic())
+            if local_grant:
+                show_decision("granted", tap_id)
+                # Already acted on; a later revocation is a server message for this tap_id, not this card
+                tap_guard.done(uid_hex)
+
+            # Send NFC to server first so the booking lookup starts now
+            tap_message = {
                 "nfc_uid": uid_hex,
-                "s3_key": s3_key
-            }).sync()
+                "tap_id": tap_id,
+                "event_id": tap_id,
+                "timestamp": tapped_at
+            }
+            if local_grant:
+                tap_message["local_access"] = "granted"
+            started = time.monotonic()
+            try:
+                publish_message(tap_message)
+            except Exception as e:
+                print(f"Failed to send tap {tap_id}: {e}")
+            traces.mark(tap_id, "publish", started, time.monotonic())
+
+            # Photo + upload in the background; flash yellow + beep while waiting for the server
+            tap_uploads.put((tap_id, uid_hex, tapped_at))
+            if not local_grant:
+                play_effect("tap", tap_id, report=False)
 
         time.sleep(0.1)
 
 except KeyboardInterrupt:
-    buzzer_off()
-    buzzer_pwm.stop()
-    GPIO.cleanup()
+    camera.stop()
+    gpio.cleanup()
     print("Exiting cleanly...")
@@ -0,0 +1,102 @@
+import os
+import time
+import queue
+import argparse
+import threading
+from gpio_backend import TAMP, create_gpio
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+TAMPER_DEBOUNCE_MS = float(os.getenv("TAMPER_DEBOUNCE_MS", "50"))
+
+TAMPERED = "tamper"
+CLEARED = "tamper_cleared"
+
+
+# ----------------------
+# Edge-triggered Tamper Monitor
+# ----------------------
+class TamperMonitor:
+    """
+    Watches the tamper switch with GPIO edge callbacks instead of polling.
+
+    Each edge restarts a TAMPER_DEBOUNCE_MS timer; when the timer fires the
+    pin is read once and, if the settled level differs from the last one,
+    (TAMPERED | CLEARED, time of the first edge) is put on self.events.
+    Contact bounce therefore produces one event, and the photo can be taken
+    from the moment the switch first moved.
+    """
+    def __init__(self, gpio, pin=TAMP, debounce_ms=TAMPER_DEBOUNCE_MS):
+        self._gpio = gpio
+        self._pin = pin
+        self._debounce = debounce_ms / 1000.0
+        self._lock = threading.Lock()
+        self._timer = None
+        self._first_edge_at = None
+        self.events = queue.Queue()
+        self.edges = 0
+        self.bounces = 0
+
+        self._tampered = gpio.read(pin)
+        if self._tampered:
+            # Already open at boot
+            self.events.put((TAMPERED, time.time()))
+        gpio.watch(pin, self._on_edge)
+
+    def _on_edge(self):
+        with self._lock:
+            self.edges += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self.bounces += 1
+            if self._first_edge_at is None:
+                self._first_edge_at = time.time()
+            self._timer = threading.Timer(self._debounce, self._settle)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _settle(self):
+        level = self._gpio.read(self._pin)
+        with self._lock:
+            first_edge_at, self._first_edge_at = self._first_edge_at, None
+            self._timer = None
+            if level == self._tampered:
+                return      # bounced back to where it was
+            self._tampered = level
+
+        self.events.put((TAMPERED if level else CLEARED, first_edge_at))
+
+    @property
+    def tampered(self):
+        with self._lock:
+            return self._tampered
+
+
+# ----------------------
+# Simulation
+# ----------------------
+if __name__ == "__main__":
+    # python tamper.py -> a bouncy open and close of the switch on the simulated GPIO
+    parser = argparse.ArgumentParser(description="Feed a bouncing tamper switch into the monitor.")
+    parser.add_argument("--bounces", type=int, default=6)
+    parser.add_argument("--bounce-ms", type=float, default=3)
+    args = parser.parse_args()
+
+    gpio = create_gpio("simulated")
+    monitor = TamperMonitor(gpio)
+
+    def bounce_to(level):
+        for i in range(args.bounces):
+            gpio.set_input(TAMP, i % 2 == 0)
+            time.sleep(args.bounce_ms / 1000)
+        gpio.set_input(TAMP, level)
+
+    for level in (True, False):
+        moved_at = time.time()
+        bounce_to(level)
+        kind, at = monitor.events.get(timeout=1)
+        print(f"{kind}: reported {(time.time() - moved_at) * 1000:.1f} ms after the first edge "
+              f"(event time {(at - moved_at) * 1000:+.1f} ms)")
+
+    print(f"edges {monitor.edges}, bounces absorbed {monitor.bounces}, extra events {monitor.events.qsize()}")
@@ -0,0 +1,76 @@
+import os
+import time
+import threading
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+# Reads of the same card closer together than this are one presentation (the window slides while it is held)
+TAP_DEBOUNCE_SECONDS = float(os.getenv("TAP_DEBOUNCE_SECONDS", "2"))
+# A card whose attempt has no server decision yet is ignored for up to this long
+TAP_IN_FLIGHT_TIMEOUT_SECONDS = float(os.getenv("TAP_IN_FLIGHT_TIMEOUT_SECONDS", "10"))
+
+
+# ----------------------
+# Repeated-read Suppression
+# ----------------------
+class TapGuard:
+    """
+    Turns the stream of PN532 reads into one access attempt per presentation.
+
+    A read is suppressed if the same UID was read less than
+    TAP_DEBOUNCE_SECONDS ago (every read, suppressed or not, restarts the
+    window, so a card held on the reader never re-triggers) or if that UID
+    still has an attempt in flight. done() ends the in-flight state when the
+    server's decision arrives; otherwise it lapses after
+    TAP_IN_FLIGHT_TIMEOUT_SECONDS.
+    """
+    def __init__(self, debounce=TAP_DEBOUNCE_SECONDS, in_flight_timeout=TAP_IN_FLIGHT_TIMEOUT_SECONDS):
+        self._debounce = debounce
+        self._in_flight_timeout = in_flight_timeout
+        self._lock = threading.Lock()
+        self._last_read = {}     # uid -> time of the latest read
+        self._in_flight = {}     # uid -> time the attempt started
+        self.accepted = 0
+        self.suppressed_debounce = 0
+        self.suppressed_in_flight = 0
+
+    def admit(self, uid, now=None):
+        """True if this read should become an access attempt."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            last = self._last_read.get(uid)
+            self._last_read[uid] = now
+            if last is not None and now - last < self._debounce:
+                self.suppressed_debounce += 1
+                return False
+
+            started = self._in_flight.get(uid)
+            if started is not None and now - started < self._in_flight_timeout:
+                self.suppressed_in_flight += 1
+                return False
+
+            self._in_flight[uid] = now
+            self.accepted += 1
+            self._prune(now)
+            return True
+
+    def done(self, uid):
+        with self._lock:
+            self._in_flight.pop(uid, None)
+
+    def _prune(self, now):
+        """Caller holds _lock. Forgets cards not seen for a while so the maps stay small."""
+        horizon = max(self._debounce, self._in_flight_timeout)
+        for uid in [u for u, at in self._last_read.items() if now - at > horizon]:
+            del self._last_read[uid]
+            self._in_flight.pop(uid, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "accepted": self.accepted,
+                "suppressed_debounce": self.suppressed_debounce,
+                "suppressed_in_flight": self.suppressed_in_flight,
+                "suppressed_reads": self.suppressed_debounce + self.suppressed_in_flight,
+            }
@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+# Taps whose spans are kept for late stages (upload, follow-up decisions)
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "200"))
+
+
+# ----------------------
+# Per-tap Stage Timings
+# ----------------------
+class TapTrace:
+    """
+    Stage timings for one tap, measured on the monotonic clock from the
+    moment the card was read (t0). wall_t0 is the same instant on the wall
+    clock, so the server can place the spans next to its own.
+
+    Spans are [name, start ms after t0, duration ms]. take() returns the
+    spans recorded since the last call, so each message only carries what
+    is new.
+    """
+    def __init__(self, trace_id, t0=None, wall_t0=None):
+        self.id = trace_id
+        self.t0 = time.monotonic() if t0 is None else t0
+        self.wall_t0 = time.time() if wall_t0 is None else wall_t0
+        self._pending = []
+
+    def mark(self, name, started, finished=None):
+        """Records a span between two time.monotonic() readings (a point if finished is None)."""
+        finished = started if finished is None else finished
+        self._pending.append([name, round((started - self.t0) * 1000, 1), round((finished - started) * 1000, 1)])
+
+    def take(self):
+        spans, self._pending = self._pending, []
+        return {"id": self.id, "t0": self.wall_t0, "spans": spans}
+
+
+class TraceBook:
+    """The most recent TRACE_KEEP traces by tap_id; older ones are dropped."""
+    def __init__(self, keep=TRACE_KEEP):
+        self._keep = keep
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()
+
+    def start(self, trace_id, t0=None, wall_t0=None):
+        trace = TapTrace(trace_id, t0, wall_t0)
+        if not TRACE_ENABLED:
+            return trace
+        with self._lock:
+            self._traces[trace_id] = trace
+            while len(self._traces) > self._keep:
+                self._traces.popitem(last=False)
+        return trace
+
+    def mark(self, trace_id, name, started, finished=None):
+        with self._lock:
+            trace = self._traces.get(trace_id)
+            if trace is not None:
+                trace.mark(name, started, finished)
+
+    def attach(self, message):
+        """Adds the pending spans of the message's tap (tap_id) as message["trace"]."""
+        trace_id = message.get("tap_id")
+        with self._lock:
+            trace = self._traces.get(trace_id) if trace_id else None
+            if trace is not None and (trace._pending or "nfc_uid" in message):
+                message["trace"] = trace.take()
+        return message
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import uuid
+import threading
+from camera import CAPTURE_DIR
+
+# ----------------------
+# ENV VARIABLES
+# ----------------------
+SPOOL_JOURNAL = os.path.join(CAPTURE_DIR, "upload_journal.json")
+SPOOL_MAX_MB = float(os.getenv("SPOOL_MAX_MB", "500"))
+SPOOL_UPLOAD_WORKERS = int(os.getenv("SPOOL_UPLOAD_WORKERS", "2"))
+SPOOL_MAX_BACKOFF_SECONDS = float(os.getenv("SPOOL_MAX_BACKOFF_SECONDS", "300"))
+# S3 parts must be at least 5 MB; smaller files go up in one request
+SPOOL_MULTIPART_THRESHOLD_MB = int(os.getenv("SPOOL_MULTIPART_THRESHOLD_MB", "8"))
+SPOOL_MULTIPART_CONCURRENCY = int(os.getenv("SPOOL_MULTIPART_CONCURRENCY", "4"))
+
+
+# ----------------------
+# Durable Upload Spool
+# ----------------------
+class UploadSpool:
+    """
+    Captures waiting for S3, journalled in SPOOL_JOURNAL so nothing is lost
+    on a reboot or a Wi-Fi drop.
+
+    Each entry is a local file, its S3 key and the follow-up message to
+    publish once the upload is done (the message gets the s3_key added).
+    Worker threads retry failures with exponential backoff; the upload and
+    the publish are separate steps, so a publish failure does not upload
+    again. When the spooled files exceed SPOOL_MAX_MB the oldest ones are
+    evicted. JPEGs in the directory with no journal entry (left by earlier
+    versions or by a crash before add) have no message to follow up with,
+    so they are deleted on start rather than uploaded. on_upload(message, started, finished)
+    is told the monotonic start and end of each successful upload.
+    """
+    def __init__(self, s3, bucket, publish, on_upload=None):
+        from boto3.s3.transfer import TransferConfig
+
+        self._s3 = s3
+        self._bucket = bucket
+        self._publish = publish
+        self._on_upload = on_upload
+        self._transfer = TransferConfig(
+            multipart_threshold=SPOOL_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=max(SPOOL_MULTIPART_THRESHOLD_MB, 5) * 1024 * 1024,
+            max_concurrency=SPOOL_MULTIPART_CONCURRENCY,
+        )
+        self._cond = threading.Condition()
+        self._entries = []        # oldest first
+        self._in_flight = set()   # keys being worked on
+        self.uploaded = 0
+        self.failures = 0
+        self.evicted = 0
+        self.orphans_removed = 0
+
+        os.makedirs(CAPTURE_DIR, exist_ok=True)
+        self._load()
+
+        for i in range(SPOOL_UPLOAD_WORKERS):
+            threading.Thread(target=self._run, name=f"upload-spool-{i}", daemon=True).start()
+
+    def add(self, path, key, message=None):
+        """Queues a capture; message is published with "s3_key" once the upload succeeds."""
+        if message is not None:
+            # Fixed now and journalled, so a publish retry is recognised as the same event
+            message = dict(message)
+            message.setdefault("event_id", uuid.uuid4().hex)
+        with self._cond:
+            self._entries.append({
+                "path": path,
+                "key": key,
+                "message": message,
+                "uploaded": False,
+                "attempts": 0,
+                "next_at": 0.0,
+            })
+            self._evict()
+            self._save()
+            self._cond.notify()
+
+    # ----------------------
+    # Workers
+    # ----------------------
+    def _run(self):
+        while True:
+            entry = self._claim()
+            try:
+                done = self._process(entry)
+            except Exception as e:
+                print(f"Spool error for {entry['key']}: {e}")
+                done = False
+
+            with self._cond:
+                self._in_flight.discard(entry["key"])
+                if done:
+                    if entry in self._entries:
+                        self._entries.remove(entry)
+                else:
+                    entry["attempts"] += 1
+                    entry["next_at"] = time.time() + min(2 ** entry["attempts"], SPOOL_MAX_BACKOFF_SECONDS)
+                    self.failures += 1
+                self._save()
+                self._cond.notify_all()
+
+    def _claim(self):
+        """Blocks until an entry is due and marks it in flight."""
+        with self._cond:
+            while True:
+                now = time.time()
+                waiting = [e for e in self._entries if e["key"] not in self._in_flight]
+                due = [e for e in waiting if e["next_at"] <= now]
+                if due:
+                    entry = due[0]
+                    self._in_flight.add(entry["key"])
+                    return entry
+                timeout = min((e["next_at"] for e in waiting), default=now + 60) - now
+                self._cond.wait(max(timeout, 0.1))
+
+    def _process(self, entry):
+        if not entry["uploaded"]:
+            if not os.path.exists(entry["path"]):
+                print(f"Spooled file missing, dropping {entry['key']}.")
+                return True
+            started = time.monotonic()
+            self._s3.upload_file(entry["path"], self._bucket, entry["key"], Config=self._transfer)
+            print(f"Upload complete for {entry['key']}.")
+            if self._on_upload is not None and entry["message"] is not None:
+                self._on_upload(entry["message"], started, time.monotonic())
+            os.remove(entry["path"])
+            with self._cond:
+                entry["uploaded"] = True
+                self.uploaded += 1
+                self._save()
+
+        if entry["message"] is not None:
+            self._publish(dict(entry["message"], s3_key=entry["key"]))
+        return True
+
+    # ----------------------
+    # Size cap & journal
+    # ----------------------
+    def _evict(self):
+        """Caller holds _cond. Drops the oldest pending files until the spool fits SPOOL_MAX_MB."""
+        limit = SPOOL_MAX_MB * 1024 * 1024
+        pending = [e for e in self._entries if not e["uploaded"]]
+        total = sum(_size(e["path"]) for e in pending)
+
+        for entry in pending:
+            if total <= limit:
+                break
+            if entry["key"] in self._in_flight:
+                continue
+            total -= _size(entry["path"])
+            try:
+                os.remove(entry["path"])
+            except OSError:
+                pass
+            self._entries.remove(entry)
+            self.evicted += 1
+            print(f"Spool over {SPOOL_MAX_MB} MB, evicted {entry['key']}.")
+
+    def _save(self):
+        """Caller holds _cond."""
+        try:
+            tmp_path = SPOOL_JOURNAL + ".tmp"
+            with open(tmp_path, "w") as journal:
+                json.dump(self._entries, journal)
+            os.replace(tmp_path, SPOOL_JOURNAL)
+        except OSError as e:
+            print(f"Could not save upload journal: {e}")
+
+    def _load(self):
+        if os.path.exists(SPOOL_JOURNAL):
+            try:
+                with open(SPOOL_JOURNAL) as journal:
+                    self._entries = json.load(journal)
+            except (OSError, ValueError) as e:
+                print(f"Could not read upload journal: {e}")
+
+        known = {os.path.basename(e["path"]) for e in self._entries}
+        for filename in os.listdir(CAPTURE_DIR):
+            if filename.endswith(".jpg") and filename not in known:
+                try:
+                    os.remove(os.path.join(CAPTURE_DIR, filename))
+                    self.orphans_removed += 1
+                except OSError as e:
+                    print(f"Could not remove orphan capture {filename}: {e}")
+        if self.orphans_removed:
+            print(f"Removed {self.orphans_removed} captures with no upload journal entry.")
+
+        for entry in self._entries:
+            entry["next_at"] = 0.0
+        self._evict()
+        self._save()
+        if self._entries:
+            print(f"Upload spool resumed with {len(self._entries)} pending captures.")
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._entries),
+                "bytes": sum(_size(e["path"]) for e in self._entries if not e["uploaded"]),
+                "uploaded": self.uploaded,
+                "failures": self.failures,
+                "evicted": self.evicted,
+                "orphans_removed": self.orphans_removed,
+            }
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
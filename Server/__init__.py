@@ -44,6 +44,7 @@ def create_app():
         origins=[website_path],
         methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         allow_headers=["Content-Type", "Authorization"],
+        expose_headers=["X-Next-Cursor"],  # access log pagination
         supports_credentials=True,
     )
 
@@ -76,6 +77,7 @@ def create_app():
     app.register_blueprint(tamper_bp)
     app.register_blueprint(hardware_bp)
     app.register_blueprint(db_bp)
+    app.register_blueprint(realtime_bp)  # /stream (SSE)
 
     # ------------------------------------------------------------
     # START PUBNUB 
@@ -1,28 +1,50 @@
-from flask import Blueprint, jsonify
+import base64
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
 from .models import db, AccessLog, BnB, Booking, UserBooking, User
+from .snapshot_renditions import rendition_urls
 
 access_bp = Blueprint("access", __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# match_result values behind the statuses the dashboards filter on (?status=success,failed)
+# and show (Success / Failed)
+STATUS_GROUPS = {
+    "success": ("granted", "granted_face", "granted_no_face", "match", "allowed", "success"),
+    "failed": ("denied", "failed", "match_failure", "face_mismatch", "no_fob", "no_face", "no_match", "revoked"),
+}
+
 # ====================================================================
 # HELPER FUNCTIONS
 # ====================================================================
 
-def get_names_from_booking(booking_id):
-    if not booking_id:
-        return None
+def get_names_for_bookings(booking_ids):
+    """
+    Primary guest's name for each booking id (the first guest linked if none
+    is marked primary), in one query for the whole page. Bookings with no
+    guest are left out.
+    """
+    booking_ids = {booking_id for booking_id in booking_ids if booking_id}
+    if not booking_ids:
+        return {}
 
     linked_users = (
-        db.session.query(User.name)
-        .join(UserBooking, User.id == UserBooking.user_id)
-        .filter(UserBooking.booking_id == booking_id)
-        .distinct()
+        db.session.query(UserBooking.booking_id, User.name)
+        .join(User, User.id == UserBooking.user_id)
+        .filter(UserBooking.booking_id.in_(booking_ids))
+        .order_by(UserBooking.booking_id, UserBooking.is_primary_guest.desc(), UserBooking.id)
         .all()
     )
 
-    if linked_users:
-        return linked_users[0][0]
-    return None
+    names = {}
+    for booking_id, name in linked_users:
+        names.setdefault(booking_id, name)
+    return names
 
 # Helper to adjust snapshot path returned to client
 def _get_adjusted_snapshot_path(path):
@@ -32,18 +54,122 @@ def _get_adjusted_snapshot_path(path):
     return path
 
 
-def _serialise_log(log):
+def _encode_cursor(log):
+    raw = f"{log.time_logged.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor):
+    """(time_logged, id) of the last log on the previous page; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        time_logged, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(time_logged), int(log_id)
+    except ValueError:
+        raise ValueError("Invalid cursor")
+
+
+def _parse_when(value, name):
+    """ISO date or datetime from the query string, as naive UTC like time_logged."""
+    try:
+        when = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Invalid '{name}' date: {value}")
+    if when.tzinfo:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
+def _paginate_logs(query, default_limit=DEFAULT_PAGE_SIZE):
+    """
+    Applies the request's filters and cursor to an AccessLog query and
+    fetches one page, newest first. Keyset pagination on (time_logged, id),
+    so each page costs the same however much history there is.
+
+    Query string: limit, cursor (from the previous page's X-Next-Cursor),
+    from / to (ISO dates, a date-only 'to' includes that day) and status
+    (comma-separated STATUS_GROUPS names or raw match results).
+    default_limit=None returns every matching log unless the client asks
+    for a page (limit or cursor), for endpoints whose clients do not follow
+    X-Next-Cursor.
+    Returns (logs, next cursor or None); raises ValueError on bad input.
+    """
+    args = request.args
+    limit = args.get("limit", default_limit, type=int)
+    if limit is None and args.get("cursor"):
+        limit = DEFAULT_PAGE_SIZE
+    if limit is not None:
+        limit = min(max(limit, 1), MAX_PAGE_SIZE)
+
+    if args.get("from"):
+        query = query.filter(AccessLog.time_logged >= _parse_when(args["from"], "from"))
+    if args.get("to"):
+        until = _parse_when(args["to"], "to")
+        if len(args["to"]) == 10:
+            query = query.filter(AccessLog.time_logged < until + timedelta(days=1))
+        else:
+            query = query.filter(AccessLog.time_logged <= until)
+
+    if args.get("status"):
+        results = []
+        for status in args["status"].lower().split(","):
+            results.extend(STATUS_GROUPS.get(status.strip(), (status.strip(),)))
+        query = query.filter(AccessLog.match_result.in_(results))
+
+    if args.get("cursor"):
+        time_logged, log_id = _decode_cursor(args["cursor"])
+        query = query.filter(or_(
+            AccessLog.time_logged < time_logged,
+            and_(AccessLog.time_logged == time_logged, AccessLog.id < log_id),
+        ))
+
+    query = (
+        query
+        # BnB and Fob are read for every row when serialising
+        .options(joinedload(AccessLog.bnb), joinedload(AccessLog.fob))
+        .order_by(AccessLog.time_logged.desc(), AccessLog.id.desc())
+    )
+    if limit is None:
+        return query.all(), None
+
+    logs = query.limit(limit + 1).all()
+    next_cursor = _encode_cursor(logs[limit - 1]) if len(logs) > limit else None
+    return logs[:limit], next_cursor
+
+
+def _page_response(data, next_cursor):
+    """The page as a JSON list, as before; the cursor for the next page goes in X-Next-Cursor."""
+    response = jsonify(data)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
+
+
+def _serialise_logs(logs, raw_status=False):
+    """
+    Serialises a page of logs with a fixed number of queries: guest names
+    for every booking on the page come from one grouped query, and BnB and
+    Fob are expected to be eager-loaded (see _paginate_logs).
+    raw_status keeps match_result as the status (booking history).
+    """
+    names = get_names_for_bookings(log.booking_id for log in logs)
+    return [_serialise_log(log, names, raw_status) for log in logs]
+
+
+def _serialise_log(log, names, raw_status=False):
     """Ensure all access-log endpoints return the same shape, prioritizing booking guest name."""
-    raw_status = (log.match_result or "").lower()
+    match_result = (log.match_result or "").lower()
 
-    if raw_status in {"match", "allowed", "success"}:
+    if raw_status:
+        status = log.match_result or "Unknown"
+    elif match_result in STATUS_GROUPS["success"]:
         status = "Success"
-    elif raw_status in {"no_match", "denied", "failed"}:
+    elif match_result in STATUS_GROUPS["failed"]:
         status = "Failed"
     else:
         status = log.match_result or "Unknown"
 
-    user_name = get_names_from_booking(log.booking_id)
+    user_name = names.get(log.booking_id)
 
     if not user_name and log.fob:
         user_name = f"Fob Scanned: {log.fob.label}"
@@ -59,6 +185,7 @@ def _serialise_log(log):
         "match_raw": log.match_result,
         "confidence": log.face_confidence,
         "snapshot": snapshot_path,
+        **rendition_urls(snapshot_path),
         "fob": log.fob.label if log.fob else None,
         "user": user_name or "N/A",
     }
@@ -85,36 +212,14 @@ def get_booking_history(booking_code):
     if not user_booking and not is_host:
         return jsonify({"msg": "Unauthorized"}), 403
 
-    logs = (
-        AccessLog.query
-        .filter_by(booking_id=booking.id)
-        .order_by(AccessLog.time_logged.desc())
-        .all()
-    )
-
-    data = []
-    for log in logs:
-        user_name = get_names_from_booking(log.booking_id)
-
-        if not user_name and log.fob:
-            user_name = f"Fob Scanned: {log.fob.label}"
-
-        snapshot_path = _get_adjusted_snapshot_path(log.snapshot_path)
-
-        data.append({
-            "id": log.id,
-            "timestamp": log.time_logged.strftime("%Y-%m-%d %H:%M:%S")
-            if log.time_logged else None,
-            "method": log.event_type or "Unknown",
-            "bnbName": log.bnb.name if log.bnb else "Unknown",
-            "status": log.match_result or "Unknown",
-            "confidence": log.face_confidence,
-            "snapshot": snapshot_path,
-            "fob": log.fob.label if log.fob else None,
-            "user": user_name or "N/A",
-        })
+    try:
+        # Unpaged unless asked: the guest history clients read a single response
+        logs, next_cursor = _paginate_logs(AccessLog.query.filter_by(booking_id=booking.id), default_limit=None)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-    return jsonify(data), 200
+    data = _serialise_logs(logs, raw_status=True)
+    return _page_response(data, next_cursor)
 
 
 # ====================================================================
@@ -124,22 +229,17 @@ def get_booking_history(booking_code):
 @access_bp.route("/host/access/logs", methods=["GET"])
 @jwt_required()
 def get_host_access_logs():
-    """All access logs for all BnBs owned by the current host."""
+    """Access logs for all BnBs owned by the current host, one page at a time."""
     host_id = int(get_jwt_identity())
 
-    bnb_ids = [b.id for b in BnB.query.filter_by(host_id=host_id).all()]
-    if not bnb_ids:
-        return jsonify([]), 200
+    host_bnbs = db.session.query(BnB.id).filter(BnB.host_id == host_id)
+    try:
+        logs, next_cursor = _paginate_logs(AccessLog.query.filter(AccessLog.bnb_id.in_(host_bnbs)))
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-    logs = (
-        AccessLog.query
-        .filter(AccessLog.bnb_id.in_(bnb_ids))
-        .order_by(AccessLog.time_logged.desc())
-        .all()
-    )
-
-    data = [_serialise_log(log) for log in logs]
-    return jsonify(data), 200
+    data = _serialise_logs(logs)
+    return _page_response(data, next_cursor)
 
 
 @access_bp.route("/bnbs/<int:bnb_id>/access_logs", methods=["GET"])
@@ -155,12 +255,11 @@ def get_access_logs_for_bnb(bnb_id):
     if bnb.host_id != user_id:
         return jsonify({"msg": "Unauthorized"}), 403
 
-    logs = (
-        AccessLog.query
-        .filter_by(bnb_id=bnb_id)
-        .order_by(AccessLog.time_logged.desc())
-        .all()
-    )
+    try:
+        # Unpaged unless asked: only the host dashboard (/host/access/logs) follows X-Next-Cursor
+        logs, next_cursor = _paginate_logs(AccessLog.query.filter_by(bnb_id=bnb_id), default_limit=None)
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
 
-    data = [_serialise_log(log) for log in logs]
-    return jsonify(data), 200
\ No newline at end of file
+    data = _serialise_logs(logs)
+    return _page_response(data, next_cursor)
\ No newline at end of file
@@ -0,0 +1,195 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from .fob_index import FobIndex
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+# Shared with the Pi; without it no allow-list is published and the Pi decides nothing locally
+SIGNING_KEY = os.getenv("ALLOW_LIST_SIGNING_KEY")
+HORIZON_HOURS = float(os.getenv("ALLOW_LIST_HORIZON_HOURS", "48"))
+CHECK_SECONDS = float(os.getenv("ALLOW_LIST_CHECK_SECONDS", "2"))
+FULL_SECONDS = float(os.getenv("ALLOW_LIST_FULL_SECONDS", "300"))
+
+PUBNUB_MESSAGE_LIMIT = 32 * 1024
+
+
+def sign(payload: dict, key: str) -> str:
+    """HMAC-SHA256 over the canonical JSON form; the Pi verifies with the same encoding."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hmac.new(key.encode(), canonical.encode(), hashlib.sha256).hexdigest()
+
+
+# ------------------------------------------------------
+# Signed Allow-list Publisher
+# ------------------------------------------------------
+class AllowListPublisher:
+    """
+    Pushes a compact, signed list of fob windows to the Pi so it can unlock
+    without waiting for the server.
+
+    The list maps UID -> [[from, until], ...] (epoch seconds) for windows
+    that are active or start within HORIZON_HOURS, built from FobIndex. A
+    background thread compares it with the last published version and sends
+    only the changes as a delta; a full copy goes out every FULL_SECONDS and
+    whenever a Pi asks for one (on boot or after missing a delta).
+
+    Versions start from the clock when the publisher starts, so they keep
+    rising across server restarts and the Pi can refuse an older copy. A
+    list too large for one PubNub message is not sent; an empty full copy
+    goes out instead, so the Pi stops granting from its old list and asks
+    the server, and stats() reports it as oversized.
+    """
+    _lock = threading.Lock()
+    _published = None        # uid -> windows, as last sent ({} while the list is too large to send)
+    _withheld = None         # the list that was too large, so an unchanged one is not rebuilt every check
+    _version = 0
+    _last_full_at = 0.0
+    _publish = None
+    _thread = None
+    _wakeup = threading.Event()
+
+    _fulls = 0
+    _deltas = 0
+    _errors = 0
+    _oversized = False
+    _oversized_publishes = 0
+
+    @staticmethod
+    def build() -> dict | None:
+        """Current allow-list from the fob index, or None while the index is stale."""
+        snapshot = FobIndex.snapshot()
+        if snapshot is None:
+            return None
+
+        now = datetime.now(timezone.utc)
+        horizon = now + timedelta(hours=HORIZON_HOURS)
+
+        allow_list = {}
+        for uid, (_, _, windows) in snapshot[1].items():
+            active = [
+                [int(active_from.timestamp()), int(active_until.timestamp())]
+                for active_from, active_until, _ in windows
+                if active_until >= now and active_from <= horizon
+            ]
+            if active:
+                allow_list[uid] = active
+        return allow_list
+
+    @staticmethod
+    def request_full():
+        """Called when a Pi asks for the whole list."""
+        with AllowListPublisher._lock:
+            AllowListPublisher._last_full_at = 0.0
+        AllowListPublisher._wakeup.set()
+
+    @staticmethod
+    def sync():
+        """Publishes a delta if the list changed, or a full copy when one is due."""
+        current = AllowListPublisher.build()
+        if current is None:
+            return
+
+        with AllowListPublisher._lock:
+            previous = AllowListPublisher._published
+            full_due = previous is None or time.monotonic() - AllowListPublisher._last_full_at >= FULL_SECONDS
+
+            if full_due:
+                AllowListPublisher._version += 1
+                payload = {
+                    "kind": "full",
+                    "version": AllowListPublisher._version,
+                    "entries": current,
+                }
+                AllowListPublisher._last_full_at = time.monotonic()
+                AllowListPublisher._fulls += 1
+            else:
+                if current == AllowListPublisher._withheld:
+                    return
+                upsert = {uid: windows for uid, windows in current.items() if previous.get(uid) != windows}
+                remove = [uid for uid in previous if uid not in current]
+                if not upsert and not remove:
+                    return
+
+                AllowListPublisher._version += 1
+                payload = {
+                    "kind": "delta",
+                    "base_version": AllowListPublisher._version - 1,
+                    "version": AllowListPublisher._version,
+                    "upsert": upsert,
+                    "remove": remove,
+                }
+                AllowListPublisher._deltas += 1
+
+            payload.update({"type": "allow_list", "issued_at": int(time.time())})
+            message = dict(payload, sig=sign(payload, SIGNING_KEY), source="server_allow_list")
+
+            oversized = len(json.dumps(message)) > PUBNUB_MESSAGE_LIMIT
+            if oversized:
+                print(f"[AllowList] ERROR: version {payload['version']} ({len(current)} fobs) is over the PubNub "
+                      "message limit. Publishing an empty list; the Pi will ask the server for every tap.")
+                payload = {
+                    "kind": "full",
+                    "version": payload["version"],
+                    "entries": {},
+                    "type": "allow_list",
+                    "issued_at": payload["issued_at"],
+                }
+                message = dict(payload, sig=sign(payload, SIGNING_KEY), source="server_allow_list")
+
+            # Deltas are computed against what the Pi actually received
+            AllowListPublisher._published = {} if oversized else current
+            AllowListPublisher._withheld = current if oversized else None
+            AllowListPublisher._oversized = oversized
+            AllowListPublisher._oversized_publishes += int(oversized)
+
+        try:
+            AllowListPublisher._publish(message)
+        except Exception as e:
+            # Resend everything next time rather than leave the Pi on a gap
+            with AllowListPublisher._lock:
+                AllowListPublisher._errors += 1
+                AllowListPublisher._last_full_at = 0.0
+            print(f"[AllowList] ERROR publishing version {payload['version']}: {e}")
+
+    @staticmethod
+    def stats() -> dict:
+        with AllowListPublisher._lock:
+            return {
+                "enabled": AllowListPublisher._thread is not None,
+                "version": AllowListPublisher._version,
+                "fobs": len(AllowListPublisher._published) if AllowListPublisher._published is not None else 0,
+                "full_publishes": AllowListPublisher._fulls,
+                "delta_publishes": AllowListPublisher._deltas,
+                "errors": AllowListPublisher._errors,
+                "oversized": AllowListPublisher._oversized,
+                "oversized_publishes": AllowListPublisher._oversized_publishes,
+            }
+
+    @staticmethod
+    def _sync_loop():
+        while True:
+            AllowListPublisher._wakeup.wait(CHECK_SECONDS)
+            AllowListPublisher._wakeup.clear()
+            AllowListPublisher.sync()
+
+    @staticmethod
+    def start(publish):
+        """publish: callable sending one message to the Pi channel."""
+        if AllowListPublisher._thread is not None:
+            return
+        if not SIGNING_KEY:
+            print("[AllowList] ALLOW_LIST_SIGNING_KEY not set. Local decisions on the Pi are disabled.")
+            return
+
+        AllowListPublisher._publish = publish
+        # Above any version an earlier run could have reached (at most one publish per CHECK_SECONDS)
+        AllowListPublisher._version = int(time.time())
+        AllowListPublisher._thread = threading.Thread(target=AllowListPublisher._sync_loop, name="allow-list", daemon=True)
+        AllowListPublisher._thread.start()
+        print(f"[AllowList] Publishing signed allow-list ({HORIZON_HOURS}h horizon, full copy every {FULL_SECONDS}s).")
@@ -5,6 +5,7 @@ from datetime import datetime, timezone
 import os
 from werkzeug.utils import secure_filename
 from sqlalchemy import or_
+from .face_cache import FaceCache
 
 booking_bp = Blueprint("booking", __name__)
 
@@ -202,6 +203,9 @@ def upload_profile_image():
     user.photo_path = file_path
     db.session.commit()
 
+    # Swap in the new reference face (and its embedding) before the guest's next tap
+    FaceCache.refresh(user_id, file_path)
+
     return jsonify({"message": "Profile image uploaded", "file_path": file_path}), 200
 
 
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from .event_bus import create_event_bus
+from .host_scopes import HostScopes
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+STREAM_RING_SIZE = int(os.getenv("STREAM_RING_SIZE", "1000"))
+STREAM_SUBSCRIBER_QUEUE = int(os.getenv("STREAM_SUBSCRIBER_QUEUE", "200"))
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
+# Event kinds a client can narrow its stream to
+EVENT_KINDS = ("access", "tamper", "system")
+# Messages between workers (cache invalidations); never sent to /stream clients
+CONTROL_KIND = "control"
+
+
+class Subscriber:
+    """
+    One connected SSE client: a bounded queue that drops its oldest event
+    when full. host_id limits it to that host's BnBs (None = every event,
+    for admins); kinds limits it to some EVENT_KINDS (None = all).
+    """
+    def __init__(self, subscriber_id: int, lock: threading.Lock, max_queue: int,
+                 host_id: int | None = None, kinds: frozenset | None = None):
+        self.id = subscriber_id
+        self.host_id = host_id
+        self.kinds = kinds
+        self.queue = deque(maxlen=max_queue)     # (event id, data, published at, bnb id, kind)
+        self.ready = threading.Condition(lock)
+        self.connected_at = time.monotonic()
+        self.last_id = None
+        self.delivered = 0
+        self.dropped = 0
+
+    def get(self, timeout: float | None = None) -> tuple[int, str] | None:
+        """Next (event id, data), or None if nothing arrived within timeout."""
+        with self.ready:
+            if not self.ready.wait_for(lambda: self.queue, timeout=timeout):
+                return None
+            event_id, data = self.queue.popleft()[:2]
+            self.last_id = event_id
+            self.delivered += 1
+            return (event_id, data)
+
+    def wants(self, bnb_id: int | None, kind: str | None) -> bool:
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        if self.host_id is None:
+            return True
+        # Events not tied to a BnB only go to unscoped (admin) clients
+        return bnb_id is not None and bnb_id in HostScopes.bnbs_for(self.host_id)
+
+
+# ------------------------------------------------------
+# Fan-out Broker for the SSE Stream
+# ------------------------------------------------------
+class EventBroker:
+    """
+    Fans each event out to the connected /stream clients it concerns.
+
+    put() appends to the event bus (event_bus.py, STREAM_BUS); the bus
+    delivers each event, with its id, back to the broker of every process.
+    Events carry the BnB they belong to and their kind, and each subscriber
+    only receives those matching its host's BnBs (HostScopes) and kinds.
+    Each subscriber has its own queue of STREAM_SUBSCRIBER_QUEUE events; a
+    slow client loses its oldest events rather than holding up the others
+    or growing memory, and with nobody connected events go only to the ring.
+    The ring keeps the last STREAM_RING_SIZE events with increasing ids so a
+    client reconnecting with Last-Event-ID gets the gap replayed.
+
+    broadcast() sends a control message over the same bus to the other
+    workers, which run the handlers registered with on_control() for it;
+    control messages skip the ring and the subscribers.
+    """
+    def __init__(self, bus=None, ring_size=STREAM_RING_SIZE, max_queue=STREAM_SUBSCRIBER_QUEUE):
+        self._lock = threading.Lock()
+        self._max_queue = max_queue
+        self._ring = deque(maxlen=ring_size)    # (event id, data, published at, bnb id, kind)
+        self._subscribers = {}
+        self._latest_id = 0
+        self._next_subscriber = 1
+        self._published = 0
+        self._filtered = 0
+        self._replayed = 0
+        self._replay_gaps = 0
+        self._control_handlers = {}     # name -> [handler, ...]
+        self._controls = 0
+
+        self._bus = bus or create_event_bus()
+        self._bus.attach(self._deliver, history=ring_size)
+
+    def start(self):
+        """Starts the bus's delivery thread (once per process)."""
+        self._bus.start()
+
+    def put(self, data: str, bnb_id: int | None = None, kind: str | None = None) -> int | None:
+        """Publishes one serialised event; returns its id if the bus assigns it immediately."""
+        return self._bus.publish(data, bnb_id, kind)
+
+    def on_control(self, name: str, handler):
+        """Runs handler() whenever another worker broadcasts name."""
+        self._control_handlers.setdefault(name, []).append(handler)
+
+    def broadcast(self, name: str):
+        """Tells the other workers (the sender has already acted on it itself)."""
+        self._bus.publish(json.dumps({"control": name, "pid": os.getpid()}), None, CONTROL_KIND)
+
+    def _on_control(self, data: str):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        if message.get("pid") == os.getpid():
+            return
+        self._controls += 1
+        for handler in self._control_handlers.get(message.get("control"), []):
+            try:
+                handler()
+            except Exception as e:
+                print(f"[EventBroker] ERROR handling control message {message.get('control')}: {e}")
+
+    def _deliver(self, event_id: int, data: str, bnb_id: int | None = None, kind: str | None = None):
+        if kind == CONTROL_KIND:
+            self._on_control(data)
+            return
+
+        with self._lock:
+            self._latest_id = event_id
+            event = (event_id, data, time.monotonic(), bnb_id, kind)
+            self._ring.append(event)
+            self._published += 1
+
+            for subscriber in self._subscribers.values():
+                if not subscriber.wants(bnb_id, kind):
+                    self._filtered += 1
+                    continue
+                if len(subscriber.queue) == subscriber.queue.maxlen:
+                    subscriber.dropped += 1
+                subscriber.queue.append(event)
+                subscriber.ready.notify()
+
+    def subscribe(self, last_event_id: int | None = None, host_id: int | None = None,
+                  kinds: frozenset | None = None) -> Subscriber:
+        """Registers a client; its events after last_event_id still in the ring are queued first."""
+        with self._lock:
+            subscriber = Subscriber(self._next_subscriber, self._lock, self._max_queue, host_id, kinds)
+            self._next_subscriber += 1
+
+            if last_event_id is not None:
+                missed = [
+                    event for event in self._ring
+                    if event[0] > last_event_id and subscriber.wants(event[3], event[4])
+                ]
+                if self._ring and self._ring[0][0] > last_event_id + 1:
+                    # Some of the gap already fell out of the ring
+                    self._replay_gaps += 1
+                subscriber.queue.extend(missed)
+                subscriber.dropped += max(len(missed) - self._max_queue, 0)
+                self._replayed += len(missed)
+
+            self._subscribers[subscriber.id] = subscriber
+            return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            self._subscribers.pop(subscriber.id, None)
+
+    def qsize(self) -> int:
+        """Largest backlog of any subscriber."""
+        with self._lock:
+            return max((len(s.queue) for s in self._subscribers.values()), default=0)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            latest_id = self._latest_id
+            subscribers = [{
+                "id": s.id,
+                "host_id": s.host_id,
+                "kinds": sorted(s.kinds) if s.kinds is not None else None,
+                "queued": len(s.queue),
+                # Only events this client would receive count as lag
+                "lag_events": len(s.queue),
+                "lag_seconds": round(now - s.queue[0][2], 3) if s.queue else 0.0,
+                "delivered": s.delivered,
+                "dropped": s.dropped,
+                "connected_seconds": round(now - s.connected_at, 1),
+            } for s in self._subscribers.values()]
+
+            return {
+                "latest_id": latest_id,
+                "published": self._published,
+                "filtered": self._filtered,
+                "ring_size": len(self._ring),
+                "replayed": self._replayed,
+                "replay_gaps": self._replay_gaps,
+                "control_messages": self._controls,
+                "subscriber_count": len(subscribers),
+                "subscribers": subscribers,
+                "bus": self._bus.stats(),
+            }
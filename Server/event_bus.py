@@ -0,0 +1,199 @@
+import os
+import time
+import sqlite3
+import threading
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+STREAM_BUS = os.getenv("STREAM_BUS", "memory")     # memory | sqlite
+STREAM_BUS_PATH = os.getenv(
+    "STREAM_BUS_PATH",
+    os.path.join(os.path.dirname(__file__), "spool", "event_bus.sqlite3"),
+)
+STREAM_BUS_POLL_MS = float(os.getenv("STREAM_BUS_POLL_MS", "50"))
+# Rows kept in the log for replay; older ones are pruned as new ones arrive
+STREAM_BUS_KEEP = int(os.getenv("STREAM_BUS_KEEP", "10000"))
+STREAM_BUS_BATCH = 500
+
+
+# ------------------------------------------------------
+# Bus Interface
+# ------------------------------------------------------
+class EventBus:
+    """
+    Ordered event stream behind the SSE broker.
+
+    publish() appends an event; every process's broker receives each event
+    exactly once, in order, through the deliver(event_id, data, bnb_id, kind)
+    callback passed to attach(). bnb_id and kind travel beside the JSON so
+    the broker can route events without parsing them. Event ids come from
+    the bus so they are the same in every process, which lets a client
+    resume on any worker.
+    """
+    name = "base"
+
+    def attach(self, deliver, history: int = 0):
+        """Sets the delivery callback; history = how many recent events to deliver first (for replay)."""
+        self._deliver = deliver
+        self._history = history
+
+    def start(self):
+        """Starts background delivery, if the backend has any. Called once per process."""
+
+    def publish(self, data: str, bnb_id: int | None = None, kind: str | None = None) -> int | None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+# ------------------------------------------------------
+# In-process Backend
+# ------------------------------------------------------
+class InProcessBus(EventBus):
+    """Delivers straight to this process's broker; fine while the server runs as one worker."""
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Seeded from the clock in ms so ids keep increasing across restarts
+        self._next_id = int(time.time() * 1000)
+
+    def publish(self, data: str, bnb_id: int | None = None, kind: str | None = None) -> int:
+        # Held while delivering so events reach the broker in id order
+        with self._lock:
+            event_id = self._next_id
+            self._next_id += 1
+            self._deliver(event_id, data, bnb_id, kind)
+        return event_id
+
+
+# ------------------------------------------------------
+# SQLite WAL Log Backend
+# ------------------------------------------------------
+class SqliteLogBus(EventBus):
+    """
+    Shared log in a local SQLite file in WAL mode, so several workers on one
+    host publish to and read from the same ordered stream with no broker.
+
+    publish() is one INSERT; the rowid (AUTOINCREMENT, never reused) is the
+    event id. Each process tails the log on its own thread: every
+    STREAM_BUS_POLL_MS it reads PRAGMA data_version, which only changes when
+    another connection commits, and runs the rowid range query only then.
+    The log is trimmed to the newest STREAM_BUS_KEEP rows.
+    """
+    name = "sqlite"
+
+    def __init__(self, path=STREAM_BUS_PATH):
+        self._path = path
+        self._lock = threading.Lock()
+        self._writer = None
+        self._thread = None
+        self._last_id = 0
+        self._published = 0
+        self._delivered = 0
+        self._polls = 0
+        self._reads = 0
+        self._errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        connection = sqlite3.connect(self._path, timeout=5, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL, created_at REAL NOT NULL, "
+            "bnb_id INTEGER, kind TEXT)"
+        )
+        # Logs written before events carried their BnB and kind
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(events)")}
+        for column, sql_type in (("bnb_id", "INTEGER"), ("kind", "TEXT")):
+            if column not in columns:
+                try:
+                    connection.execute(f"ALTER TABLE events ADD COLUMN {column} {sql_type}")
+                except sqlite3.OperationalError:
+                    pass    # another worker added it first
+        return connection
+
+    def publish(self, data: str, bnb_id: int | None = None, kind: str | None = None) -> int | None:
+        try:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = self._connect()
+                event_id = self._writer.execute(
+                    "INSERT INTO events (data, created_at, bnb_id, kind) VALUES (?, ?, ?, ?)",
+                    (data, time.time(), bnb_id, kind),
+                ).lastrowid
+                self._published += 1
+                if event_id % STREAM_BUS_BATCH == 0:
+                    self._writer.execute("DELETE FROM events WHERE id <= ?", (event_id - STREAM_BUS_KEEP,))
+            return event_id
+        except sqlite3.Error as e:
+            with self._lock:
+                self._errors += 1
+            print(f"[EventBus] ERROR appending to {self._path}: {e}")
+            return None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._tail, name="event-bus-tail", daemon=True)
+        self._thread.start()
+        print(f"[EventBus] Tailing {self._path} every {STREAM_BUS_POLL_MS}ms.")
+
+    def _tail(self):
+        reader = self._connect()
+        newest = reader.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        # Deliver recent history first so the broker can replay it to reconnecting clients
+        self._last_id = max(newest - self._history, 0)
+        version = None
+
+        while True:
+            try:
+                current = reader.execute("PRAGMA data_version").fetchone()[0]
+                self._polls += 1
+                if current != version:
+                    version = current
+                    self._read_new(reader)
+            except sqlite3.Error as e:
+                with self._lock:
+                    self._errors += 1
+                print(f"[EventBus] ERROR reading {self._path}: {e}")
+            time.sleep(STREAM_BUS_POLL_MS / 1000)
+
+    def _read_new(self, reader: sqlite3.Connection):
+        while True:
+            rows = reader.execute(
+                "SELECT id, data, bnb_id, kind FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (self._last_id, STREAM_BUS_BATCH),
+            ).fetchall()
+            self._reads += 1
+            for event_id, data, bnb_id, kind in rows:
+                self._deliver(event_id, data, bnb_id, kind)
+                self._last_id = event_id
+            self._delivered += len(rows)
+            if len(rows) < STREAM_BUS_BATCH:
+                return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "path": self._path,
+                "last_delivered_id": self._last_id,
+                "published": self._published,
+                "delivered": self._delivered,
+                "polls": self._polls,
+                "reads": self._reads,
+                "errors": self._errors,
+            }
+
+
+def create_event_bus(kind: str = STREAM_BUS) -> EventBus:
+    if kind == "sqlite":
+        return SqliteLogBus()
+    if kind != "memory":
+        print(f"[EventBus] Unknown STREAM_BUS '{kind}', using memory.")
+    return InProcessBus()
@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+# Long enough to cover PubNub redelivery and the Pi's own publish retries
+DEDUPE_TTL_SECONDS = float(os.getenv("EVENT_DEDUPE_TTL_SECONDS", "3600"))
+DEDUPE_MAX_ENTRIES = int(os.getenv("EVENT_DEDUPE_MAX_ENTRIES", "50000"))
+
+
+def event_key(msg: dict) -> str | None:
+    """
+    Identity of a Pi message: its kind plus its event_id (tap_id for Pis that
+    predate event ids). Follow-ups reuse their parent's id, so the kind keeps
+    a 'tamper_snapshot' apart from the 'tamper' alert it belongs to.
+    Returns None for messages without an id, which are never deduplicated.
+    """
+    ref = msg.get("event_id") or msg.get("tap_id")
+    if not ref:
+        return None
+    kind = msg.get("type") or msg.get("event") or ("tap" if "nfc_uid" in msg else "message")
+    return f"{kind}:{ref}"
+
+
+# ------------------------------------------------------
+# Seen-set for Incoming Pi Events
+# ------------------------------------------------------
+class EventDedupe:
+    """
+    Drops Pi messages that have already been handled. PubNub delivers at
+    least once and the Pi republishes on retries, so the same tap or tamper
+    alert can arrive more than once.
+
+    Keys live in an insertion-ordered dict for DEDUPE_TTL_SECONDS, capped at
+    DEDUPE_MAX_ENTRIES (oldest evicted first), so a check is O(1) and runs
+    on the PubNub callback before any S3, Rekognition or DB work. A message
+    is only marked seen once it has been handled, so a redelivery of one
+    whose handling failed is processed again. The seen-set
+    is in memory only; the unique event_id columns on AccessLog and
+    TamperAlert stop a redelivery after a restart from writing a second row.
+    """
+    _lock = threading.Lock()
+    _seen = OrderedDict()       # key -> first seen at (monotonic)
+
+    _checked = 0
+    _duplicates = 0
+    _evicted = 0
+
+    @staticmethod
+    def is_duplicate(msg: dict) -> bool:
+        """Returns True if the message was already handled. Does not record it; see mark_seen()."""
+        key = event_key(msg)
+        if key is None:
+            return False
+
+        cutoff = time.monotonic() - DEDUPE_TTL_SECONDS
+        with EventDedupe._lock:
+            EventDedupe._checked += 1
+
+            seen_at = EventDedupe._seen.get(key)
+            if seen_at is not None and seen_at >= cutoff:
+                EventDedupe._duplicates += 1
+                return True
+        return False
+
+    @staticmethod
+    def mark_seen(msg: dict):
+        """Records a message that has been handled, so later redeliveries are dropped."""
+        key = event_key(msg)
+        if key is None:
+            return
+
+        now = time.monotonic()
+        cutoff = now - DEDUPE_TTL_SECONDS
+        with EventDedupe._lock:
+            EventDedupe._seen.pop(key, None)
+            EventDedupe._seen[key] = now
+            while EventDedupe._seen:
+                oldest_key, oldest_at = next(iter(EventDedupe._seen.items()))
+                if oldest_at >= cutoff and len(EventDedupe._seen) <= DEDUPE_MAX_ENTRIES:
+                    break
+                del EventDedupe._seen[oldest_key]
+                EventDedupe._evicted += 1
+
+    @staticmethod
+    def stats() -> dict:
+        with EventDedupe._lock:
+            checked = EventDedupe._checked
+            return {
+                "tracked": len(EventDedupe._seen),
+                "checked": checked,
+                "duplicates": EventDedupe._duplicates,
+                "duplicate_rate": round(EventDedupe._duplicates / checked, 4) if checked else 0,
+                "evicted": EventDedupe._evicted,
+                "ttl_seconds": DEDUPE_TTL_SECONDS,
+            }
@@ -0,0 +1,424 @@
+import os
+import glob
+import json
+import time
+import atexit
+import threading
+from datetime import datetime, timezone
+from .metrics import Metrics
+from .file_lock import try_lock
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+FLUSH_INTERVAL_MS = int(os.getenv("EVENT_WRITER_FLUSH_MS", "500"))
+FLUSH_MAX_ROWS = int(os.getenv("EVENT_WRITER_FLUSH_ROWS", "200"))
+JOURNAL_FSYNC = os.getenv("EVENT_WRITER_FSYNC", "1") == "1"
+
+BASE_DIR = os.path.dirname(__file__)
+SPOOL_DIR = os.path.join(BASE_DIR, "spool")
+# Each process journals in its own slot, event_journal.<slot>.jsonl, owned through <slot>.lock
+MAX_JOURNAL_SLOTS = 64
+# Rows the database rejects even on their own, kept for a human to look at
+DEAD_LETTER_PATH = os.path.join(SPOOL_DIR, "event_dead_letters.jsonl")
+# How long the live table columns are trusted before they are looked up again
+COLUMN_CHECK_SECONDS = float(os.getenv("EVENT_WRITER_COLUMN_CHECK_SECONDS", "60"))
+
+
+def _slot_paths(slot) -> tuple[str, str, str]:
+    """(journal, flushing, lock) paths of a journal slot."""
+    journal = os.path.join(SPOOL_DIR, f"event_journal.{slot}.jsonl")
+    return journal, journal + ".flushing", os.path.join(SPOOL_DIR, f"event_journal.{slot}.lock")
+
+# Columns stored as datetimes; serialised as ISO strings in the journal
+_DATETIME_FIELDS = {"time_logged", "triggered_at"}
+
+
+def _encode(row: dict) -> dict:
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+
+
+def _decode(row: dict) -> dict:
+    return {k: datetime.fromisoformat(v) if k in _DATETIME_FIELDS and v else v for k, v in row.items()}
+
+
+# ------------------------------------------------------
+# Write-behind AccessLog / TamperAlert Writer
+# ------------------------------------------------------
+class EventWriter:
+    """
+    Buffers AccessLog and TamperAlert rows and bulk-inserts them every
+    FLUSH_INTERVAL_MS or FLUSH_MAX_ROWS rows, whichever comes first.
+
+    Every row is appended to an on-disk journal before it is buffered. A
+    flush rotates the journal aside and deletes it only after the insert
+    commits, so a crash at any point leaves the rows on disk to be replayed
+    on the next start. Remaining rows are flushed at interpreter exit.
+
+    Each process owns one journal slot, held by an OS file lock, so workers
+    never rotate each other's files. At start a process also adopts the
+    slots of processes that died, replaying their rows.
+
+    If a batch fails, its rows are retried one at a time. While the
+    database is reachable, rows that still fail are moved to
+    DEAD_LETTER_PATH, so one bad row cannot hold up the rest. If the
+    database is down, they are kept for the next flush.
+
+    Columns the live table does not have yet (event_id before migration
+    0001 has run) are left out of the insert rather than failing it; the
+    table's columns are looked up again every COLUMN_CHECK_SECONDS and
+    after any failed insert.
+    """
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _buffer = []                # [(model_name, row), ...]
+    _retry = []                 # rows from a failed flush, still in the pending journal
+    _journal = None
+    _journal_path = None
+    _flushing_path = None
+    _slot = None
+    _slot_lock = None
+    _app_instance = None
+    _thread = None
+    _columns = {}               # model name -> (column keys in the live table, checked at)
+    _warned_columns = set()
+
+    _flushes = 0
+    _rows_written = 0
+    _flush_errors = 0
+    _dead_letter_rows = 0
+    _adopted_rows = 0
+    _last_flush_ms = 0.0
+    _max_flush_ms = 0.0
+    _total_flush_ms = 0.0
+    _max_batch = 0
+
+    @staticmethod
+    def add(model_name: str, **row):
+        """Queues one row for model_name ("AccessLog" or "TamperAlert")."""
+        if EventWriter._thread is None:
+            # Not started (e.g. one-off scripts): write through in the caller's app context.
+            EventWriter._insert([(model_name, row)])
+            return
+
+        line = json.dumps({"model": model_name, "row": _encode(row)})
+
+        with EventWriter._lock:
+            EventWriter._journal.write(line + "\n")
+            EventWriter._journal.flush()
+            if JOURNAL_FSYNC:
+                os.fsync(EventWriter._journal.fileno())
+            EventWriter._buffer.append((model_name, row))
+            full = len(EventWriter._buffer) >= FLUSH_MAX_ROWS
+
+        if full:
+            EventWriter._wakeup.set()
+
+    @staticmethod
+    def flush():
+        """Writes everything buffered so far (plus any failed batch) in one transaction."""
+        with EventWriter._flush_lock:
+            with EventWriter._lock:
+                batch = EventWriter._retry + EventWriter._buffer
+                EventWriter._buffer = []
+                EventWriter._retry = []
+                if not batch:
+                    return
+
+                # Rotate the journal; rows arriving from now on go to a fresh file.
+                journal_path, flushing_path = EventWriter._journal_path, EventWriter._flushing_path
+                EventWriter._journal.close()
+                if os.path.exists(flushing_path):
+                    # A previous flush failed; keep everything unsaved in the one pending file.
+                    with open(flushing_path, "a") as pending, open(journal_path) as current:
+                        pending.write(current.read())
+                    os.remove(journal_path)
+                else:
+                    os.replace(journal_path, flushing_path)
+                EventWriter._journal = open(journal_path, "a")
+
+            started = time.perf_counter()
+            try:
+                with EventWriter._app_instance.app_context():
+                    EventWriter._insert(batch)
+            except Exception as e:
+                Metrics.observe("db_flush", time.perf_counter() - started, "error")
+                Metrics.increment("db_flush_errors_total")
+                print(f"[EventWriter] ERROR flushing {len(batch)} rows, retrying them one at a time: {e}")
+                EventWriter._salvage(batch)
+                return
+
+            os.remove(flushing_path)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            Metrics.observe("db_flush", elapsed_ms / 1000)
+
+            with EventWriter._lock:
+                EventWriter._flushes += 1
+                EventWriter._rows_written += len(batch)
+                EventWriter._last_flush_ms = elapsed_ms
+                EventWriter._max_flush_ms = max(EventWriter._max_flush_ms, elapsed_ms)
+                EventWriter._total_flush_ms += elapsed_ms
+                EventWriter._max_batch = max(EventWriter._max_batch, len(batch))
+
+    @staticmethod
+    def _salvage(batch):
+        """After a failed batch: writes what it can row by row, dead-letters rows the database rejects."""
+        written, failed = 0, []
+        with EventWriter._app_instance.app_context():
+            for model_name, row in batch:
+                try:
+                    EventWriter._insert([(model_name, row)])
+                    written += 1
+                except Exception as e:
+                    failed.append((model_name, row, str(e)))
+            reachable = bool(failed) and EventWriter._database_reachable()
+
+        retry = []
+        if failed and reachable:
+            EventWriter._dead_letter(failed)
+            Metrics.increment("db_dead_letter_rows_total", len(failed))
+            print(f"[EventWriter] Moved {len(failed)} rejected rows to {DEAD_LETTER_PATH}.")
+        elif failed:
+            retry = [(model_name, row) for model_name, row, _ in failed]
+
+        # The pending journal now only needs the rows still to be retried
+        if retry:
+            with open(EventWriter._flushing_path + ".tmp", "w") as pending:
+                for model_name, row in retry:
+                    pending.write(json.dumps({"model": model_name, "row": _encode(row)}) + "\n")
+            os.replace(EventWriter._flushing_path + ".tmp", EventWriter._flushing_path)
+        else:
+            os.remove(EventWriter._flushing_path)
+
+        with EventWriter._lock:
+            EventWriter._retry = retry
+            EventWriter._flush_errors += 1
+            EventWriter._rows_written += written
+            if reachable:
+                EventWriter._dead_letter_rows += len(failed)
+
+    @staticmethod
+    def _database_reachable() -> bool:
+        from sqlalchemy import text
+        from . import db
+
+        try:
+            db.session.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            return False
+        finally:
+            db.session.rollback()
+
+    @staticmethod
+    def _dead_letter(failed):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        failed_at = datetime.now(timezone.utc).isoformat()
+        with open(DEAD_LETTER_PATH, "a") as dead_letters:
+            for model_name, row, error in failed:
+                dead_letters.write(json.dumps({
+                    "model": model_name, "row": _encode(row), "error": error, "failed_at": failed_at
+                }) + "\n")
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+
+    @staticmethod
+    def _insert(batch):
+        """Bulk-inserts (model_name, row) pairs. Needs an app context."""
+        from sqlalchemy import insert
+        from sqlalchemy.dialects import mysql, sqlite
+        from . import db
+        from .models import AccessLog, TamperAlert
+
+        models = {"AccessLog": AccessLog, "TamperAlert": TamperAlert}
+        grouped = {}
+        for model_name, row in batch:
+            grouped.setdefault(model_name, []).append(row)
+
+        # One executemany needs the same columns in every row (journals written before a column existed lack it),
+        # and only columns the table has (event_id before its migration has run)
+        for model_name, rows in grouped.items():
+            columns = set().union(*rows) & EventWriter.live_columns(model_name)
+            grouped[model_name] = [{column: row.get(column) for column in columns} for row in rows]
+
+        dialect = db.session.get_bind().dialect.name
+        try:
+            for model_name, rows in grouped.items():
+                model = models[model_name]
+                # A redelivered event already in the table (unique event_id) is skipped, not an error,
+                # otherwise one duplicate would fail the whole batch and be retried forever. Only that
+                # conflict is skipped: INSERT IGNORE would also hide NOT NULL, foreign key and truncation errors.
+                if "event_id" not in rows[0]:
+                    statement = insert(model)
+                elif dialect == "mysql":
+                    statement = mysql.insert(model).on_duplicate_key_update(event_id=model.event_id)
+                elif dialect == "sqlite":
+                    statement = sqlite.insert(model).on_conflict_do_nothing(index_elements=["event_id"])
+                else:
+                    statement = insert(model)
+                db.session.execute(statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            EventWriter._columns = {}
+            raise
+
+    @staticmethod
+    def live_columns(model_name: str) -> set:
+        """Column keys of model_name that exist in the database table. Needs an app context."""
+        from sqlalchemy import inspect
+        from . import db, models
+
+        cached = EventWriter._columns.get(model_name)
+        if cached is not None and time.monotonic() - cached[1] < COLUMN_CHECK_SECONDS:
+            return cached[0]
+
+        table = getattr(models, model_name).__table__
+        try:
+            names = {column["name"] for column in inspect(db.engine).get_columns(table.name)}
+        except Exception as e:
+            # Let the insert itself report the problem (e.g. the table is missing)
+            print(f"[EventWriter] ERROR reading the columns of {table.name}: {e}")
+            return {column.key for column in table.columns}
+
+        columns = {column.key for column in table.columns if column.name in names}
+        for column in table.columns:
+            if column.name not in names and (table.name, column.name) not in EventWriter._warned_columns:
+                EventWriter._warned_columns.add((table.name, column.name))
+                print(f"[EventWriter] WARNING: {table.name}.{column.name} does not exist yet and is left out of "
+                      "inserts. Run `python Server/migrate.py upgrade`.")
+        EventWriter._columns[model_name] = (columns, time.monotonic())
+        return columns
+
+    @staticmethod
+    def _read_journal(path):
+        batch = []
+        if not os.path.exists(path):
+            return batch
+        with open(path) as journal:
+            for line in journal:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Torn final line from a crash mid-write
+                    continue
+                batch.append((entry["model"], _decode(entry["row"])))
+        return batch
+
+    @staticmethod
+    def stats() -> dict:
+        with EventWriter._lock:
+            flushes = EventWriter._flushes
+            return {
+                "pending_rows": len(EventWriter._buffer) + len(EventWriter._retry),
+                "flushes": flushes,
+                "rows_written": EventWriter._rows_written,
+                "flush_errors": EventWriter._flush_errors,
+                "dead_letter_rows": EventWriter._dead_letter_rows,
+                "journal_slot": EventWriter._slot,
+                "adopted_rows": EventWriter._adopted_rows,
+                "avg_batch_size": round(EventWriter._rows_written / flushes, 2) if flushes else 0,
+                "max_batch_size": EventWriter._max_batch,
+                "last_flush_ms": round(EventWriter._last_flush_ms, 2),
+                "avg_flush_ms": round(EventWriter._total_flush_ms / flushes, 2) if flushes else 0,
+                "max_flush_ms": round(EventWriter._max_flush_ms, 2),
+            }
+
+    @staticmethod
+    def _flush_loop():
+        while True:
+            EventWriter._wakeup.wait(FLUSH_INTERVAL_MS / 1000)
+            EventWriter._wakeup.clear()
+            EventWriter.flush()
+
+    @staticmethod
+    def start(app_instance):
+        if EventWriter._thread is not None:
+            return
+
+        EventWriter._app_instance = app_instance
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        if not EventWriter._claim_slot():
+            print(f"[EventWriter] ERROR: all {MAX_JOURNAL_SLOTS} journal slots are taken, writing through.")
+            return
+        EventWriter._adopt_orphans()
+
+        # Replay rows left behind by a crash before accepting new ones.
+        with EventWriter._lock:
+            EventWriter._buffer = (
+                EventWriter._read_journal(EventWriter._flushing_path)
+                + EventWriter._read_journal(EventWriter._journal_path)
+            )
+            EventWriter._journal = open(EventWriter._journal_path, "a")
+        if EventWriter._buffer:
+            print(f"[EventWriter] Replaying journal ({len(EventWriter._buffer)} rows pending).")
+            EventWriter.flush()
+
+        EventWriter._thread = threading.Thread(target=EventWriter._flush_loop, name="event-writer", daemon=True)
+        EventWriter._thread.start()
+        atexit.register(EventWriter.flush)
+        print(f"[EventWriter] Write-behind started on journal slot {EventWriter._slot} "
+              f"(every {FLUSH_INTERVAL_MS}ms or {FLUSH_MAX_ROWS} rows).")
+
+    @staticmethod
+    def _claim_slot() -> bool:
+        """Locks the first free journal slot for this process (a dead owner's slot is free again)."""
+        for slot in range(MAX_JOURNAL_SLOTS):
+            journal_path, flushing_path, lock_path = _slot_paths(slot)
+            handle = try_lock(lock_path)
+            if handle is not None:
+                EventWriter._slot, EventWriter._slot_lock = slot, handle
+                EventWriter._journal_path, EventWriter._flushing_path = journal_path, flushing_path
+                return True
+        return False
+
+    @staticmethod
+    def _adopt_orphans():
+        """
+        Moves rows from slots no live process holds (workers that died and
+        were not replaced) and from the single pre-slot journal into this
+        process's journal, which start() then replays.
+        """
+        orphans = []
+        for lock_path in glob.glob(os.path.join(SPOOL_DIR, "event_journal.*.lock")):
+            slot = os.path.basename(lock_path).split(".")[1]
+            if slot == str(EventWriter._slot):
+                continue
+            handle = try_lock(lock_path)
+            if handle is not None:
+                journal_path, flushing_path, _ = _slot_paths(slot)
+                orphans.append((handle, [flushing_path, journal_path]))
+
+        # Journal from before slots existed; renamed first so only one process takes it
+        legacy = []
+        for path in (os.path.join(SPOOL_DIR, "event_journal.jsonl.flushing"), os.path.join(SPOOL_DIR, "event_journal.jsonl")):
+            claimed = f"{path}.adopted.{EventWriter._slot}"
+            try:
+                os.rename(path, claimed)
+                legacy.append(claimed)
+            except OSError:
+                continue
+        if legacy:
+            orphans.append((None, legacy))
+
+        for handle, paths in orphans:
+            rows = []
+            for path in paths:
+                rows += EventWriter._read_journal(path)
+            if rows:
+                with open(EventWriter._journal_path, "a") as journal:
+                    for model_name, row in rows:
+                        journal.write(json.dumps({"model": model_name, "row": _encode(row)}) + "\n")
+                    journal.flush()
+                    os.fsync(journal.fileno())
+                EventWriter._adopted_rows += len(rows)
+                print(f"[EventWriter] Adopted {len(rows)} rows from {', '.join(os.path.basename(p) for p in paths)}.")
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+            if handle is not None:
+                handle.close()
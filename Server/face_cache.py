@@ -0,0 +1,202 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+MAX_BYTES = int(os.getenv("FACE_CACHE_MAX_MB", "64")) * 1024 * 1024
+PRELOAD_HOURS = float(os.getenv("FACE_PRELOAD_HOURS", "6"))
+PRELOAD_INTERVAL_SECONDS = float(os.getenv("FACE_PRELOAD_INTERVAL_SECONDS", "300"))
+
+# User.photo_path is stored relative to the project root (one level up from 'Server')
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@lru_cache(maxsize=4096)
+def resolve_reference_path(photo_path: str) -> str:
+    """'uploads/profile_images/user_2_x.jpg' -> absolute path on this machine."""
+    return os.path.join(PROJECT_ROOT, *photo_path.split('/'))
+
+
+# ------------------------------------------------------
+# Reference Face Cache
+# ------------------------------------------------------
+class FaceCache:
+    """
+    LRU cache of reference-image bytes keyed by user id.
+
+    Each entry remembers the file's mtime, so a re-uploaded photo is picked
+    up even if the explicit invalidation is missed. The total size is capped
+    at MAX_BYTES; least recently used entries are evicted first. A preloader
+    thread fills the cache for guests checking in within PRELOAD_HOURS.
+
+    Reference listeners (on_reference) are handed every photo the preloader
+    loads or that refresh() reads after an upload, so derived data such as
+    face embeddings is built off the tap path.
+    """
+    _lock = threading.Lock()
+    _entries = OrderedDict()     # user_id -> (mtime, bytes)
+    _size = 0
+    _listeners = []              # callables (user_id, reference bytes)
+
+    _hits = 0
+    _misses = 0
+    _evictions = 0
+    _preloaded = 0
+
+    _app_instance = None
+    _thread = None
+
+    @staticmethod
+    def get(user_id: int, photo_path: str, count: bool = True) -> bytes | None:
+        """Returns the reference image bytes, or None if the file does not exist."""
+        path = resolve_reference_path(photo_path)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            FaceCache.invalidate(user_id)
+            return None
+
+        with FaceCache._lock:
+            entry = FaceCache._entries.get(user_id)
+            if entry and entry[0] == mtime:
+                FaceCache._entries.move_to_end(user_id)
+                if count:
+                    FaceCache._hits += 1
+                return entry[1]
+            if count:
+                FaceCache._misses += 1
+
+        try:
+            with open(path, 'rb') as ref_file:
+                data = ref_file.read()
+        except OSError:
+            return None
+
+        FaceCache._put(user_id, mtime, data)
+        return data
+
+    @staticmethod
+    def _put(user_id: int, mtime: float, data: bytes):
+        if len(data) > MAX_BYTES:
+            return
+
+        with FaceCache._lock:
+            old = FaceCache._entries.pop(user_id, None)
+            if old:
+                FaceCache._size -= len(old[1])
+
+            FaceCache._entries[user_id] = (mtime, data)
+            FaceCache._size += len(data)
+
+            while FaceCache._size > MAX_BYTES:
+                _, (_, evicted) = FaceCache._entries.popitem(last=False)
+                FaceCache._size -= len(evicted)
+                FaceCache._evictions += 1
+
+    @staticmethod
+    def on_reference(listener):
+        FaceCache._listeners.append(listener)
+
+    @staticmethod
+    def _notify(user_id: int, data: bytes):
+        for listener in FaceCache._listeners:
+            try:
+                listener(user_id, data)
+            except Exception as e:
+                print(f"[FaceCache] ERROR in reference listener for user {user_id}: {e}")
+
+    @staticmethod
+    def refresh(user_id: int, photo_path: str):
+        """A guest uploaded a new photo: drop the old one and load the new one in the background."""
+        FaceCache.invalidate(user_id)
+
+        def load():
+            data = FaceCache.get(user_id, photo_path, count=False)
+            if data is not None:
+                FaceCache._notify(user_id, data)
+
+        threading.Thread(target=load, name="face-refresh", daemon=True).start()
+
+    @staticmethod
+    def invalidate(user_id: int):
+        with FaceCache._lock:
+            old = FaceCache._entries.pop(user_id, None)
+            if old:
+                FaceCache._size -= len(old[1])
+
+    @staticmethod
+    def stats() -> dict:
+        with FaceCache._lock:
+            return {
+                "entries": len(FaceCache._entries),
+                "bytes": FaceCache._size,
+                "max_bytes": MAX_BYTES,
+                "hits": FaceCache._hits,
+                "misses": FaceCache._misses,
+                "evictions": FaceCache._evictions,
+                "preloaded": FaceCache._preloaded,
+            }
+
+    # --------------------------------------------------
+    # Arrival-driven preloading
+    # --------------------------------------------------
+    @staticmethod
+    def preload():
+        """Loads reference images for guests whose stay is active or starts within PRELOAD_HOURS."""
+        if not FaceCache._app_instance:
+            return
+
+        now = datetime.now(timezone.utc)
+        horizon = now + timedelta(hours=PRELOAD_HOURS)
+
+        try:
+            with FaceCache._app_instance.app_context():
+                from . import db
+                from .models import Booking, User, UserBooking
+
+                guests = (
+                    db.session.query(User.id, User.photo_path)
+                    .join(UserBooking, User.id == UserBooking.user_id)
+                    .join(Booking, Booking.id == UserBooking.booking_id)
+                    .filter(
+                        Booking.check_in_time <= horizon,
+                        Booking.check_out_time >= now,
+                        User.photo_path.isnot(None),
+                    )
+                    .distinct()
+                    .all()
+                )
+        except Exception as e:
+            print(f"[FaceCache] ERROR listing arriving guests: {e}")
+            return
+
+        loaded = 0
+        for user_id, photo_path in guests:
+            data = FaceCache.get(user_id, photo_path, count=False)
+            if data is not None:
+                FaceCache._notify(user_id, data)
+                loaded += 1
+
+        with FaceCache._lock:
+            FaceCache._preloaded += loaded
+
+    @staticmethod
+    def _preload_loop():
+        while True:
+            FaceCache.preload()
+            time.sleep(PRELOAD_INTERVAL_SECONDS)
+
+    @staticmethod
+    def start(app_instance):
+        if FaceCache._thread is not None:
+            return
+
+        FaceCache._app_instance = app_instance
+        FaceCache._thread = threading.Thread(target=FaceCache._preload_loop, name="face-preload", daemon=True)
+        FaceCache._thread.start()
+        print(f"[FaceCache] Preloading guests arriving within {PRELOAD_HOURS}h (every {PRELOAD_INTERVAL_SECONDS}s).")
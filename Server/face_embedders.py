@@ -0,0 +1,20 @@
+import io
+import numpy as np
+import face_recognition
+from PIL import Image
+
+# Embedders for the local face matcher (FACE_EMBEDDER). Each takes image bytes
+# and returns a 1-D vector. This module imports its libraries at load time, so
+# a missing one makes create_matcher fall back to Rekognition at startup
+# rather than failing every tap.
+
+
+def face_recognition_embedding(image: bytes):
+    """128-d dlib encoding of the largest face in the image (pip install face_recognition)."""
+    pixels = np.asarray(Image.open(io.BytesIO(image)).convert("RGB"))
+    locations = face_recognition.face_locations(pixels)
+    if not locations:
+        raise ValueError("No face found in the image.")
+    # (top, right, bottom, left)
+    largest = max(locations, key=lambda box: (box[2] - box[0]) * (box[1] - box[3]))
+    return face_recognition.face_encodings(pixels, known_face_locations=[largest])[0]
@@ -0,0 +1,268 @@
+import os
+import time
+import hashlib
+import importlib
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .metrics import Metrics
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+FACE_MATCHER = os.getenv("FACE_MATCHER", "rekognition")     # rekognition | local
+REKOGNITION_THRESHOLD = float(os.getenv("FACE_REKOGNITION_THRESHOLD", "85"))
+
+# Local backend: "package.module:function" taking image bytes and returning a 1-D vector
+# (a leading dot is relative to this package; the default needs the face_recognition package)
+FACE_EMBEDDER = os.getenv("FACE_EMBEDDER", ".face_embedders:face_recognition_embedding")
+LOCAL_THRESHOLD = float(os.getenv("FACE_LOCAL_THRESHOLD", "0.6"))
+EMBEDDINGS_PATH = os.getenv(
+    "FACE_EMBEDDINGS_PATH",
+    os.path.join(os.path.dirname(__file__), "spool", "face_embeddings.npz"),
+)
+
+
+# ------------------------------------------------------
+# Matcher Interface
+# ------------------------------------------------------
+class FaceMatcher:
+    """
+    Scores a door snapshot against the reference photos of candidate guests.
+
+    Backends implement _match(); the public match() wraps it with latency and
+    outcome counters so backends can be compared per deployment.
+    """
+    name = "base"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._matches = 0
+        self._no_matches = 0
+        self._errors = 0
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        # Why FACE_MATCHER's backend could not be used, if this is the fallback
+        self.fallback_reason = None
+
+    def match(self, snapshot: bytes, candidates: list[tuple[int | None, bytes]]) -> tuple[bool, int | None, float]:
+        """
+        candidates: [(user_id, reference_bytes), ...]; user_id may be None for a one-off comparison.
+        Returns (is_match, matched user id, similarity 0-100). Errors count as no match.
+        """
+        started = time.perf_counter()
+        try:
+            matched_user, similarity, is_match = self._match(snapshot, candidates)
+        except Exception as e:
+            print(f"[FaceMatcher:{self.name}] Error: {e}")
+            matched_user, similarity, is_match = None, 0.0, None
+
+        elapsed = time.perf_counter() - started
+        elapsed_ms = elapsed * 1000
+        outcome = "error" if is_match is None else ("match" if is_match else "no_match")
+        Metrics.observe(f"face_match_{self.name}", elapsed, outcome)
+        if is_match is None:
+            Metrics.increment("face_match_errors_total", backend=self.name)
+
+        with self._lock:
+            self._calls += 1
+            self._total_ms += elapsed_ms
+            self._max_ms = max(self._max_ms, elapsed_ms)
+            if is_match is None:
+                self._errors += 1
+            elif is_match:
+                self._matches += 1
+            else:
+                self._no_matches += 1
+
+        return (bool(is_match), matched_user, similarity)
+
+    def _match(self, snapshot, candidates):
+        """Returns (user_id, similarity, is_match)."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name,
+                "requested_backend": FACE_MATCHER,
+                "fallback_reason": self.fallback_reason,
+                "calls": self._calls,
+                "matches": self._matches,
+                "no_matches": self._no_matches,
+                "errors": self._errors,
+                "avg_ms": round(self._total_ms / self._calls, 2) if self._calls else 0,
+                "max_ms": round(self._max_ms, 2),
+            }
+
+
+# ------------------------------------------------------
+# AWS Rekognition Backend
+# ------------------------------------------------------
+class RekognitionMatcher(FaceMatcher):
+    """One compare_faces call per candidate, stopping at the first match."""
+    name = "rekognition"
+
+    def __init__(self, client):
+        super().__init__()
+        self._client = client
+
+    def _match(self, snapshot, candidates):
+        if not self._client:
+            raise RuntimeError("Rekognition client not available.")
+
+        for user_id, reference in candidates:
+            response = self._client.compare_faces(
+                SourceImage={'Bytes': snapshot},
+                TargetImage={'Bytes': reference},
+                SimilarityThreshold=REKOGNITION_THRESHOLD  #confidence threshold
+            )
+            # Check if there are any matches in the response
+            if response['FaceMatches']:
+                return (user_id, response['FaceMatches'][0]['Similarity'], True)
+
+        return (None, 0.0, False)
+
+
+# ------------------------------------------------------
+# Local Embedding Backend
+# ------------------------------------------------------
+class LocalEmbeddingMatcher(FaceMatcher):
+    """
+    Offline matcher over precomputed embeddings.
+
+    Reference embeddings are kept L2-normalised in one NumPy matrix (one row
+    per user) and persisted to EMBEDDINGS_PATH. They are built off the tap
+    path, by FaceCache when a reference photo is preloaded or uploaded
+    (enroll()); a reference is re-embedded only when its bytes change. A
+    snapshot is embedded once and scored against every candidate with a
+    single matrix-vector product.
+
+    Verification never writes the store: a candidate whose reference is not
+    enrolled (or has changed since) is embedded for that check only.
+    """
+    name = "local"
+
+    def __init__(self, embedder, embeddings_path=EMBEDDINGS_PATH, threshold=LOCAL_THRESHOLD):
+        super().__init__()
+        if np is None:
+            raise RuntimeError("numpy is required for the local face matcher.")
+
+        self._embed = embedder
+        self._path = embeddings_path
+        self._threshold = threshold
+        self._rows = {}          # user_id -> row in _matrix
+        self._digests = {}       # user_id -> sha1 of the reference bytes the row came from
+        self._matrix = None
+        self._store_lock = threading.Lock()
+        self._load()
+
+    def _vector(self, image: bytes):
+        vector = np.asarray(self._embed(image), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def enroll(self, user_id: int, reference: bytes):
+        """Stores (or refreshes) the embedding for a guest's reference photo."""
+        digest = hashlib.sha1(reference).hexdigest()
+        with self._store_lock:
+            if self._digests.get(user_id) == digest:
+                return
+
+        vector = self._vector(reference)
+
+        with self._store_lock:
+            if self._matrix is None:
+                self._matrix = vector[np.newaxis, :]
+                self._rows[user_id] = 0
+            elif user_id in self._rows:
+                self._matrix[self._rows[user_id]] = vector
+            else:
+                self._rows[user_id] = self._matrix.shape[0]
+                self._matrix = np.vstack([self._matrix, vector])
+            self._digests[user_id] = digest
+            self._save()
+
+    def _match(self, snapshot, candidates):
+        digests = [(user_id, hashlib.sha1(reference).hexdigest()) for user_id, reference in candidates]
+
+        with self._store_lock:
+            enrolled = {
+                user_id: self._rows[user_id]
+                for user_id, digest in digests
+                if user_id is not None and self._digests.get(user_id) == digest
+            }
+            # Fancy indexing copies, so the rows stay valid after the lock is released
+            stored = self._matrix[list(enrolled.values())] if enrolled else None
+
+        # One-off comparisons and references the preloader has not enrolled yet
+        unenrolled = [
+            (user_id, self._vector(reference))
+            for user_id, reference in candidates
+            if user_id is None or user_id not in enrolled
+        ]
+
+        if stored is None and not unenrolled:
+            return (None, 0.0, False)
+
+        query = self._vector(snapshot)
+        references = np.vstack(([stored] if stored is not None else []) + [v[np.newaxis, :] for _, v in unenrolled])
+        user_ids = list(enrolled) + [user_id for user_id, _ in unenrolled]
+
+        # Cosine similarity for every candidate at once (rows are unit length)
+        scores = references @ query
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        if score >= self._threshold:
+            return (user_ids[best], round(score * 100, 2), True)
+        return (None, round(score * 100, 2), False)
+
+    def _load(self):
+        if not os.path.exists(self._path):
+            return
+        try:
+            store = np.load(self._path, allow_pickle=False)
+            self._matrix = store["matrix"].astype(np.float32)
+            self._rows = {int(u): i for i, u in enumerate(store["user_ids"])}
+            self._digests = {int(u): str(d) for u, d in zip(store["user_ids"], store["digests"])}
+        except Exception as e:
+            print(f"[FaceMatcher:local] Could not load embeddings from {self._path}: {e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        by_row = sorted(self._rows.items(), key=lambda item: item[1])
+        tmp_path = self._path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            matrix=self._matrix,
+            user_ids=np.array([u for u, _ in by_row], dtype=np.int64),
+            digests=np.array([self._digests[u] for u, _ in by_row]),
+        )
+        os.replace(tmp_path, self._path)
+
+
+def _load_embedder(spec: str):
+    module_name, _, func_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name, package=__package__), func_name)
+
+
+def create_matcher(rekognition_client) -> FaceMatcher:
+    """Builds the backend selected by FACE_MATCHER, falling back to Rekognition."""
+    fallback_reason = None
+    if FACE_MATCHER == "local":
+        try:
+            return LocalEmbeddingMatcher(_load_embedder(FACE_EMBEDDER))
+        except Exception as e:
+            fallback_reason = str(e)
+            print(f"[FaceMatcher] ERROR: FACE_MATCHER=local requested but unavailable ({e}). "
+                  "FALLING BACK to AWS Rekognition; see /hardware/face_matcher.")
+
+    matcher = RekognitionMatcher(rekognition_client)
+    matcher.fallback_reason = fallback_reason
+    return matcher
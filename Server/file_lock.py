@@ -0,0 +1,29 @@
+import os
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+
+def try_lock(path: str):
+    """
+    Takes an exclusive, non-blocking lock on path (created if missing) and
+    returns the open file, which must stay open to hold the lock; None if
+    another process (or another open of the same file) already holds it.
+    The OS releases the lock when the file is closed or the process dies,
+    so a crashed holder never leaves a stale lock behind.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handle = open(path, "a+")
+    try:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        handle.close()
+        return None
+    return handle
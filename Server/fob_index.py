@@ -0,0 +1,236 @@
+import os
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+REFRESH_SECONDS = float(os.getenv("FOB_INDEX_REFRESH_SECONDS", "60"))
+
+
+def _as_utc(value: datetime) -> datetime:
+    """DB datetimes are stored naive (UTC); make them comparable with aware values."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+# ------------------------------------------------------
+# In-memory Active Fob Index
+# ------------------------------------------------------
+class FobIndex:
+    """
+    In-process map of fob UID -> (fob id, label, active booking windows).
+
+    The index is rebuilt by a background thread every REFRESH_SECONDS and
+    whenever a Fob/FobBooking/Booking write is committed. Any write bumps the
+    generation counter, which marks the current snapshot stale until the next
+    rebuild finishes, so lookups fall back to the database instead of serving
+    an out-of-date grant.
+
+    Writes committed by other workers arrive through notify_peers (the
+    event bus broadcast set up by HardwareService), so a revoke made on any
+    worker reaches the one answering taps straight away.
+    """
+    _lock = threading.Lock()
+    _entries = None         # uid -> (fob_id, label, [(active_from, active_until, booking_id), ...])
+    _built_generation = -1
+    _generation = 0
+    _built_at = None
+
+    _hits = 0
+    _misses = 0
+    _rebuilds = 0
+    _rebuild_errors = 0
+
+    _app_instance = None
+    _notify_peers = None
+    _thread = None
+    _wakeup = threading.Event()
+
+    # --------------------------------------------------
+    # Lookups
+    # --------------------------------------------------
+    @staticmethod
+    def lookup(uid: str, now: datetime) -> tuple[bool, str, int | None] | None:
+        """
+        Returns (granted, label, booking_id) from the index, or None when the
+        index is cold/stale and the caller must query the database.
+        """
+        with FobIndex._lock:
+            entries = FobIndex._entries
+            if entries is None or FobIndex._built_generation != FobIndex._generation:
+                FobIndex._misses += 1
+                return None
+            FobIndex._hits += 1
+
+        entry = entries.get(uid)
+        if entry is None:
+            return (False, "Unknown UID", None)
+
+        fob_id, label, windows = entry
+        for active_from, active_until, booking_id in windows:
+            if active_from <= now <= active_until:
+                return (True, label if label else f"Fob ID: {fob_id}", booking_id)
+
+        return (False, label if label else "Unknown UID", None)
+
+    @staticmethod
+    def snapshot() -> tuple[int, dict] | None:
+        """(generation, entries) of the current index, or None while it is cold/stale. Entries must not be mutated."""
+        with FobIndex._lock:
+            if FobIndex._entries is None or FobIndex._built_generation != FobIndex._generation:
+                return None
+            return (FobIndex._built_generation, FobIndex._entries)
+
+    @staticmethod
+    def stats() -> dict:
+        with FobIndex._lock:
+            return {
+                "hits": FobIndex._hits,
+                "misses": FobIndex._misses,
+                "rebuilds": FobIndex._rebuilds,
+                "rebuild_errors": FobIndex._rebuild_errors,
+                "fobs": len(FobIndex._entries) if FobIndex._entries is not None else 0,
+                "fresh": FobIndex._entries is not None and FobIndex._built_generation == FobIndex._generation,
+                "built_at": FobIndex._built_at.isoformat() if FobIndex._built_at else None,
+            }
+
+    # --------------------------------------------------
+    # Maintenance
+    # --------------------------------------------------
+    @staticmethod
+    def invalidate():
+        """Marks the index stale and wakes the refresh thread."""
+        with FobIndex._lock:
+            FobIndex._generation += 1
+        FobIndex._wakeup.set()
+
+    @staticmethod
+    def rebuild():
+        """Loads every fob and its not-yet-expired windows in two queries."""
+        if not FobIndex._app_instance:
+            return
+
+        with FobIndex._lock:
+            generation = FobIndex._generation
+
+        now = datetime.now(timezone.utc)
+
+        try:
+            with FobIndex._app_instance.app_context():
+                from . import db
+                from .models import Fob, FobBooking
+
+                entries = {
+                    uid: (fob_id, label, [])
+                    for fob_id, uid, label in db.session.query(Fob.id, Fob.uid, Fob.label).all()
+                }
+                id_to_uid = {fob_id: uid for uid, (fob_id, _, _) in entries.items()}
+
+                windows = (
+                    db.session.query(
+                        FobBooking.fob_id,
+                        FobBooking.active_from,
+                        FobBooking.active_until,
+                        FobBooking.booking_id,
+                    )
+                    .filter(FobBooking.is_active == True, FobBooking.active_until >= now)
+                    .order_by(FobBooking.active_from.asc())
+                    .all()
+                )
+        except Exception as e:
+            with FobIndex._lock:
+                FobIndex._rebuild_errors += 1
+            print(f"[FobIndex] ERROR rebuilding index: {e}")
+            return
+
+        for fob_id, active_from, active_until, booking_id in windows:
+            uid = id_to_uid.get(fob_id)
+            if uid is not None:
+                entries[uid][2].append((_as_utc(active_from), _as_utc(active_until), booking_id))
+
+        with FobIndex._lock:
+            FobIndex._entries = entries
+            FobIndex._built_generation = generation
+            FobIndex._built_at = now
+            FobIndex._rebuilds += 1
+
+    @staticmethod
+    def _refresh_loop():
+        while True:
+            FobIndex.rebuild()
+            FobIndex._wakeup.wait(REFRESH_SECONDS)
+            FobIndex._wakeup.clear()
+
+    @staticmethod
+    def start(app_instance, notify_peers=None):
+        """notify_peers: callable telling the other workers to invalidate their index."""
+        if FobIndex._thread is not None:
+            return
+
+        FobIndex._app_instance = app_instance
+        FobIndex._notify_peers = notify_peers
+        _register_listeners()
+
+        FobIndex._thread = threading.Thread(target=FobIndex._refresh_loop, name="fob-index", daemon=True)
+        FobIndex._thread.start()
+        print(f"[FobIndex] Refresh thread started (every {REFRESH_SECONDS}s).")
+
+
+# ------------------------------------------------------
+# SQLAlchemy Write Events
+# ------------------------------------------------------
+_INDEX_DIRTY = "fob_index_dirty"
+
+
+def _mark_dirty(mapper, connection, target):
+    # Stale immediately (lookups go to the DB), rebuilt once the write commits.
+    FobIndex.invalidate()
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_INDEX_DIRTY] = True
+
+
+def _on_orm_execute(orm_execute_state):
+    # Bulk query.delete()/update() bypass the mapper events above.
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in _WATCHED_MODELS:
+        FobIndex.invalidate()
+        orm_execute_state.session.info[_INDEX_DIRTY] = True
+
+
+def _on_commit(session):
+    if session.info.pop(_INDEX_DIRTY, False):
+        FobIndex.invalidate()
+        if FobIndex._notify_peers is not None:
+            FobIndex._notify_peers()
+
+
+def _on_rollback(session):
+    if session.info.pop(_INDEX_DIRTY, False):
+        FobIndex.invalidate()
+
+
+_WATCHED_MODELS = ()
+
+
+def _register_listeners():
+    global _WATCHED_MODELS
+    if _WATCHED_MODELS:
+        return
+
+    from .models import Fob, FobBooking, Booking
+    _WATCHED_MODELS = (Fob, FobBooking, Booking)
+
+    for model in _WATCHED_MODELS:
+        for name in ("after_insert", "after_update", "after_delete"):
+            event.listen(model, name, _mark_dirty)
+
+    event.listen(Session, "do_orm_execute", _on_orm_execute)
+    event.listen(Session, "after_commit", _on_commit)
+    event.listen(Session, "after_rollback", _on_rollback)
@@ -1,12 +1,55 @@
+import os
 import json 
-from flask import Blueprint, request, jsonify
+from functools import wraps
+from flask import Blueprint, Response, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
 # Import from your database models
-from .models import db, AccessLog, TamperAlert, Fob, Booking, BnB
+from .models import db, AccessLog, TamperAlert, Fob, Booking, BnB, User
 # Import service components
-from .hardware_service import HardwareService, message_queue, s3_download_and_delete 
+from .hardware_service import HardwareService, message_queue, s3_download_and_delete, face_matcher
+from .fob_index import FobIndex
+from .event_writer import EventWriter
+from .face_cache import FaceCache
+from .snapshot_store import SnapshotWriter
+from .snapshot_renditions import SnapshotRenditions
+from .s3_delete_queue import S3DeleteQueue
+from .host_scopes import HostScopes
+from .allow_list import AllowListPublisher
+from .late_snapshots import LateSnapshots
+from .event_dedupe import EventDedupe
+from .metrics import Metrics
+from .trace_store import TraceStore
 
 hardware_bp = Blueprint('hardware', __name__)
 
+
+def _admin_required(view):
+    """Diagnostic routes expose hosts, fobs and timings, so they need an admin token."""
+    @wraps(view)
+    @jwt_required()
+    def wrapper(*args, **kwargs):
+        user = User.query.get(int(get_jwt_identity()))
+        if not user or not user.is_admin():
+            return jsonify({"msg": "Unauthorized"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _leader_only(view):
+    """
+    Counters, latencies and traces are kept in each worker's memory, and only
+    the leader handles Pi messages, so a standby worker's copy would be empty
+    or stale. It answers 503 instead; retrying reaches another worker.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if HardwareService.is_follower():
+            response = jsonify({"error": "Not the hardware leader; retry to reach it", "pid": os.getpid()})
+            response.headers["Retry-After"] = "1"
+            return response, 503
+        return view(*args, **kwargs)
+    return wrapper
+
 @hardware_bp.route("/hardware/fob_tap", methods=["POST"])
 def handle_fob_tap_event():
     """
@@ -34,7 +77,7 @@ def handle_fob_tap_event():
         "access": access,
         "label": label,
         "booking_id": booking_id
-    }))
+    }), bnb_id, "access")
 
     return jsonify({"message": "Access decision published", "access": access}), 200
 
@@ -70,4 +113,180 @@ def handle_tamper_event():
     # Publish alert
     HardwareService.publish_tamper_alert(tamper_id, "Tamper detected!")
 
-    return jsonify({"message": "Tamper alert published", "snapshot": snapshot_path}), 200
\ No newline at end of file
+    return jsonify({"message": "Tamper alert published", "snapshot": snapshot_path}), 200
+
+
+@hardware_bp.route("/hardware/fob_index", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_fob_index_stats():
+    """
+    Hit/miss counters and freshness of the in-memory active-fob index.
+    """
+    return jsonify(FobIndex.stats()), 200
+
+
+@hardware_bp.route("/hardware/dispatcher", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_dispatcher_stats():
+    """
+    Queue depth and worker utilisation of the PubNub message dispatcher.
+    """
+    if not HardwareService._dispatcher:
+        return jsonify({"error": "Dispatcher not running"}), 503
+    return jsonify(HardwareService._dispatcher.stats()), 200
+
+
+@hardware_bp.route("/hardware/event_writer", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_event_writer_stats():
+    """
+    Flush latency and batch-size stats of the write-behind AccessLog/TamperAlert writer.
+    """
+    return jsonify(EventWriter.stats()), 200
+
+
+@hardware_bp.route("/hardware/face_cache", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_face_cache_stats():
+    """
+    Size and hit/miss counters of the reference-face cache.
+    """
+    return jsonify(FaceCache.stats()), 200
+
+
+@hardware_bp.route("/hardware/face_matcher", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_face_matcher_stats():
+    """
+    Backend name (and why it fell back, if it did) plus latency and match/no-match/error counters of the face matcher.
+    """
+    return jsonify(face_matcher.stats()), 200
+
+
+@hardware_bp.route("/hardware/snapshot_writer", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_snapshot_writer_stats():
+    """
+    Memory held by snapshots waiting to be written to disk.
+    """
+    return jsonify(SnapshotWriter.stats()), 200
+
+
+@hardware_bp.route("/hardware/snapshot_renditions", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_snapshot_rendition_stats():
+    """
+    Whether thumbnail/medium renditions are being built, and how many so far.
+    """
+    return jsonify(SnapshotRenditions.stats()), 200
+
+
+@hardware_bp.route("/hardware/leader", methods=["GET"])
+@_admin_required
+def get_leader_stats():
+    """
+    Whether the worker that answered is the one subscribed to the Pi channel.
+    """
+    return jsonify(HardwareService.stats()), 200
+
+
+@hardware_bp.route("/hardware/s3_deletes", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_s3_delete_stats():
+    """
+    Queue depth, retry list size and failure count of the batched S3 delete queue.
+    """
+    return jsonify(S3DeleteQueue.stats()), 200
+
+
+@hardware_bp.route("/hardware/allow_list", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_allow_list_stats():
+    """
+    Version and publish counts of the signed allow-list pushed to the Pi.
+    """
+    return jsonify(AllowListPublisher.stats()), 200
+
+
+@hardware_bp.route("/hardware/late_snapshots", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_late_snapshot_stats():
+    """
+    Events still waiting for a spooled photo from the Pi, and how many were linked.
+    """
+    return jsonify(LateSnapshots.stats()), 200
+
+
+@hardware_bp.route("/hardware/event_dedupe", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_event_dedupe_stats():
+    """
+    Pi messages checked against the seen-set and how many were dropped as duplicates.
+    """
+    return jsonify(EventDedupe.stats()), 200
+
+
+@hardware_bp.route("/hardware/latency", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_latency_stats():
+    """
+    p50/p95/p99 of each stage between a Pi message arriving and its decision and log, plus error counters.
+    """
+    return jsonify(Metrics.stats()), 200
+
+
+@hardware_bp.route("/metrics", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_metrics():
+    """
+    Stage latency histograms, S3/face-match error counters and queue depths for Prometheus.
+    """
+    return Response(Metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+@hardware_bp.route("/hardware/traces", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_recent_traces():
+    """
+    Most recent tap traces with their tap-to-unlock time and slowest span.
+    """
+    limit = request.args.get("limit", 50, type=int)
+    return jsonify({"traces": TraceStore.recent(limit), **TraceStore.stats()}), 200
+
+
+@hardware_bp.route("/hardware/traces/<trace_id>", methods=["GET"])
+@_admin_required
+@_leader_only
+def get_trace(trace_id):
+    """
+    Full tap-to-unlock timeline for one tap (trace id = tap_id), Pi and server spans on one axis.
+    """
+    timeline = TraceStore.timeline(trace_id)
+    if timeline is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(timeline), 200
+
+
+@hardware_bp.route("/hardware/stream", methods=["GET"])
+@_admin_required
+def get_stream_stats():
+    """
+    Connected /stream clients of the worker that answered, with their scope, backlog, lag and dropped events, and the host map they filter on.
+    """
+    stats = message_queue.stats()
+    stats["host_scopes"] = HostScopes.stats()
+    return jsonify(stats), 200
\ No newline at end of file
@@ -1,13 +1,30 @@
 import os
 import json
-import queue
+import time
 import boto3
+import threading
 from dotenv import load_dotenv
 from pubnub.pnconfiguration import PNConfiguration
 from pubnub.pubnub import PubNub
 from pubnub.callbacks import SubscribeCallback
 from datetime import datetime, timezone
 from pubnub.crypto import AesCbcCryptoModule
+from .fob_index import FobIndex
+from .message_dispatcher import MessageDispatcher
+from .event_writer import EventWriter
+from .face_cache import FaceCache
+from .face_matcher import create_matcher
+from .snapshot_store import CappedBuffer, SnapshotTooLarge, SnapshotWriter
+from .snapshot_renditions import SnapshotRenditions
+from .s3_delete_queue import S3DeleteQueue
+from .allow_list import AllowListPublisher
+from .event_dedupe import EventDedupe
+from .metrics import Metrics
+from .trace_store import TraceStore
+from .event_broker import EventBroker
+from .event_bus import STREAM_BUS, STREAM_BUS_PATH
+from .host_scopes import HostScopes
+from .file_lock import try_lock
 
 # Removed import: from sqlalchemy.exc import OperationalError
 # ------------------------------------------------------
@@ -32,12 +49,20 @@ IMAGE_DIR = os.path.join(BASE_DIR, "uploads")
 TAMPER_IMAGE_DIR = os.path.join(IMAGE_DIR, "tampers")
 PROFILE_IMAGE_DIR = os.path.join(IMAGE_DIR, "profile_images") # Directory for reference images
 
+# The BnB the door hardware belongs to (a single door per deployment for now)
+DOOR_BNB_ID = 1
+
+# Only the worker holding this lock (beside the shared event log) subscribes to the Pi channel,
+# writes the event log and publishes the allow-list; the others take over if it dies
+LEADER_LOCK_PATH = os.path.join(os.path.dirname(STREAM_BUS_PATH), "hardware_leader.lock")
+LEADER_RETRY_SECONDS = float(os.getenv("HARDWARE_LEADER_RETRY_SECONDS", "5"))
+
 os.makedirs(IMAGE_DIR, exist_ok=True)
 os.makedirs(TAMPER_IMAGE_DIR, exist_ok=True)
 os.makedirs(PROFILE_IMAGE_DIR, exist_ok=True) # Ensure profile directory exists
 
-# Shared Queue for Server-Sent Events (Realtime stream to frontend)
-message_queue = queue.Queue()
+# Broker for Server-Sent Events (Realtime stream to frontend); each /stream client gets its host's events
+message_queue = EventBroker()
 
 # ------------------------------------------------------
 # AWS Clients (S3 & Rekognition)
@@ -65,6 +90,13 @@ except Exception as e:
     print(f"[HardwareService] ERROR: AWS Rekognition could not initialize: {e}")
 
 
+# Face matching backend, chosen per deployment with FACE_MATCHER (rekognition | local)
+face_matcher = create_matcher(rekognition)
+if hasattr(face_matcher, "enroll"):
+    # Reference embeddings are built as photos are preloaded or uploaded, not during a tap
+    FaceCache.on_reference(face_matcher.enroll)
+
+
 def s3_download_and_delete(key: str, event_type: str = "fob") -> str:
     """
     Downloads an image from S3, deletes it from the bucket, and returns
@@ -73,199 +105,205 @@ def s3_download_and_delete(key: str, event_type: str = "fob") -> str:
     if not s3:
         return "error_no_s3_client.jpg"
 
-    filename = os.path.basename(key)
-
-    # Select path based on event type
-    if event_type == "tamper":
-        local_dir = TAMPER_IMAGE_DIR
-        relative_prefix = "/uploads/tampers/"
-    else: # Default for fob_tap
-        local_dir = IMAGE_DIR
-        relative_prefix = "/uploads/"
-
-    local_path = os.path.join(local_dir, filename)
+    local_path, relative_path = _snapshot_location(key, event_type)
 
     try:
-        s3.download_file(AWS_BUCKET, key, local_path)
-        s3.delete_object(Bucket=AWS_BUCKET, Key=key)
+        with Metrics.timer("s3_download_disk"):
+            s3.download_file(AWS_BUCKET, key, local_path)
+        _delete_s3_key(key)
+        SnapshotRenditions.submit(local_path)
 
         # Return the path accessible by the frontend
-        return f"{relative_prefix}{filename}"
+        return relative_path
     except Exception as e:
+        Metrics.increment("s3_errors_total", operation="download")
         print(f"[HardwareService] ERROR handling S3 file {key}: {e}")
         return "error_download_failed.jpg"
 
-def compare_faces_aws(source_image_path: str, reference_image_path: str) -> bool:
+def s3_download_to_memory(key: str, event_type: str = "fob") -> tuple[str, bytes | None]:
     """
-    Compares the newly captured image (source) against the profile image (reference).
-    Returns True if they are a match, False otherwise.
+    Downloads an image from S3 straight into memory. The bytes are returned for
+    face matching while a background writer saves the same buffer to disk; the
+    S3 object is deleted only once that write has succeeded, so it stays in the
+    bucket if the disk write fails. Images over the memory cap go through the disk instead.
+    Returns (relative path for database storage, image bytes or None).
     """
-    if not rekognition:
-        print("[HardwareService] Rekognition client not available.")
-        return False
+    if not s3:
+        return ("error_no_s3_client.jpg", None)
 
-    try:
-        # Load images into bytes
-        with open(source_image_path, 'rb') as source_file:
-            source_bytes = source_file.read()
-        with open(reference_image_path, 'rb') as ref_file:
-            ref_bytes = ref_file.read()
-
-        response = rekognition.compare_faces(
-            SourceImage={'Bytes': source_bytes},
-            TargetImage={'Bytes': ref_bytes},
-            SimilarityThreshold=85  #confidence threshold
-        )
-
-        # Check if there are any matches in the response
-        if response['FaceMatches']:
-            print(f"[HardwareService] Face Match! Confidence: {response['FaceMatches'][0]['Similarity']}%")
-            return True
-        else:
-            print("[HardwareService] Face Mismatch.")
-            return False
+    local_path, relative_path = _snapshot_location(key, event_type)
+    buffer = CappedBuffer()
 
+    started = time.perf_counter()
+    try:
+        s3.download_fileobj(AWS_BUCKET, key, buffer)
+    except SnapshotTooLarge:
+        Metrics.observe("s3_download", time.perf_counter() - started, "too_large")
+        print(f"[HardwareService] {key} is larger than the in-memory cap, downloading to disk.")
+        return (s3_download_and_delete(key, event_type), None)
     except Exception as e:
-        print(f"[HardwareService] Rekognition Error: {e}")
-        return False
-
-# ------------------------------------------------------
-# PubNub Listener
-# ------------------------------------------------------
-class PiListener(SubscribeCallback):
-    """Handles incoming messages from the Raspberry Pi over PubNub."""
-    def message(self, pubnub, event):
-        import os
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-        msg = event.message
-        print(f"[HardwareService] Received: {msg}")
-
-        # 1. Ignore messages sent by the server itself
-        if msg.get("source") == "server_decision" or msg.get("source") == "server_tamper_ack":
-             print(f"[HardwareService] IGNORING server broadcast ({msg.get('source')}).")
-             return
-
-        # 2. Push raw message to SSE
-        message_queue.put(json.dumps(msg))
+        Metrics.observe("s3_download", time.perf_counter() - started, "error")
+        Metrics.increment("s3_errors_total", operation="download")
+        print(f"[HardwareService] ERROR handling S3 file {key}: {e}")
+        return ("error_download_failed.jpg", None)
 
-        # 3. Handle NFC Events (Access Control and Logging)
-        if "nfc_uid" in msg:
-            uid = msg["nfc_uid"]
-            s3_key = msg.get("s3_key")
+    Metrics.observe("s3_download", time.perf_counter() - started)
+    data = buffer.getvalue()
+    SnapshotWriter.persist(data, local_path, on_written=lambda: _delete_s3_key(key))
+    SnapshotRenditions.submit(local_path, data)
 
-            app_instance = HardwareService._app_instance
-            if not app_instance:
-                print("[HardwareService] ERROR: App instance not available for logging.")
-                HardwareService.publish_decision(uid, "denied", "Service Error")
-                return
+    return (relative_path, data)
 
-            with app_instance.app_context():
+def _delete_s3_key(key: str):
+    """Queues the key for a batched delete_objects call; deletes inline if the queue is not running."""
+    if S3DeleteQueue._thread is not None:
+        S3DeleteQueue.enqueue(key)
+        return
 
-                # --- REQUIRED IMPORTS FOR DB LOOKUP ---
-                from . import db
-                from .models import Fob, AccessLog, User, UserBooking
+    try:
+        s3.delete_object(Bucket=AWS_BUCKET, Key=key)
+    except Exception as e:
+        Metrics.increment("s3_errors_total", operation="delete")
+        print(f"[HardwareService] ERROR deleting S3 file {key}: {e}")
 
-                # Check access rights against database bookings
-                access_granted, label, booking_id = HardwareService._check_active_booking(uid)
+def _snapshot_location(key: str, event_type: str) -> tuple[str, str]:
+    """Returns (absolute local path, frontend-relative path) for an S3 key."""
+    filename = os.path.basename(key)
 
-                # Initialize access variable
-                access = "granted" if access_granted else "denied"
+    # Select path based on event type
+    if event_type == "tamper":
+        return (os.path.join(TAMPER_IMAGE_DIR, filename), f"/uploads/tampers/{filename}")
 
-                # Download image from S3
-                snapshot_relative_path = "N/A"
-                local_snapshot_path = None
+    # Default for fob_tap
+    return (os.path.join(IMAGE_DIR, filename), f"/uploads/{filename}")
 
-                if s3_key:
-                    snapshot_relative_path = s3_download_and_delete(s3_key, event_type="fob")
-                    if not snapshot_relative_path.startswith("error"):
-                         clean_name = os.path.basename(snapshot_relative_path)
-                         local_snapshot_path = os.path.join(IMAGE_DIR, clean_name)
+def _image_bytes(image: str | bytes) -> bytes:
+    """Accepts either raw image bytes or a path to read them from."""
+    if isinstance(image, bytes):
+        return image
+    with open(image, 'rb') as image_file:
+        return image_file.read()
 
-                # --- FACIAL RECOGNITION LOGIC ---
-                face_confidence = 0.0
-                user_id_for_log = None # Variable to store the User ID for logging
-                user_booking_link = None
+def compare_faces_aws(source_image: str | bytes, reference_image: str | bytes, user_id: int | None = None) -> bool:
+    """
+    Compares the newly captured image (source) against the profile image (reference).
+    Each image may be a file path or bytes already in memory (e.g. from FaceCache).
+    Returns True if they are a match, False otherwise.
+    """
+    is_match, _, _ = match_faces(source_image, [(user_id, reference_image)])
+    return is_match
 
-                # Only proceed if access was granted by NFC and we have a snapshot
-                if access == "granted" and local_snapshot_path and os.path.exists(local_snapshot_path):
+def match_faces(source_image: str | bytes, candidates: list) -> tuple[bool, int | None, float]:
+    """
+    Scores the captured image against every candidate guest in one call to the
+    configured FaceMatcher backend. candidates: [(user_id, path or bytes), ...]
+    Returns (is_match, matched user id, similarity).
+    """
+    try:
+        # Load images into bytes
+        source_bytes = _image_bytes(source_image)
+        candidate_bytes = [(user_id, _image_bytes(ref)) for user_id, ref in candidates]
+    except OSError as e:
+        print(f"[HardwareService] Could not read image for face match: {e}")
+        return (False, None, 0.0)
 
-                    user_photo_path_db = None
+    is_match, user_id, similarity = face_matcher.match(source_bytes, candidate_bytes)
 
-                    if booking_id:
-                        # Find the User linked to the active Booking via the UserBooking table
-                        user_booking_link = UserBooking.query.filter_by(booking_id=booking_id).first()
+    if is_match:
+        print(f"[HardwareService] Face Match! Confidence: {similarity}%")
+    else:
+        print("[HardwareService] Face Mismatch.")
+    return (is_match, user_id, similarity)
 
-                        if user_booking_link:
-                            user_id_for_log = user_booking_link.user_id
-                            # Use the user_id to find the User record and get the photo_path
-                            user_record = User.query.get(user_id_for_log)
-                            user_photo_path_db = user_record.photo_path if user_record else None
+def _event_kind(msg: dict) -> str:
+    """Stream topic of a raw Pi message: 'access', 'tamper' or 'system'."""
+    if msg.get("event") == "tamper" or msg.get("type") == "tamper_snapshot":
+        return "tamper"
+    if "nfc_uid" in msg or msg.get("type") == "tap_snapshot":
+        return "access"
+    return "system"
 
-                    if user_photo_path_db:
 
-                        # 3. Construct the ABSOLUTE path using the project base directory (one level up from 'Server')
-                        # The DB path: 'uploads/profile_images/user_2_referenceFace.jpg' is relative to the PROJECT ROOT.
+# ------------------------------------------------------
+# PubNub Listener
+# ------------------------------------------------------
+class PiListener(SubscribeCallback):
+    """Handles incoming messages from the Raspberry Pi over PubNub."""
+    def message(self, pubnub, event):
+        msg = event.message
+        print(f"[HardwareService] Received: {msg}")
 
-                        project_root = os.path.dirname(BASE_DIR)
-                        path_components = user_photo_path_db.split('/')
+        # 1. Ignore messages sent by the server itself
+        if msg.get("source") in ("server_decision", "server_tamper_ack", "server_allow_list"):
+             print(f"[HardwareService] IGNORING server broadcast ({msg.get('source')}).")
+             return
 
-                        # Join project root with the components from the DB path
-                        reference_image_path = os.path.join(project_root, *path_components)
+        # 2. Drop redeliveries before any S3, Rekognition or DB work
+        if EventDedupe.is_duplicate(msg):
+            print(f"[HardwareService] IGNORING duplicate event {msg.get('event_id') or msg.get('tap_id')}.")
+            return
 
-                        print(f"[HardwareService] Constructed path for file check: {reference_image_path}")
+        # Hand off to the worker pool so a slow tap on one door does not hold up the others
+        dispatcher = HardwareService._dispatcher
+        if dispatcher is None:
+            self.process(msg)
+            return
 
-                        if os.path.exists(reference_image_path):
+        device_id = msg.get("device_id") or getattr(event, "publisher", None) or "unknown"
+        dispatcher.submit(device_id, msg)
+
+    def process(self, msg):
+        """Handles a message and only then marks it seen, so a redelivery after a failure is handled again."""
+        original = dict(msg)     # handle() pops fields off msg
+        self.handle(msg)
+        EventDedupe.mark_seen(original)
+
+    def handle(self, msg):
+        """Processes a single Pi message. Runs on a dispatcher worker inside an app context."""
+        # 2a. Pi stage timings for the tap trace; a 'trace' message carries nothing else
+        if "trace" in msg:
+            TraceStore.record_pi(msg.pop("trace"))
+        if msg.get("type") == "trace":
+            return
 
-                            is_match = compare_faces_aws(local_snapshot_path, reference_image_path)
+        # 2b. Push raw message to SSE
+        message_queue.put(json.dumps(msg), DOOR_BNB_ID, _event_kind(msg))
 
-                            if is_match:
-                                print("[HardwareService] AWS Result: FACE MATCH!")
-                                access = "granted"
-                                face_confidence = 99.0
-                            else:
-                                print("[HardwareService] AWS Result: FACE MISMATCH.")
-                                access = "granted_no_face"
-                        else:
-                            print(f"[HardwareService] DB path found, but file not on disk: {reference_image_path}")
-                            access = "granted_no_face"
+        # 3a. Pi booted or missed a delta and wants the whole allow-list
+        if msg.get("type") == "allow_list_request":
+            AllowListPublisher.request_full()
+            return
 
-                    else:
-                        print(f"[HardwareService] No User or photo_path linked to active booking {booking_id}.")
-                        access = "granted_no_face"
+        # 3b. Snapshot for a tap that was published before its photo was uploaded
+        if msg.get("type") == "tap_snapshot":
+            from .tap_pipeline import TapPipeline
+            TapPipeline.attach_snapshot(msg.get("tap_id"), msg.get("s3_key"))
+            return
 
-                # -----------------------------------------------------------------
+        # 3c. Photo of a tamper event that was reported before its upload finished
+        if msg.get("type") == "tamper_snapshot":
+            from .late_snapshots import LateSnapshots
+            if not LateSnapshots.attach(msg.get("event_id"), msg.get("s3_key")) and msg.get("s3_key"):
+                print(f"[HardwareService] Tamper snapshot for unknown event {msg.get('event_id')}, keeping it.")
+                s3_download_and_delete(msg["s3_key"], event_type="tamper")
+            return
 
-                # Create and commit Access Log entry
-                fob_record = Fob.query.filter_by(uid=uid).first()
-                new_log = AccessLog(
-                    bnb_id=1,
-                    raw_uid=uid,
-                    fob_id=fob_record.id if fob_record else None,
-                    booking_id=booking_id,
-                    user_id=user_id_for_log,
-                    match_result=access,
-                    face_confidence=face_confidence,
-                    snapshot_path=snapshot_relative_path,
-                    event_type="fob_tap"
-                )
-                db.session.add(new_log)
-                db.session.commit() # The known bug will still happen here if the schema is stale
-                print(f"[HardwareService] LOGGED: Access {access} for UID {uid}")
+        # 3. Handle NFC Events (decision first, face check and logging in the background)
+        if "nfc_uid" in msg:
+            uid = msg["nfc_uid"]
 
-            # Send access decision back to Pi
-            HardwareService.publish_decision(uid, access, label)
+            if not HardwareService._app_instance:
+                print("[HardwareService] ERROR: App instance not available for logging.")
+                HardwareService.publish_decision(uid, "denied", "Service Error")
+                return
 
-            # Push formatted event to SSE
-            message_queue.put(json.dumps({
-                "type": "access_decision", "nfc_uid": uid, "access": access, "label": label,
-                "booking_id": booking_id, "snapshot": snapshot_relative_path
-            }))
+            from .tap_pipeline import TapPipeline
+            TapPipeline.handle_tap(uid, msg.get("s3_key"), msg.get("tap_id"), msg.get("local_access"))
 
         # 4. Handle Tamper Alerts (Logging to DB with Image)
         if msg.get("event") == "tamper":
             tamper_id = "Hardware_Tamper_Alert_1"
-            bnb_id = 1
+            bnb_id = DOOR_BNB_ID
             s3_key = msg.get("s3_key")
 
             app_instance = HardwareService._app_instance
@@ -274,48 +312,59 @@ class PiListener(SubscribeCallback):
                 HardwareService.publish_tamper_alert(tamper_id, "Service Error: Failed to log.")
                 return
 
-            with app_instance.app_context():
-                from . import db
-                from .models import TamperAlert
-
-                snapshot_path = "N/A"
-                if s3_key:
-                    snapshot_path = s3_download_and_delete(s3_key, event_type="tamper")
-
-                new_tamper = TamperAlert(
-                    bnb_id=bnb_id,
-                    tamper_id=tamper_id,
-                    snapshot_path=snapshot_path
-                )
-                db.session.add(new_tamper)
-
-                try:
-                    db.session.commit()
-                    print(f"[HardwareService] LOGGED: Tamper Alert ID: {tamper_id} with image {snapshot_path}")
-                except Exception as e:
-                    db.session.rollback()
-                    print(f"[HardwareService] DB ERROR logging tamper alert {tamper_id}: {e}")
+            triggered_at = datetime.now(timezone.utc)
+
+            snapshot_path = "N/A"
+            if s3_key:
+                snapshot_path = s3_download_and_delete(s3_key, event_type="tamper")
+            else:
+                # The Pi spools the photo and sends it as 'tamper_snapshot' once uploaded
+                from .late_snapshots import LateSnapshots
+                LateSnapshots.remember(msg.get("event_id"), "TamperAlert", "tamper", event_id=msg.get("event_id"))
+
+            # Buffered and bulk-inserted by the write-behind writer
+            EventWriter.add(
+                "TamperAlert",
+                bnb_id=bnb_id,
+                tamper_id=tamper_id,
+                status="pending",
+                triggered_at=triggered_at,
+                snapshot_path=snapshot_path,
+                event_id=msg.get("event_id")
+            )
+            print(f"[HardwareService] LOGGED: Tamper Alert ID: {tamper_id} with image {snapshot_path}")
 
             HardwareService.publish_tamper_alert(tamper_id, "Tamper detected!")
 
             message_queue.put(json.dumps({
                 "type": "tamper_alert", "tamper_id": tamper_id, "bnb_id": bnb_id, "snapshot": snapshot_path
-            }))
+            }), bnb_id, "tamper")
 
 
         # 5. Handle S3 Image Events (Fallback)
         if "s3_key" in msg and "nfc_uid" not in msg and "event" not in msg:
              filename = s3_download_and_delete(msg["s3_key"])
-             message_queue.put(json.dumps({"type": "new_image", "image_filename": filename}))
+             message_queue.put(json.dumps({"type": "new_image", "image_filename": filename}), DOOR_BNB_ID, "system")
 
 
 # ------------------------------------------------------
 # Service Class (Singleton)
 # ------------------------------------------------------
 class HardwareService:
-    """Manages the PubNub connection and provides static methods for hardware interaction."""
+    """
+    Manages the PubNub connection and provides static methods for hardware interaction.
+
+    Every worker can publish to the Pi, but only the leader (the holder of
+    LEADER_LOCK_PATH) subscribes, so each Pi message is handled and logged
+    once. The others retry the lock every LEADER_RETRY_SECONDS and take over
+    when the leader exits. Events and fob index invalidations reach the
+    other workers through the shared event bus, so a second worker refuses
+    to start unless STREAM_BUS=sqlite.
+    """
     _pubnub_instance = None
     _app_instance = None
+    _dispatcher = None
+    _leader_lock = None
 
     @staticmethod
     def _get_utc_now():
@@ -329,21 +378,27 @@ class HardwareService:
 
         now = HardwareService._get_utc_now()
 
+        # Fast path: answered from the in-memory index, no DB round trip
+        cached = FobIndex.lookup(uid, now)
+        if cached is not None:
+             return cached
+
         with HardwareService._app_instance.app_context():
              from . import db
              from .models import Fob, FobBooking
 
-             active_fob_booking = (
-                 db.session.query(FobBooking)
+             row = (
+                 db.session.query(FobBooking.booking_id, Fob.id, Fob.label)
+                 .select_from(FobBooking)
                  .join(Fob)
                  .filter(Fob.uid == uid, FobBooking.is_active == True, FobBooking.active_from <= now, FobBooking.active_until >= now)
                  .first()
              )
 
-             if active_fob_booking:
-                 fob = db.session.get(Fob, active_fob_booking.fob_id)
-                 label = fob.label if fob and fob.label else f"Fob ID: {fob.id}"
-                 return (True, label, active_fob_booking.booking_id)
+             if row:
+                 booking_id, fob_id, fob_label = row
+                 label = fob_label if fob_label else f"Fob ID: {fob_id}"
+                 return (True, label, booking_id)
 
              fob_record = Fob.query.filter_by(uid=uid).first()
              label = fob_record.label if fob_record and fob_record.label else "Unknown UID"
@@ -353,34 +408,102 @@ class HardwareService:
 
     @staticmethod
     def start(app_instance):
-        if HardwareService._pubnub_instance is not None:
+        if HardwareService._app_instance is not None:
             print("[HardwareService] PubNub already running (Singleton).")
             return
 
         HardwareService._app_instance = app_instance
+        # Fob and booking writes committed on any worker invalidate every worker's index
+        message_queue.on_control("fob_index", FobIndex.invalidate)
+        FobIndex.start(app_instance, notify_peers=lambda: message_queue.broadcast("fob_index"))
+        FaceCache.start(app_instance)
+        S3DeleteQueue.start(s3, AWS_BUCKET)
+        HostScopes.start(app_instance)
+        message_queue.start()
+
+        Metrics.gauge("stream_subscribers", lambda: message_queue.stats()["subscriber_count"], "Connected /stream clients.")
+        Metrics.gauge("stream_max_backlog", message_queue.qsize, "Events waiting for the slowest /stream client.")
+        Metrics.gauge("dispatch_queue_depth", lambda: HardwareService._dispatcher.stats()["queue_depth"] if HardwareService._dispatcher else 0,
+                      "Pi messages waiting for a dispatcher worker.")
+        Metrics.gauge("event_writer_pending_rows", lambda: EventWriter.stats()["pending_rows"], "Log rows not yet flushed to the database.")
+        Metrics.gauge("s3_delete_queue_depth", lambda: S3DeleteQueue.stats()["queue_depth"], "S3 keys waiting for a batched delete.")
+        Metrics.gauge("event_dedupe_duplicates", lambda: EventDedupe.stats()["duplicates"],
+                      "Pi messages dropped as redeliveries of an event already handled.")
+        Metrics.gauge("hardware_leader", lambda: int(HardwareService._leader_lock is not None),
+                      "1 on the worker that handles Pi messages.")
 
         if not all([PUBLISH_KEY, SUBSCRIBE_KEY, CHANNEL]):
             print("[HardwareService] ERROR: Missing PubNub credentials.")
+        else:
+            pnconfig = PNConfiguration()
+            pnconfig.publish_key = PUBLISH_KEY
+            pnconfig.subscribe_key = SUBSCRIBE_KEY
+            pnconfig.user_id = "web-server"
+            pnconfig.enable_subscribe = True
+
+            pnconfig.cipher_key = CIPHER_KEY
+            pnconfig.crypto_module = AesCbcCryptoModule(pnconfig)
+
+            # Publishing only until this worker becomes the leader
+            HardwareService._pubnub_instance = PubNub(pnconfig)
+
+        if HardwareService._try_lead():
             return
 
-        pnconfig = PNConfiguration()
-        pnconfig.publish_key = PUBLISH_KEY
-        pnconfig.subscribe_key = SUBSCRIBE_KEY
-        pnconfig.user_id = "web-server"
-        pnconfig.enable_subscribe = True
+        if STREAM_BUS == "memory":
+            # No way to reach the leader: its /stream events and fob index invalidations would never arrive
+            raise RuntimeError("Another worker is already handling Pi messages and STREAM_BUS=memory cannot be "
+                               "shared between workers. Set STREAM_BUS=sqlite to run more than one worker.")
+        print(f"[HardwareService] Another worker is handling Pi messages; standing by (pid {os.getpid()}).")
+        threading.Thread(target=HardwareService._follow, name="hardware-leader", daemon=True).start()
 
-        pnconfig.cipher_key = CIPHER_KEY
-        pnconfig.crypto_module = AesCbcCryptoModule(pnconfig)
+    @staticmethod
+    def _try_lead() -> bool:
+        """Takes the leader lock if it is free and starts the Pi-facing services; False if another worker has it."""
+        handle = try_lock(LEADER_LOCK_PATH)
+        if handle is None:
+            return False
+        HardwareService._leader_lock = handle
+
+        app_instance = HardwareService._app_instance
+        EventWriter.start(app_instance)
+
+        pubnub = HardwareService._pubnub_instance
+        if pubnub is None:
+            return True
+
+        listener = PiListener()
+        HardwareService._dispatcher = MessageDispatcher(app_instance, listener.process)
 
-        pubnub = PubNub(pnconfig)
-        pubnub.add_listener(PiListener())
+        pubnub.add_listener(listener)
         pubnub.subscribe().channels(CHANNEL).execute()
+        print(f"[HardwareService] PubNub listener started on channel: {CHANNEL} (leader, pid {os.getpid()})")
+
+        AllowListPublisher.start(lambda message: pubnub.publish().channel(CHANNEL).message(message).sync())
+        return True
 
-        HardwareService._pubnub_instance = pubnub
-        print(f"[HardwareService] PubNub listener started on channel: {CHANNEL}")
+    @staticmethod
+    def _follow():
+        while not HardwareService._try_lead():
+            time.sleep(LEADER_RETRY_SECONDS)
+        print("[HardwareService] Previous leader is gone; this worker now handles Pi messages.")
+
+    @staticmethod
+    def is_follower() -> bool:
+        """True on a started worker that is standing by while another one handles the Pi."""
+        return HardwareService._app_instance is not None and HardwareService._leader_lock is None
+
+    @staticmethod
+    def stats() -> dict:
+        return {
+            "leader": HardwareService._leader_lock is not None,
+            "pid": os.getpid(),
+            "publishing": HardwareService._pubnub_instance is not None,
+            "stream_bus": STREAM_BUS,
+        }
 
     @staticmethod
-    def publish_decision(uid: str, access: str, label: str):
+    def publish_decision(uid: str, access: str, label: str, stage: str = "final", tap_id: str | None = None):
         if not HardwareService._pubnub_instance:
             return
 
@@ -388,10 +511,13 @@ class HardwareService:
             "access": access,
             "uid": uid,
             "label": label,
+            "stage": stage,  # provisional | follow_up | final
+            "tap_id": tap_id,  # lets the Pi put the decision on the tap's trace
             "source": "server_decision"
         }
 
-        HardwareService._pubnub_instance.publish().channel(CHANNEL).message(message).sync()
+        with Metrics.timer("decision_publish", stage):
+            HardwareService._pubnub_instance.publish().channel(CHANNEL).message(message).sync()
 
     @staticmethod
     def publish_tamper_alert(tamper_id: str, msg: str):
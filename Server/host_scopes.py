@@ -0,0 +1,140 @@
+import os
+import threading
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+REFRESH_SECONDS = float(os.getenv("HOST_SCOPES_REFRESH_SECONDS", "300"))
+
+
+# ------------------------------------------------------
+# Host -> BnB Map for Stream Filtering
+# ------------------------------------------------------
+class HostScopes:
+    """
+    In-process map of host user id -> frozenset of the BnB ids they own,
+    used by the SSE broker to route each event only to the hosts it
+    concerns without touching the database per event.
+
+    Rebuilt in one query by a background thread every REFRESH_SECONDS and
+    as soon as a BnB write commits. The map is swapped whole, so readers
+    never need the lock.
+    """
+    _lock = threading.Lock()
+    _map = {}
+    _built = False
+    _rebuilds = 0
+    _rebuild_errors = 0
+
+    _app_instance = None
+    _thread = None
+    _wakeup = threading.Event()
+
+    @staticmethod
+    def bnbs_for(host_id: int) -> frozenset:
+        return HostScopes._map.get(host_id, frozenset())
+
+    @staticmethod
+    def ensure_built():
+        """Builds the map now if the refresh thread has not yet (needs an app context if not started)."""
+        if not HostScopes._built:
+            HostScopes.rebuild()
+
+    @staticmethod
+    def invalidate():
+        HostScopes._wakeup.set()
+
+    @staticmethod
+    def rebuild():
+        from . import db
+        from .models import BnB
+
+        try:
+            if HostScopes._app_instance is not None:
+                with HostScopes._app_instance.app_context():
+                    rows = db.session.query(BnB.host_id, BnB.id).all()
+            else:
+                rows = db.session.query(BnB.host_id, BnB.id).all()
+        except Exception as e:
+            with HostScopes._lock:
+                HostScopes._rebuild_errors += 1
+            print(f"[HostScopes] ERROR rebuilding host map: {e}")
+            return
+
+        scopes = {}
+        for host_id, bnb_id in rows:
+            scopes.setdefault(host_id, set()).add(bnb_id)
+
+        with HostScopes._lock:
+            HostScopes._map = {host_id: frozenset(bnb_ids) for host_id, bnb_ids in scopes.items()}
+            HostScopes._built = True
+            HostScopes._rebuilds += 1
+
+    @staticmethod
+    def stats() -> dict:
+        with HostScopes._lock:
+            return {
+                "hosts": len(HostScopes._map),
+                "bnbs": sum(len(bnb_ids) for bnb_ids in HostScopes._map.values()),
+                "rebuilds": HostScopes._rebuilds,
+                "rebuild_errors": HostScopes._rebuild_errors,
+            }
+
+    @staticmethod
+    def _refresh_loop():
+        while True:
+            HostScopes.rebuild()
+            HostScopes._wakeup.wait(REFRESH_SECONDS)
+            HostScopes._wakeup.clear()
+
+    @staticmethod
+    def start(app_instance):
+        if HostScopes._thread is not None:
+            return
+
+        HostScopes._app_instance = app_instance
+        _register_listeners()
+
+        HostScopes._thread = threading.Thread(target=HostScopes._refresh_loop, name="host-scopes", daemon=True)
+        HostScopes._thread.start()
+        print(f"[HostScopes] Refresh thread started (every {REFRESH_SECONDS}s).")
+
+
+# ------------------------------------------------------
+# SQLAlchemy Write Events
+# ------------------------------------------------------
+_SCOPES_DIRTY = "host_scopes_dirty"
+
+
+def _mark_dirty(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info[_SCOPES_DIRTY] = True
+
+
+def _on_commit(session):
+    if session.info.pop(_SCOPES_DIRTY, False):
+        HostScopes.invalidate()
+
+
+def _on_rollback(session):
+    session.info.pop(_SCOPES_DIRTY, None)
+
+
+_registered = False
+
+
+def _register_listeners():
+    global _registered
+    if _registered:
+        return
+    _registered = True
+
+    from .models import BnB
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(BnB, name, _mark_dirty)
+
+    event.listen(Session, "after_commit", _on_commit)
+    event.listen(Session, "after_rollback", _on_rollback)
@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from .event_writer import EventWriter
+from .hardware_service import s3_download_and_delete
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+# The Pi keeps retrying uploads for as long as its spool holds the file
+LATE_SNAPSHOT_TTL_HOURS = float(os.getenv("LATE_SNAPSHOT_TTL_HOURS", "24"))
+LATE_SNAPSHOT_MAX_PENDING = int(os.getenv("LATE_SNAPSHOT_MAX_PENDING", "5000"))
+
+
+# ------------------------------------------------------
+# Late-binding Snapshots
+# ------------------------------------------------------
+class LateSnapshots:
+    """
+    Links snapshots that reach S3 after their AccessLog/TamperAlert row was
+    written (the Pi spools captures and retries uploads on flaky Wi-Fi).
+
+    remember() records how to find the row for a tap_id/event_id; when the
+    Pi's late 'tap_snapshot'/'tamper_snapshot' message arrives, attach()
+    downloads the image and points the row at it. Entries expire after
+    LATE_SNAPSHOT_TTL_HOURS and are held in memory only.
+    """
+    _lock = threading.Lock()
+    _pending = OrderedDict()     # ref -> (model name, event type, row filter, created at)
+
+    _linked = 0
+    _unmatched = 0
+    _expired = 0
+
+    @staticmethod
+    def remember(ref: str | None, model_name: str, event_type: str, **row_filter):
+        if not ref:
+            return
+
+        cutoff = time.monotonic() - LATE_SNAPSHOT_TTL_HOURS * 3600
+        with LateSnapshots._lock:
+            LateSnapshots._pending[ref] = (model_name, event_type, row_filter, time.monotonic())
+            while LateSnapshots._pending:
+                oldest_ref, (_, _, _, created) = next(iter(LateSnapshots._pending.items()))
+                if created >= cutoff and len(LateSnapshots._pending) <= LATE_SNAPSHOT_MAX_PENDING:
+                    break
+                del LateSnapshots._pending[oldest_ref]
+                LateSnapshots._expired += 1
+
+    @staticmethod
+    def attach(ref: str | None, s3_key: str | None) -> bool:
+        """False if nothing is waiting for this ref. Runs inside an app context."""
+        with LateSnapshots._lock:
+            entry = LateSnapshots._pending.pop(ref, None) if ref else None
+        if entry is None:
+            return False
+        if not s3_key:
+            return True
+
+        model_name, event_type, row_filter, _ = entry
+        snapshot_path = s3_download_and_delete(s3_key, event_type)
+
+        from . import db, models
+        model = getattr(models, model_name)
+
+        # The row may still be sitting in the write-behind buffer
+        EventWriter.flush()
+        if set(row_filter) <= EventWriter.live_columns(model_name):
+            updated = model.query.filter_by(**row_filter).update({"snapshot_path": snapshot_path})
+            db.session.commit()
+        else:
+            updated = 0     # event_id column not migrated yet, so the row cannot be found
+
+        with LateSnapshots._lock:
+            if updated:
+                LateSnapshots._linked += 1
+            else:
+                LateSnapshots._unmatched += 1
+
+        if updated:
+            print(f"[LateSnapshots] Linked {snapshot_path} to {model_name} for {ref}.")
+        else:
+            print(f"[LateSnapshots] No {model_name} row found for {ref}; kept {snapshot_path}.")
+        return True
+
+    @staticmethod
+    def stats() -> dict:
+        with LateSnapshots._lock:
+            return {
+                "pending": len(LateSnapshots._pending),
+                "linked": LateSnapshots._linked,
+                "unmatched": LateSnapshots._unmatched,
+                "expired": LateSnapshots._expired,
+            }
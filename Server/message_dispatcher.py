@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .metrics import Metrics
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+DISPATCH_WORKERS = int(os.getenv("PUBNUB_DISPATCH_WORKERS", "4"))
+DISPATCH_MAX_PENDING = int(os.getenv("PUBNUB_DISPATCH_MAX_PENDING", "500"))
+
+
+# ------------------------------------------------------
+# Per-device Ordered Dispatcher
+# ------------------------------------------------------
+class MessageDispatcher:
+    """
+    Hands PubNub messages to a bounded thread pool.
+
+    Each device has its own FIFO and at most one worker draining it, so
+    messages from one Pi are handled in order while different Pis run in
+    parallel. Once DISPATCH_MAX_PENDING messages are waiting, submit()
+    blocks the PubNub callback thread (back-pressure) instead of growing
+    without limit. Every handler call runs inside its own app context.
+    """
+    def __init__(self, app_instance, handler, max_workers=DISPATCH_WORKERS, max_pending=DISPATCH_MAX_PENDING):
+        self._app_instance = app_instance
+        self._handler = handler
+        self._max_workers = max_workers
+        self._max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="pubnub-dispatch")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._queues = {}           # device_id -> deque of pending messages
+        self._active = set()        # devices with a drain task scheduled or running
+
+        self._busy_workers = 0
+        self._busy_seconds = 0.0
+        self._started_at = time.monotonic()
+        self._processed = 0
+        self._errors = 0
+        self._max_depth_seen = 0
+
+    def submit(self, device_id: str, msg: dict):
+        self._slots.acquire()
+
+        with self._lock:
+            self._queues.setdefault(device_id, deque()).append((msg, time.monotonic()))
+            depth = sum(len(q) for q in self._queues.values())
+            self._max_depth_seen = max(self._max_depth_seen, depth)
+
+            if device_id in self._active:
+                return
+            self._active.add(device_id)
+
+        self._executor.submit(self._drain, device_id)
+
+    def _drain(self, device_id: str):
+        """Handles one message for a device, then requeues itself so other devices get a turn."""
+        with self._lock:
+            msg, enqueued_at = self._queues[device_id].popleft()
+            self._busy_workers += 1
+
+        started = time.monotonic()
+        Metrics.observe("dispatch_wait", started - enqueued_at)
+        outcome = "ok"
+        try:
+            with self._app_instance.app_context():
+                self._handler(msg)
+        except Exception as e:
+            outcome = "error"
+            with self._lock:
+                self._errors += 1
+            print(f"[MessageDispatcher] ERROR handling message from {device_id}: {e}")
+        finally:
+            Metrics.observe("handle", time.monotonic() - started, outcome)
+            self._slots.release()
+            with self._lock:
+                self._busy_workers -= 1
+                self._busy_seconds += time.monotonic() - started
+                self._processed += 1
+
+                if self._queues[device_id]:
+                    more = True
+                else:
+                    del self._queues[device_id]
+                    self._active.discard(device_id)
+                    more = False
+
+        if more:
+            self._executor.submit(self._drain, device_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            elapsed = max(time.monotonic() - self._started_at, 1e-9)
+            return {
+                "queue_depth": sum(len(q) for q in self._queues.values()),
+                "queue_depth_by_device": {d: len(q) for d, q in self._queues.items()},
+                "max_queue_depth": self._max_depth_seen,
+                "max_pending": self._max_pending,
+                "workers": self._max_workers,
+                "busy_workers": self._busy_workers,
+                "utilisation": round(self._busy_seconds / (elapsed * self._max_workers), 4),
+                "processed": self._processed,
+                "errors": self._errors,
+            }
@@ -0,0 +1,177 @@
+import os
+import time
+import threading
+from bisect import bisect_left
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Upper bounds in seconds; wide enough for a DB lookup at the bottom and a late snapshot at the top
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUANTILES = (0.5, 0.95, 0.99)
+
+PREFIX = "hostlock"
+
+
+class Histogram:
+    """Fixed-bucket latency histogram. Quantiles are interpolated inside the bucket they fall in."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)     # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class _Timer:
+    """Context manager returned by Metrics.timer(); set .outcome inside the block to label the sample."""
+    __slots__ = ("stage", "outcome", "_started")
+
+    def __init__(self, stage: str, outcome: str):
+        self.stage = stage
+        self.outcome = outcome
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        Metrics.observe(self.stage, time.perf_counter() - self._started, "error" if exc_type else self.outcome)
+        return False
+
+
+# ------------------------------------------------------
+# In-process Metrics Registry
+# ------------------------------------------------------
+class Metrics:
+    """
+    Stage latency histograms keyed by (stage, outcome), error counters and
+    gauges, rendered in Prometheus text format for /metrics.
+
+    Recording a sample is one bisect and a few additions under a lock, so it
+    stays on in production; METRICS_ENABLED=0 turns recording off entirely.
+    Gauges are callables registered at start-up and read only when scraped.
+    """
+    _lock = threading.Lock()
+    _histograms = {}     # (stage, outcome) -> Histogram
+    _counters = {}       # (name, (label, value) pairs) -> count
+    _gauges = {}         # name -> (callable, help text)
+
+    @staticmethod
+    def observe(stage: str, seconds: float, outcome: str = "ok"):
+        if not METRICS_ENABLED:
+            return
+        with Metrics._lock:
+            histogram = Metrics._histograms.get((stage, outcome))
+            if histogram is None:
+                histogram = Metrics._histograms[(stage, outcome)] = Histogram()
+            histogram.observe(seconds)
+
+    @staticmethod
+    def timer(stage: str, outcome: str = "ok") -> _Timer:
+        """with Metrics.timer("s3_download"): ... records the block; an exception records outcome "error"."""
+        return _Timer(stage, outcome)
+
+    @staticmethod
+    def increment(name: str, amount: int = 1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with Metrics._lock:
+            Metrics._counters[key] = Metrics._counters.get(key, 0) + amount
+
+    @staticmethod
+    def gauge(name: str, read, help_text: str = ""):
+        Metrics._gauges[name] = (read, help_text)
+
+    @staticmethod
+    def stats() -> dict:
+        """Per-stage percentiles in milliseconds, for the JSON stats route."""
+        with Metrics._lock:
+            stages = {}
+            for (stage, outcome), histogram in sorted(Metrics._histograms.items()):
+                stages.setdefault(stage, {})[outcome] = {
+                    "count": histogram.count,
+                    "avg_ms": round(histogram.total / histogram.count * 1000, 2),
+                    **{f"p{int(q * 100)}_ms": round(histogram.quantile(q) * 1000, 2) for q in QUANTILES},
+                    "max_ms": round(histogram.max * 1000, 2),
+                }
+            counters = {
+                name + "".join(f"[{k}={v}]" for k, v in labels): count
+                for (name, labels), count in sorted(Metrics._counters.items())
+            }
+        return {"enabled": METRICS_ENABLED, "stages": stages, "counters": counters}
+
+    @staticmethod
+    def render() -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+
+        with Metrics._lock:
+            histograms = sorted(Metrics._histograms.items())
+            counters = sorted(Metrics._counters.items())
+
+            name = f"{PREFIX}_stage_duration_seconds"
+            lines.append(f"# HELP {name} Time spent in each stage of Pi message handling.")
+            lines.append(f"# TYPE {name} histogram")
+            for (stage, outcome), histogram in histograms:
+                labels = f'stage="{stage}",outcome="{outcome}"'
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+            # Precomputed so dashboards work without histogram_quantile()
+            name = f"{PREFIX}_stage_duration_quantile_seconds"
+            lines.append(f"# HELP {name} In-process p50/p95/p99 of each stage since start-up.")
+            lines.append(f"# TYPE {name} gauge")
+            for (stage, outcome), histogram in histograms:
+                for q in QUANTILES:
+                    lines.append(f'{name}{{stage="{stage}",outcome="{outcome}",quantile="{q}"}} {histogram.quantile(q):.6f}')
+
+        seen = set()
+        for (counter, labels), count in counters:
+            name = f"{PREFIX}_{counter}"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            lines.append(f"{name}{{{label_text}}} {count}" if label_text else f"{name} {count}")
+
+        for gauge_name, (read, help_text) in sorted(Metrics._gauges.items()):
+            name = f"{PREFIX}_{gauge_name}"
+            try:
+                value = read()
+            except Exception as e:
+                print(f"[Metrics] ERROR reading gauge {gauge_name}: {e}")
+                continue
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
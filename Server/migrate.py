@@ -0,0 +1,73 @@
+import os
+import sys
+import argparse
+import importlib.util
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+# Applies the versioned schema migrations in Server/migrations, online, to
+# the database in DATABASE_URL (MySQL in production, SQLite locally):
+#
+#   python Server/migrate.py status
+#   python Server/migrate.py upgrade [--target 0002] [--dry-run]
+#   python Server/migrate.py stamp 0002     # mark as applied without running
+#
+# Only an engine is needed, so the app (and PubNub) is not started. Run it by
+# path: `python -m Server.migrate` would import the Server package first.
+
+load_dotenv()
+
+
+def _load_migrations():
+    """The migrations package, loaded from its directory without importing the Server package (PubNub, boto3)."""
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+    spec = importlib.util.spec_from_file_location(
+        "hostlock_migrations", os.path.join(directory, "__init__.py"), submodule_search_locations=[directory],
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module     # available() imports the m<NNNN> modules by package name
+    spec.loader.exec_module(module)
+    return module
+
+
+migrations = _load_migrations()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned schema migrations for the Hostlock server.")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), help="Database URL (default: DATABASE_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("status", help="List migrations and whether each is applied")
+
+    upgrade_parser = commands.add_parser("upgrade", help="Apply pending migrations")
+    upgrade_parser.add_argument("--target", help="Stop after this version")
+    upgrade_parser.add_argument("--dry-run", action="store_true", help="Print the statements without running them")
+
+    stamp_parser = commands.add_parser("stamp", help="Record migrations up to a version as applied")
+    stamp_parser.add_argument("version")
+
+    args = parser.parse_args()
+    if not args.url:
+        parser.error("DATABASE_URL is not set and --url was not given.")
+
+    engine = create_engine(args.url)
+
+    if args.command == "status":
+        for version, name, applied in migrations.status(engine):
+            print(f"{version}  {'applied' if applied else 'pending'}  {name}")
+
+    elif args.command == "upgrade":
+        applied = migrations.upgrade(engine, args.target, args.dry_run)
+        if not applied:
+            print("Database is up to date.")
+        elif not args.dry_run:
+            print(f"Applied {len(applied)} migration(s): {', '.join(applied)}")
+
+    elif args.command == "stamp":
+        stamped = migrations.stamp(engine, args.version)
+        print(f"Stamped {', '.join(stamped) if stamped else 'nothing'}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import re
+import pkgutil
+import importlib
+from datetime import datetime, timezone
+from sqlalchemy import MetaData, Table, Column, String, DateTime, inspect, select, text
+
+# ------------------------------------------------------
+# Versioned Schema Migrations
+# ------------------------------------------------------
+# Each migration is a module in this package named m<NNNN>_<name>.py with an
+# upgrade(ops) function. Applied versions are recorded in schema_migrations.
+# Every operation checks the live schema first, so a migration can be re-run
+# after a failure part-way through (MySQL commits each DDL statement on its
+# own) and is a no-op on a database created by db.create_all() from models.py.
+
+MODULE_PATTERN = re.compile(r"^m(\d{4})_(\w+)$")
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", String(16), primary_key=True),
+    Column("name", String(128), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class SchemaOps:
+    """
+    The operations a migration may use, run on one connection.
+
+    On MySQL, DDL is issued with ALGORITHM=INPLACE, LOCK=NONE, so reads and
+    writes carry on while the index builds. If the server cannot build it
+    online, the statement fails instead of quietly locking the table.
+    On SQLite the plain statements are used.
+    With dry_run the statements are only printed.
+    """
+    def __init__(self, connection, dry_run: bool = False):
+        self.connection = connection
+        self.dialect = connection.dialect.name
+        self.dry_run = dry_run
+        self._quote = connection.dialect.identifier_preparer.quote
+
+    def has_column(self, table: str, column: str) -> bool:
+        return any(c["name"] == column for c in inspect(self.connection).get_columns(table))
+
+    def has_index(self, table: str, name: str, columns: list, unique: bool = False) -> bool:
+        """An index with this name, or one over exactly these columns (e.g. MySQL's implicit FK index)."""
+        inspector = inspect(self.connection)
+        indexes = inspector.get_indexes(table) + [
+            {"name": u["name"], "column_names": u["column_names"], "unique": True}
+            for u in inspector.get_unique_constraints(table)
+        ]
+        for index in indexes:
+            if index["name"] == name:
+                return True
+            if list(index["column_names"]) == list(columns) and (bool(index.get("unique")) or not unique):
+                return True
+        return False
+
+    def add_column(self, table: str, column: str, sql_type: str):
+        """Adds a nullable column at the end of the table."""
+        if self.has_column(table, column):
+            print(f"  = {table}.{column} already exists")
+            return
+        statement = f"ALTER TABLE {self._quote(table)} ADD COLUMN {self._quote(column)} {sql_type}"
+        if self.dialect == "mysql":
+            statement += ", ALGORITHM=INPLACE, LOCK=NONE"
+        self._execute(statement)
+
+    def create_index(self, name: str, table: str, columns: list, unique: bool = False):
+        if self.has_index(table, name, columns, unique):
+            print(f"  = {table}: index {name} ({', '.join(columns)}) already exists")
+            return
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        column_list = ", ".join(self._quote(c) for c in columns)
+        if self.dialect == "mysql":
+            statement = (
+                f"ALTER TABLE {self._quote(table)} ADD {kind} {self._quote(name)} ({column_list}), "
+                "ALGORITHM=INPLACE, LOCK=NONE"
+            )
+        else:
+            statement = f"CREATE {kind} {self._quote(name)} ON {self._quote(table)} ({column_list})"
+        self._execute(statement)
+
+    def _execute(self, statement: str):
+        print(f"  + {statement}")
+        if not self.dry_run:
+            self.connection.execute(text(statement))
+
+
+# ------------------------------------------------------
+# Discovery & Runner
+# ------------------------------------------------------
+def available() -> list:
+    """[(version, name, module), ...] in version order."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = MODULE_PATTERN.match(module_info.name)
+        if match:
+            module = importlib.import_module(f"{__name__}.{module_info.name}")
+            migrations.append((match.group(1), match.group(2), module))
+    return sorted(migrations, key=lambda m: m[0])
+
+
+def applied_versions(engine, create: bool = True) -> set:
+    """Versions recorded in schema_migrations. With create=False no DDL runs: a missing table means none."""
+    with engine.begin() as connection:
+        if create:
+            _metadata.create_all(connection, tables=[schema_migrations])
+        elif not inspect(connection).has_table(schema_migrations.name):
+            return set()
+        return set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+
+def _stamp(connection, version: str, name: str):
+    connection.execute(schema_migrations.insert().values(
+        version=version, name=name, applied_at=datetime.now(timezone.utc).replace(tzinfo=None),
+    ))
+
+
+def status(engine) -> list:
+    """[(version, name, applied), ...] for every migration in the package."""
+    done = applied_versions(engine, create=False)
+    return [(version, name, version in done) for version, name, _ in available()]
+
+
+def upgrade(engine, target: str | None = None, dry_run: bool = False) -> list:
+    """Applies pending migrations up to target (all if None); returns the versions applied."""
+    done = applied_versions(engine, create=not dry_run)
+    applied = []
+    for version, name, module in available():
+        if version in done:
+            continue
+        if target is not None and version > target:
+            break
+
+        print(f"[Migrations] {version} {name}{' (dry run)' if dry_run else ''}")
+        # One transaction per migration: atomic on SQLite; MySQL commits each DDL itself
+        with engine.begin() as connection:
+            module.upgrade(SchemaOps(connection, dry_run))
+            if not dry_run:
+                _stamp(connection, version, name)
+        applied.append(version)
+    return applied
+
+
+def stamp(engine, version: str) -> list:
+    """Marks every migration up to version as applied without running it."""
+    done = applied_versions(engine)
+    stamped = []
+    with engine.begin() as connection:
+        for migration_version, name, _ in available():
+            if migration_version <= version and migration_version not in done:
+                _stamp(connection, migration_version, name)
+                stamped.append(migration_version)
+    return stamped
@@ -0,0 +1,10 @@
+"""
+Pi event ids on access_logs and tamper_alerts, unique so a redelivered tap
+or alert cannot be logged twice (EventWriter inserts with IGNORE).
+"""
+
+
+def upgrade(ops):
+    for table in ("access_logs", "tamper_alerts"):
+        ops.add_column(table, "event_id", "VARCHAR(64)")
+        ops.create_index(f"uq_{table}_event_id", table, ["event_id"], unique=True)
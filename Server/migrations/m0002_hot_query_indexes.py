@@ -0,0 +1,28 @@
+"""
+Composite indexes for the hottest query shapes, and indexes on the foreign
+keys that had none. Names match the declarations in models.py.
+"""
+
+INDEXES = [
+    # Keyset pages of access logs per BnB / per booking, newest first
+    ("ix_access_logs_bnb_time", "access_logs", ["bnb_id", "time_logged", "log_id"]),
+    ("ix_access_logs_booking_time", "access_logs", ["booking_id", "time_logged", "log_id"]),
+    ("ix_access_logs_user_id", "access_logs", ["user_id"]),
+    ("ix_access_logs_fob_id", "access_logs", ["fob_id"]),
+    # Active-booking check for a tapped fob, and the fob index refresh
+    ("ix_fob_bookings_fob_active", "fob_bookings", ["fob_id", "is_active", "active_until"]),
+    ("ix_fob_bookings_active_until", "fob_bookings", ["is_active", "active_until"]),
+    ("ix_fob_bookings_booking_id", "fob_bookings", ["booking_id"]),
+    # Tamper alerts per BnB, newest first
+    ("ix_tamper_alerts_bnb_time", "tamper_alerts", ["bnb_id", "triggered_at", "id"]),
+    # Guests of a booking (names on log pages, history access check), and bookings of a guest
+    ("ix_user_bookings_booking_user", "user_bookings", ["booking_id", "user_id"]),
+    ("ix_user_bookings_user_id", "user_bookings", ["user_id"]),
+    ("ix_bookings_bnb_id", "bookings", ["bnb_id"]),
+    ("ix_bnbs_host_id", "bnbs", ["host_id"]),
+]
+
+
+def upgrade(ops):
+    for name, table, columns in INDEXES:
+        ops.create_index(name, table, columns)
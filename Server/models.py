@@ -76,7 +76,7 @@ class BnB(db.Model):
     unique_code = db.Column(db.String(64), unique=True, nullable=False)
     name = db.Column(db.String(255), unique=True, nullable=False)
 
-    host_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    host_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     host = db.relationship("User", back_populates="hosted_bnbs")
 
     bookings = db.relationship("Booking", back_populates="bnb", lazy="dynamic")
@@ -92,7 +92,7 @@ class Booking(db.Model):
     __tablename__ = "bookings"
 
     id = db.Column("booking_id", db.Integer, primary_key=True)
-    bnb_id = db.Column(db.Integer, db.ForeignKey("bnbs.bnb_id"), nullable=False)
+    bnb_id = db.Column(db.Integer, db.ForeignKey("bnbs.bnb_id"), nullable=False, index=True)
     bnb = db.relationship("BnB", back_populates="bookings")
 
     booking_code = db.Column(db.String(64), unique=True, nullable=False)
@@ -113,9 +113,13 @@ class Booking(db.Model):
 
 class UserBooking(db.Model):
     __tablename__ = "user_bookings"
+    __table_args__ = (
+        # Guests of a booking: names on access log pages, history access check
+        db.Index("ix_user_bookings_booking_user", "booking_id", "user_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
     booking_id = db.Column(db.Integer, db.ForeignKey("bookings.booking_id"), nullable=False)
     is_primary_guest = db.Column(db.Boolean, nullable=False, default=False)
 
@@ -149,10 +153,15 @@ class Fob(db.Model):
 
 class FobBooking(db.Model):
     __tablename__ = "fob_bookings"
+    __table_args__ = (
+        # Active-booking check for a tapped fob, and the fob index refresh
+        db.Index("ix_fob_bookings_fob_active", "fob_id", "is_active", "active_until"),
+        db.Index("ix_fob_bookings_active_until", "is_active", "active_until"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     fob_id = db.Column(db.Integer, db.ForeignKey("fobs.id"), nullable=False)
-    booking_id = db.Column(db.Integer, db.ForeignKey("bookings.booking_id"), nullable=False)
+    booking_id = db.Column(db.Integer, db.ForeignKey("bookings.booking_id"), nullable=False, index=True)
 
     active_from = db.Column(db.DateTime, nullable=False)
     active_until = db.Column(db.DateTime, nullable=False)
@@ -168,6 +177,12 @@ class FobBooking(db.Model):
 
 class AccessLog(db.Model):
     __tablename__ = "access_logs"
+    __table_args__ = (
+        # Keyset pages per BnB / per booking, newest first (access_routes)
+        db.Index("ix_access_logs_bnb_time", "bnb_id", "time_logged", "log_id"),
+        db.Index("ix_access_logs_booking_time", "booking_id", "time_logged", "log_id"),
+        db.Index("uq_access_logs_event_id", "event_id", unique=True),
+    )
 
     id = db.Column("log_id", db.Integer, primary_key=True)
 
@@ -176,10 +191,10 @@ class AccessLog(db.Model):
 
     raw_uid = db.Column(db.String(64), nullable=False, index=True)
 
-    fob_id = db.Column(db.Integer, db.ForeignKey("fobs.id"))
+    fob_id = db.Column(db.Integer, db.ForeignKey("fobs.id"), index=True)
     fob = db.relationship("Fob", back_populates="access_logs")
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
     recognized_user = db.relationship("User", back_populates="access_logs")
 
     booking_id = db.Column(db.Integer, db.ForeignKey("bookings.booking_id"))
@@ -192,6 +207,10 @@ class AccessLog(db.Model):
     snapshot_path = db.Column(db.String(500))
     event_type = db.Column(db.String(32))
 
+    # tap_id from the Pi; unique (uq_access_logs_event_id) so a redelivered tap cannot log twice.
+    # Deferred: only ever filtered on, and rows still load before migration 0001 adds the column
+    event_id = db.deferred(db.Column(db.String(64)))
+
 
 # ==========================================================
 # TAMPER ALERTS TABLE
@@ -199,6 +218,11 @@ class AccessLog(db.Model):
 
 class TamperAlert(db.Model):
     __tablename__ = "tamper_alerts"
+    __table_args__ = (
+        # Alerts per BnB, newest first
+        db.Index("ix_tamper_alerts_bnb_time", "bnb_id", "triggered_at", "id"),
+        db.Index("uq_tamper_alerts_event_id", "event_id", unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     bnb_id = db.Column(db.Integer, db.ForeignKey("bnbs.bnb_id"), nullable=False)
@@ -211,3 +235,7 @@ class TamperAlert(db.Model):
     triggered_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
     snapshot_path = db.Column(db.String(500))
+
+    # event_id from the Pi; unique (uq_tamper_alerts_event_id) so a redelivered alert cannot log twice.
+    # Deferred: only ever filtered on, and rows still load before migration 0001 adds the column
+    event_id = db.deferred(db.Column(db.String(64)))
@@ -1,21 +1,57 @@
-from flask import Blueprint, Response, render_template, send_from_directory
+from flask import Blueprint, Response, jsonify, request, send_from_directory
+from flask_jwt_extended import jwt_required, get_jwt_identity
 # Update this import line:
 from .hardware_service import message_queue, IMAGE_DIR
+from .event_broker import STREAM_KEEPALIVE_SECONDS, EVENT_KINDS
+from .host_scopes import HostScopes
 
 realtime_bp = Blueprint("realtime", __name__)
 
-@realtime_bp.route("/")
-def index():
-    return render_template("index.html")
-
 @realtime_bp.route("/stream")
+@jwt_required(locations=["headers", "query_string"])
 def stream():
+    """
+    Live events for the caller's properties. EventSource cannot set headers,
+    so the access token may be passed as ?jwt=. Hosts get their own BnBs'
+    events, admins get everything; ?types=access,tamper narrows by kind.
+    """
+    from .models import User
+
+    user = User.query.get(int(get_jwt_identity()))
+    if not user or not (user.is_host() or user.is_admin()):
+        return jsonify({"msg": "Unauthorized"}), 403
+
+    kinds = None
+    if request.args.get("types"):
+        kinds = frozenset(kind.strip() for kind in request.args["types"].split(",") if kind.strip())
+        unknown = kinds - set(EVENT_KINDS)
+        if unknown:
+            return jsonify({"msg": f"Unknown event types: {', '.join(sorted(unknown))}"}), 400
+
+    host_id = None if user.is_admin() else user.id
+    if host_id is not None:
+        HostScopes.ensure_built()
+
+    # Browsers resend the last id they saw when they reconnect; missed events are replayed from the ring
+    last_event_id = request.headers.get("Last-Event-ID", type=int)
+    if last_event_id is None:
+        last_event_id = request.args.get("last_event_id", type=int)
+    subscriber = message_queue.subscribe(last_event_id, host_id, kinds)
+
     def event_stream():
-        while True:
-            msg = message_queue.get()
-            yield f"data: {msg}\n\n"
+        try:
+            while True:
+                event = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                if event is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id, msg = event
+                yield f"id: {event_id}\ndata: {msg}\n\n"
+        finally:
+            message_queue.unsubscribe(subscriber)
 
-    return Response(event_stream(), mimetype="text/event-stream")
+    return Response(event_stream(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @realtime_bp.route("/image/<filename>")
 def serve_image(filename):
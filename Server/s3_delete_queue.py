@@ -0,0 +1,296 @@
+import os
+import glob
+import json
+import time
+import atexit
+import threading
+from .metrics import Metrics
+from .file_lock import try_lock
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+DELETE_BATCH_SIZE = min(int(os.getenv("S3_DELETE_BATCH_SIZE", "1000")), 1000)   # delete_objects limit
+DELETE_INTERVAL_SECONDS = float(os.getenv("S3_DELETE_INTERVAL_SECONDS", "2"))
+RETRY_MAX_BACKOFF_SECONDS = float(os.getenv("S3_DELETE_MAX_BACKOFF_SECONDS", "300"))
+
+SPOOL_DIR = os.path.join(os.path.dirname(__file__), "spool")
+# Keys that failed at least once, one file per process, owned through that process's journal lock
+RETRY_GLOB = os.path.join(SPOOL_DIR, "s3_delete_retry.*.json")
+LEGACY_RETRY_PATH = os.path.join(SPOOL_DIR, "s3_delete_retry.json")
+# Keys waiting for the next batch, one journal per process, locked while it is alive
+PENDING_JOURNAL_GLOB = os.path.join(SPOOL_DIR, "s3_delete_pending.*.jsonl")
+
+
+def _pid_path(pattern: str, pid) -> str:
+    return pattern.replace("*", str(pid))
+
+
+def _pid_of(path: str, pattern: str) -> str:
+    prefix, suffix = pattern.split("*")
+    return path[len(prefix):len(path) - len(suffix)]
+
+
+# ------------------------------------------------------
+# Batched Asynchronous S3 Deletes
+# ------------------------------------------------------
+class S3DeleteQueue:
+    """
+    Collects S3 keys that have been downloaded and deletes them in batches
+    with delete_objects from a background thread, so taps no longer wait on
+    a second S3 round trip.
+
+    Keys that fail to delete (whole-call errors or per-key errors) are
+    written to this process's retry file and retried with exponential
+    backoff, so an outage leaves a retry list rather than orphaned objects
+    in the bucket. Every worker runs its own queue, so each keeps its own
+    retry file; no worker overwrites another's keys.
+
+    Keys waiting for the next batch are appended to this process's pending
+    journal as they are enqueued, and the journal is cut back to the keys
+    still waiting once a batch has been sent. On start, journals left by
+    processes that exited are loaded back into the queue, together with
+    their retry files; a key deleted twice after a crash is harmless, as S3
+    treats it as success.
+    """
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _pending = []           # keys not yet attempted (mirrored in the pending journal)
+    _retry = []             # keys that failed at least once (mirrored in this process's retry file)
+    _client = None
+    _bucket = None
+    _thread = None
+    _journal = None         # open, locked pending journal of this process
+    _backoff = 0.0
+    _next_retry_at = 0.0
+
+    _deleted = 0
+    _batches = 0
+    _failures = 0
+    _recovered = 0
+
+    @staticmethod
+    def enqueue(key: str):
+        with S3DeleteQueue._lock:
+            S3DeleteQueue._pending.append(key)
+            S3DeleteQueue._journal_keys([key])
+            full = len(S3DeleteQueue._pending) >= DELETE_BATCH_SIZE
+        if full:
+            S3DeleteQueue._wakeup.set()
+
+    @staticmethod
+    def drain():
+        """Sends every pending key (and due retries) in batches of up to DELETE_BATCH_SIZE."""
+        with S3DeleteQueue._lock:
+            keys = S3DeleteQueue._pending
+            S3DeleteQueue._pending = []
+            if S3DeleteQueue._retry and time.monotonic() >= S3DeleteQueue._next_retry_at:
+                keys = S3DeleteQueue._retry + keys
+                S3DeleteQueue._retry = []
+
+        if not keys:
+            return
+
+        failed = []
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start:start + DELETE_BATCH_SIZE]
+            failed.extend(S3DeleteQueue._delete_batch(batch))
+
+        if failed:
+            Metrics.increment("s3_errors_total", len(failed), operation="delete")
+        with S3DeleteQueue._lock:
+            S3DeleteQueue._failures += len(failed)
+            if failed:
+                S3DeleteQueue._retry = failed + S3DeleteQueue._retry
+                S3DeleteQueue._backoff = min(max(S3DeleteQueue._backoff * 2, DELETE_INTERVAL_SECONDS), RETRY_MAX_BACKOFF_SECONDS)
+                S3DeleteQueue._next_retry_at = time.monotonic() + S3DeleteQueue._backoff
+            elif not S3DeleteQueue._retry:
+                S3DeleteQueue._backoff = 0.0
+            S3DeleteQueue._save_retry_list()
+            S3DeleteQueue._rewrite_journal()
+
+    @staticmethod
+    def _delete_batch(batch: list[str]) -> list[str]:
+        """Returns the keys that could not be deleted."""
+        try:
+            response = S3DeleteQueue._client.delete_objects(
+                Bucket=S3DeleteQueue._bucket,
+                Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+            )
+        except Exception as e:
+            print(f"[S3DeleteQueue] ERROR deleting {len(batch)} keys: {e}")
+            return batch
+
+        errors = response.get("Errors", [])
+        for error in errors:
+            print(f"[S3DeleteQueue] Could not delete {error.get('Key')}: {error.get('Code')} {error.get('Message')}")
+
+        with S3DeleteQueue._lock:
+            S3DeleteQueue._batches += 1
+            S3DeleteQueue._deleted += len(batch) - len(errors)
+
+        return [error["Key"] for error in errors if "Key" in error]
+
+    @staticmethod
+    def _save_retry_list():
+        """Caller holds _lock."""
+        try:
+            retry_path = _pid_path(RETRY_GLOB, os.getpid())
+            if not S3DeleteQueue._retry:
+                if os.path.exists(retry_path):
+                    os.remove(retry_path)
+                return
+            tmp_path = retry_path + ".tmp"
+            with open(tmp_path, "w") as retry_file:
+                json.dump(S3DeleteQueue._retry, retry_file)
+            os.replace(tmp_path, retry_path)
+        except OSError as e:
+            print(f"[S3DeleteQueue] ERROR saving retry list: {e}")
+
+    @staticmethod
+    def _journal_keys(keys: list[str]):
+        """Caller holds _lock."""
+        if S3DeleteQueue._journal is None:
+            return
+        try:
+            S3DeleteQueue._journal.write("".join(json.dumps(key) + "\n" for key in keys))
+            S3DeleteQueue._journal.flush()
+        except OSError as e:
+            print(f"[S3DeleteQueue] ERROR journaling keys: {e}")
+
+    @staticmethod
+    def _rewrite_journal():
+        """Caller holds _lock. Keeps only the keys still waiting; sent or failed ones are in the retry list."""
+        if S3DeleteQueue._journal is None:
+            return
+        try:
+            S3DeleteQueue._journal.seek(0)
+            S3DeleteQueue._journal.truncate()
+        except OSError as e:
+            print(f"[S3DeleteQueue] ERROR clearing journal: {e}")
+            return
+        S3DeleteQueue._journal_keys(S3DeleteQueue._pending)
+
+    @staticmethod
+    def _read_journal(path: str) -> list[str]:
+        keys = []
+        try:
+            with open(path) as journal:
+                for line in journal:
+                    try:
+                        keys.append(json.loads(line))
+                    except ValueError:
+                        pass    # torn last line from a crash mid-write
+        except OSError as e:
+            print(f"[S3DeleteQueue] ERROR reading {path}: {e}")
+        return keys
+
+    @staticmethod
+    def _read_retry_list(path: str) -> list[str]:
+        if not os.path.exists(path):
+            return []
+        try:
+            with open(path) as retry_file:
+                return json.load(retry_file)
+        except (OSError, ValueError) as e:
+            print(f"[S3DeleteQueue] ERROR reading retry list {path}: {e}")
+            return []
+
+    @staticmethod
+    def _recover_pending():
+        """
+        Locks this process's journal and moves into it the keys from every
+        journal no live process holds; the retry files of those processes
+        are moved into this process's retry list the same way. The old files
+        are removed only after their keys are safely in the new ones.
+        """
+        own_pid = str(os.getpid())
+        own_path = _pid_path(PENDING_JOURNAL_GLOB, own_pid)
+        S3DeleteQueue._journal = try_lock(own_path)
+        if S3DeleteQueue._journal is None:
+            print(f"[S3DeleteQueue] ERROR: could not lock {own_path}, pending keys are not journaled.")
+            return
+
+        keys = S3DeleteQueue._read_journal(own_path)
+        retry = S3DeleteQueue._read_retry_list(_pid_path(RETRY_GLOB, own_pid))
+        orphans, stale = [], []
+
+        pids = {_pid_of(path, PENDING_JOURNAL_GLOB) for path in glob.glob(PENDING_JOURNAL_GLOB)}
+        pids |= {_pid_of(path, RETRY_GLOB) for path in glob.glob(RETRY_GLOB)}
+        pids.discard(own_pid)
+        for pid in sorted(pids):
+            journal_path = _pid_path(PENDING_JOURNAL_GLOB, pid)
+            handle = try_lock(journal_path)
+            if handle is None:
+                continue        # owner is still running
+            retry_path = _pid_path(RETRY_GLOB, pid)
+            keys.extend(S3DeleteQueue._read_journal(journal_path))
+            retry.extend(S3DeleteQueue._read_retry_list(retry_path))
+            orphans.append((journal_path, handle))
+            stale.append(retry_path)
+
+        # The single shared retry file used before retry lists were per process
+        if os.path.exists(LEGACY_RETRY_PATH):
+            claimed_path = LEGACY_RETRY_PATH + "." + own_pid
+            try:
+                os.replace(LEGACY_RETRY_PATH, claimed_path)     # only one worker wins the rename
+                retry.extend(S3DeleteQueue._read_retry_list(claimed_path))
+                stale.append(claimed_path)
+            except OSError:
+                pass
+
+        with S3DeleteQueue._lock:
+            S3DeleteQueue._pending = keys + S3DeleteQueue._pending
+            S3DeleteQueue._retry = retry + S3DeleteQueue._retry
+            S3DeleteQueue._recovered = len(keys)
+            S3DeleteQueue._rewrite_journal()
+            S3DeleteQueue._save_retry_list()
+
+        for path, handle in orphans:
+            handle.close()
+            stale.append(path)
+        for path in stale:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if keys:
+            print(f"[S3DeleteQueue] Recovered {len(keys)} pending keys from the journal.")
+        if retry:
+            print(f"[S3DeleteQueue] Loaded {len(retry)} keys to retry.")
+
+    @staticmethod
+    def stats() -> dict:
+        with S3DeleteQueue._lock:
+            return {
+                "queue_depth": len(S3DeleteQueue._pending),
+                "retry_depth": len(S3DeleteQueue._retry),
+                "deleted": S3DeleteQueue._deleted,
+                "batches": S3DeleteQueue._batches,
+                "failures": S3DeleteQueue._failures,
+                "retry_backoff_seconds": S3DeleteQueue._backoff,
+                "recovered_keys": S3DeleteQueue._recovered,
+                "journaled": S3DeleteQueue._journal is not None,
+            }
+
+    @staticmethod
+    def _drain_loop():
+        while True:
+            S3DeleteQueue._wakeup.wait(DELETE_INTERVAL_SECONDS)
+            S3DeleteQueue._wakeup.clear()
+            S3DeleteQueue.drain()
+
+    @staticmethod
+    def start(client, bucket: str):
+        if S3DeleteQueue._thread is not None or client is None:
+            return
+
+        S3DeleteQueue._client = client
+        S3DeleteQueue._bucket = bucket
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        S3DeleteQueue._recover_pending()
+
+        S3DeleteQueue._thread = threading.Thread(target=S3DeleteQueue._drain_loop, name="s3-delete", daemon=True)
+        S3DeleteQueue._thread.start()
+        atexit.register(S3DeleteQueue.drain)
+        print(f"[S3DeleteQueue] Batched deletes started (every {DELETE_INTERVAL_SECONDS}s, up to {DELETE_BATCH_SIZE} keys).")
@@ -0,0 +1,144 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+RENDITIONS_ENABLED = Image is not None and os.getenv("SNAPSHOT_RENDITIONS", "1") == "1"
+WEBP_ENABLED = RENDITIONS_ENABLED and os.getenv("SNAPSHOT_WEBP", "0") == "1"
+RENDITION_QUALITY = int(os.getenv("SNAPSHOT_RENDITION_QUALITY", "75"))
+
+# name -> bounding box; the Pi captures 1920x1080
+RENDITION_SIZES = {
+    "thumb": (320, 180),
+    "medium": (960, 540),
+}
+
+
+def rendition_path(path: str, name: str, ext: str = ".jpg") -> str:
+    """'/uploads/AABB_1.jpg' -> '/uploads/AABB_1_thumb.jpg'. Works for disk paths and URLs alike."""
+    root, _ = os.path.splitext(path)
+    return f"{root}_{name}{ext}"
+
+
+def rendition_urls(snapshot_url: str | None) -> dict:
+    """
+    Rendition URLs for a snapshot URL, keyed the way the list endpoints return them.
+    Values are None when there is no stored snapshot or renditions are disabled;
+    the dashboard then falls back to the original.
+    """
+    urls = {"snapshotThumb": None, "snapshotMedium": None}
+    if WEBP_ENABLED:
+        urls.update({"snapshotThumbWebp": None, "snapshotMediumWebp": None})
+
+    if not RENDITIONS_ENABLED or not snapshot_url or not snapshot_url.startswith("/uploads/"):
+        return urls
+    if os.path.basename(snapshot_url).startswith("error_"):
+        return urls
+
+    urls["snapshotThumb"] = rendition_path(snapshot_url, "thumb")
+    urls["snapshotMedium"] = rendition_path(snapshot_url, "medium")
+    if WEBP_ENABLED:
+        urls["snapshotThumbWebp"] = rendition_path(snapshot_url, "thumb", ".webp")
+        urls["snapshotMediumWebp"] = rendition_path(snapshot_url, "medium", ".webp")
+    return urls
+
+
+# ------------------------------------------------------
+# Rendition Builder
+# ------------------------------------------------------
+class SnapshotRenditions:
+    """
+    Builds a thumbnail and a medium rendition (plus WebP copies when enabled)
+    next to each snapshot as it lands, so dashboard lists load small images
+    and the full-size original is only fetched when a host opens it.
+
+    Pillow is optional; without it no renditions are built and the list
+    endpoints return None for the rendition URLs.
+    """
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="snapshot-renditions")
+    _lock = threading.Lock()
+
+    _built = 0
+    _errors = 0
+
+    @staticmethod
+    def submit(local_path: str, data: bytes | None = None):
+        """Queues rendition building; data is the image bytes if they are still in memory."""
+        if RENDITIONS_ENABLED:
+            SnapshotRenditions._executor.submit(SnapshotRenditions.build, local_path, data)
+
+    @staticmethod
+    def build(local_path: str, data: bytes | None = None):
+        if not RENDITIONS_ENABLED:
+            return
+
+        try:
+            source = Image.open(io.BytesIO(data) if data is not None else local_path).convert("RGB")
+
+            for name, box in RENDITION_SIZES.items():
+                image = source.copy()
+                image.thumbnail(box)
+                SnapshotRenditions._save(image, rendition_path(local_path, name), "JPEG",
+                                         quality=RENDITION_QUALITY, optimize=True)
+                if WEBP_ENABLED:
+                    SnapshotRenditions._save(image, rendition_path(local_path, name, ".webp"), "WEBP",
+                                             quality=RENDITION_QUALITY)
+
+            with SnapshotRenditions._lock:
+                SnapshotRenditions._built += 1
+        except Exception as e:
+            with SnapshotRenditions._lock:
+                SnapshotRenditions._errors += 1
+            print(f"[SnapshotRenditions] ERROR building renditions for {local_path}: {e}")
+
+    @staticmethod
+    def _save(image, path: str, fmt: str, **options):
+        # Temp name first so the dashboard never loads a half-written rendition
+        tmp_path = path + ".part"
+        image.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def backfill(directory: str) -> int:
+        """Builds missing renditions for every original snapshot in a directory."""
+        suffixes = tuple(f"_{name}" for name in RENDITION_SIZES)
+        count = 0
+        for filename in sorted(os.listdir(directory)):
+            root, ext = os.path.splitext(filename)
+            if ext.lower() not in (".jpg", ".jpeg") or root.endswith(suffixes):
+                continue
+            local_path = os.path.join(directory, filename)
+            if not os.path.exists(rendition_path(local_path, "thumb")):
+                SnapshotRenditions.build(local_path)
+                count += 1
+        return count
+
+    @staticmethod
+    def stats() -> dict:
+        with SnapshotRenditions._lock:
+            return {
+                "enabled": RENDITIONS_ENABLED,
+                "webp": WEBP_ENABLED,
+                "sizes": {name: list(box) for name, box in RENDITION_SIZES.items()},
+                "built": SnapshotRenditions._built,
+                "errors": SnapshotRenditions._errors,
+            }
+
+
+if __name__ == "__main__":
+    # python -m Server.snapshot_renditions -> build renditions for snapshots stored before this existed
+    if not RENDITIONS_ENABLED:
+        print("Pillow is not installed (or SNAPSHOT_RENDITIONS=0); nothing to do.")
+    else:
+        upload_dir = os.path.join(os.path.dirname(__file__), "uploads")
+        for directory in (upload_dir, os.path.join(upload_dir, "tampers")):
+            if os.path.isdir(directory):
+                print(f"Built renditions for {SnapshotRenditions.backfill(directory)} snapshots in {directory}")
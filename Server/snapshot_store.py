@@ -0,0 +1,100 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+MAX_IMAGE_BYTES = int(os.getenv("SNAPSHOT_MAX_IMAGE_MB", "8")) * 1024 * 1024
+MEMORY_BUDGET_BYTES = int(os.getenv("SNAPSHOT_MEMORY_BUDGET_MB", "64")) * 1024 * 1024
+
+
+class SnapshotTooLarge(Exception):
+    """Raised when an image does not fit in the per-image memory cap."""
+
+
+class CappedBuffer(io.BytesIO):
+    """BytesIO that refuses to grow past a fixed size (used as a download target)."""
+    def __init__(self, limit: int = MAX_IMAGE_BYTES):
+        super().__init__()
+        self._limit = limit
+
+    def write(self, data):
+        if self.tell() + len(data) > self._limit:
+            raise SnapshotTooLarge(f"snapshot exceeds {self._limit} bytes")
+        return super().write(data)
+
+
+# ------------------------------------------------------
+# Background Snapshot Writer
+# ------------------------------------------------------
+class SnapshotWriter:
+    """
+    Persists in-memory snapshots to disk off the tap's critical path.
+
+    Bytes waiting to be written count against MEMORY_BUDGET_BYTES; once the
+    budget is used up, persist() writes synchronously instead of queueing, so
+    a burst of large images cannot grow memory without bound.
+
+    on_written runs only once the file is safely on disk (fsynced and
+    renamed into place), so a caller can drop its other copy of the image
+    from there; after a failed write it is not called and that copy stays.
+    """
+    _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="snapshot-writer")
+    _lock = threading.Lock()
+    _pending_bytes = 0
+
+    _written = 0
+    _sync_writes = 0
+    _errors = 0
+
+    @staticmethod
+    def persist(data: bytes, local_path: str, on_written=None):
+        with SnapshotWriter._lock:
+            queue_it = SnapshotWriter._pending_bytes + len(data) <= MEMORY_BUDGET_BYTES
+            if queue_it:
+                SnapshotWriter._pending_bytes += len(data)
+            else:
+                SnapshotWriter._sync_writes += 1
+
+        if queue_it:
+            SnapshotWriter._executor.submit(SnapshotWriter._write, data, local_path, True, on_written)
+        else:
+            SnapshotWriter._write(data, local_path, False, on_written)
+
+    @staticmethod
+    def _write(data: bytes, local_path: str, queued: bool, on_written=None):
+        try:
+            # Write to a temp name first so readers never see a half-written image
+            tmp_path = local_path + ".part"
+            with open(tmp_path, "wb") as image_file:
+                image_file.write(data)
+                image_file.flush()
+                os.fsync(image_file.fileno())
+            os.replace(tmp_path, local_path)
+            with SnapshotWriter._lock:
+                SnapshotWriter._written += 1
+        except OSError as e:
+            with SnapshotWriter._lock:
+                SnapshotWriter._errors += 1
+            print(f"[SnapshotWriter] ERROR writing {local_path}: {e}")
+            return
+        finally:
+            if queued:
+                with SnapshotWriter._lock:
+                    SnapshotWriter._pending_bytes -= len(data)
+
+        if on_written is not None:
+            on_written()
+
+    @staticmethod
+    def stats() -> dict:
+        with SnapshotWriter._lock:
+            return {
+                "pending_bytes": SnapshotWriter._pending_bytes,
+                "memory_budget_bytes": MEMORY_BUDGET_BYTES,
+                "written": SnapshotWriter._written,
+                "sync_writes": SnapshotWriter._sync_writes,
+                "errors": SnapshotWriter._errors,
+            }
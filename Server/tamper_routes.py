@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 
 # Assuming .models is correct for your environment
 from .models import db, TamperAlert, BnB, User
+from .snapshot_renditions import rendition_urls
 
 tamper_bp = Blueprint("tamper", __name__)
 
@@ -55,7 +56,8 @@ def get_host_alerts():
             # ADDITION: Include the status from the database (REQUIRED BY FRONTEND)
             "status": alert.status,
             "isRead": False,
-            "snapshot": snapshot_path
+            "snapshot": snapshot_path,
+            **rendition_urls(snapshot_path),
         })
 
     return jsonify(data), 200
@@ -85,7 +87,8 @@ def get_tamper_alerts_for_bnb(bnb_id):
             "message": "Tamper Alert Triggered",
             "triggeredAt": alert.triggered_at.strftime("%Y-%m-%d %H:%M:%S"),
             "status": alert.status,
-            "snapshot": snapshot_path
+            "snapshot": snapshot_path,
+            **rendition_urls(snapshot_path),
         })
 
     return jsonify(data), 200
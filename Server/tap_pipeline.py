@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from .event_writer import EventWriter
+from .late_snapshots import LateSnapshots
+from .face_cache import FaceCache, resolve_reference_path
+from .metrics import Metrics
+from .trace_store import TraceStore
+from .hardware_service import (
+    HardwareService,
+    message_queue,
+    DOOR_BNB_ID,
+    s3_download_to_memory,
+    match_faces,
+    _delete_s3_key,
+    IMAGE_DIR,
+)
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+DECISION_DEADLINE = float(os.getenv("TAP_DECISION_DEADLINE_SECONDS", "2"))
+SNAPSHOT_DEADLINE = float(os.getenv("TAP_SNAPSHOT_DEADLINE_SECONDS", "5"))
+FACE_DEADLINE = float(os.getenv("TAP_FACE_DEADLINE_SECONDS", "5"))
+
+# What to send when the face does not match: "granted_no_face" (warn) or "revoked" (lock again)
+FACE_MISMATCH_ACTION = os.getenv("TAP_FACE_MISMATCH_ACTION", "granted_no_face")
+
+PIPELINE_WORKERS = int(os.getenv("TAP_PIPELINE_WORKERS", "4"))
+
+# How long to keep waiting for the Pi's follow-up snapshot message after the snapshot deadline
+FOLLOW_UP_TIMEOUT = float(os.getenv("TAP_FOLLOW_UP_TIMEOUT_SECONDS", "30"))
+
+
+class Tap:
+    """State for one NFC tap as it moves through the pipeline."""
+    def __init__(self, uid: str, s3_key: str | None, tap_id: str | None = None, local_access: str | None = None):
+        self.uid = uid
+        self.s3_key = s3_key
+        self.tap_id = tap_id        # correlation id linking the Pi's follow-up snapshot message
+        self.local_access = local_access    # decision the Pi already acted on from its allow-list
+        self.label = None
+        self.booking_id = None
+        self.sent_access = None     # last decision published to the Pi
+        self.user_id = None
+        self.face_confidence = 0.0
+        self.snapshot_path = "N/A"
+        self.received_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()     # for stage timings
+        self.spans = []             # [name, start ms, duration ms, outcome] for the trace store
+
+
+def _span_entry(tap: Tap, stage: str, started: float, outcome: str) -> list:
+    """[stage, ms from the tap arriving to 'started', ms from 'started' to now, outcome]"""
+    finished = time.perf_counter()
+    return [stage, round((started - tap.started) * 1000, 1), round((finished - started) * 1000, 1), outcome]
+
+
+# ------------------------------------------------------
+# Staged Tap Pipeline
+# ------------------------------------------------------
+class TapPipeline:
+    """
+    Decision-first handling of fob taps.
+
+    Stage 1 (decision) publishes the NFC result to the Pi as soon as it is
+    known. Snapshot download, face verification and the AccessLog write run
+    afterwards on background workers. Every stage has a deadline; when one
+    is missed the pipeline publishes its fallback (for stage 1, only when the
+    Pi made no decision of its own) and, if the stage finishes later, a
+    follow-up decision (e.g. a late grant or a revoke). Once the
+    tap is logged a 'final' decision with the settled access is always
+    published, so the Pi knows the attempt is over.
+
+    The Pi publishes the UID before it has a photo; the S3 key follows in a
+    separate 'tap_snapshot' message carrying the same tap_id, which
+    attach_snapshot() hands to the waiting snapshot stage.
+    """
+    # Orchestrators wait on stage futures, so they get their own pool to avoid starving the stages.
+    _orchestrator = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="tap-pipeline")
+    _stages = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS * 2, thread_name_prefix="tap-stage")
+
+    _follow_ups_lock = threading.Lock()
+    _follow_ups = {}     # tap_id -> (Future resolving to the s3_key, created at)
+
+    @staticmethod
+    def handle_tap(uid: str, s3_key: str | None, tap_id: str | None = None, local_access: str | None = None):
+        """Runs stage 1 on the caller's thread and queues the rest."""
+        tap = Tap(uid, s3_key, tap_id, local_access)
+
+        decision = TapPipeline._stages.submit(HardwareService._check_active_booking, uid)
+        try:
+            access_granted, tap.label, tap.booking_id = decision.result(timeout=DECISION_DEADLINE)
+            access = outcome = "granted" if access_granted else "denied"
+        except FutureTimeout:
+            print(f"[TapPipeline] Decision for {uid} missed its {DECISION_DEADLINE}s deadline.")
+            access, tap.label, outcome = "denied", "Service Timeout", "timeout"
+        except Exception as e:
+            print(f"[TapPipeline] ERROR checking booking for {uid}: {e}")
+            access, tap.label, outcome = "denied", "Service Error", "error"
+        TapPipeline._span(tap, "booking_lookup", tap.started, outcome)
+
+        if access == tap.local_access:
+            # The Pi already unlocked from its allow-list; only disagreements need a message
+            tap.sent_access = access
+        elif outcome in ("timeout", "error") and tap.local_access is not None:
+            # No answer is not a disagreement: keep the Pi's decision and let the background stages settle it
+            tap.sent_access = tap.local_access
+        else:
+            TapPipeline._publish(tap, access, stage="provisional")
+        TapPipeline._span(tap, "tap_to_decision", tap.started, "local" if tap.sent_access == tap.local_access else access)
+        TapPipeline._orchestrator.submit(TapPipeline._complete, tap, decision)
+
+    @staticmethod
+    def _follow_up(tap_id: str) -> Future:
+        """The rendezvous for a tap's snapshot key; created by whichever side arrives first."""
+        with TapPipeline._follow_ups_lock:
+            entry = TapPipeline._follow_ups.get(tap_id)
+            if entry is None:
+                entry = (Future(), time.monotonic())
+                TapPipeline._follow_ups[tap_id] = entry
+            return entry[0]
+
+    @staticmethod
+    def attach_snapshot(tap_id: str | None, s3_key: str | None):
+        """Called for the Pi's 'tap_snapshot' message. s3_key is None if the Pi could not upload."""
+        if not tap_id:
+            return
+
+        # Arrived after the tap was logged (the Pi's upload spool retried it)
+        if LateSnapshots.attach(tap_id, s3_key):
+            return
+
+        TapPipeline._prune_follow_ups()
+        follow_up = TapPipeline._follow_up(tap_id)
+        if not follow_up.done():
+            follow_up.set_result(s3_key)
+
+    @staticmethod
+    def _prune_follow_ups():
+        """Drops snapshots nobody claimed (tap already finished or never seen) and deletes their objects."""
+        cutoff = time.monotonic() - FOLLOW_UP_TIMEOUT - SNAPSHOT_DEADLINE
+        with TapPipeline._follow_ups_lock:
+            stale = [tap_id for tap_id, (_, created) in TapPipeline._follow_ups.items() if created < cutoff]
+            expired = [TapPipeline._follow_ups.pop(tap_id)[0] for tap_id in stale]
+
+        for follow_up in expired:
+            if follow_up.done() and follow_up.result():
+                print(f"[TapPipeline] Unclaimed snapshot {follow_up.result()}, deleting it.")
+                _delete_s3_key(follow_up.result())
+
+    @staticmethod
+    def _publish(tap: Tap, access: str, stage: str):
+        tap.sent_access = access
+        started = time.perf_counter()
+        HardwareService.publish_decision(tap.uid, access, tap.label, stage=stage, tap_id=tap.tap_id)
+        tap.spans.append(_span_entry(tap, f"publish_{stage}", started, access))
+
+    @staticmethod
+    def _span(tap: Tap, stage: str, started: float, outcome: str = "ok"):
+        """Records a stage both in the latency histograms and on the tap's trace."""
+        entry = _span_entry(tap, stage, started, outcome)
+        Metrics.observe(stage, entry[2] / 1000, outcome)
+        tap.spans.append(entry)
+
+    @staticmethod
+    def _complete(tap: Tap, decision):
+        try:
+            TapPipeline._run_background_stages(tap, decision)
+        except Exception as e:
+            print(f"[TapPipeline] ERROR completing tap for {tap.uid}: {e}")
+
+    @staticmethod
+    def _run_background_stages(tap: Tap, decision):
+        # A late stage-1 result still counts: grant the guest now if the lookup came back positive.
+        try:
+            access_granted, label, booking_id = decision.result()
+        except Exception:
+            access_granted, label, booking_id = False, tap.label, None
+
+        if access_granted and tap.sent_access != "granted":
+            tap.label, tap.booking_id = label, booking_id
+            TapPipeline._publish(tap, "granted", stage="follow_up")
+
+        access = "granted" if access_granted else "denied"
+
+        # --- Stage 2: snapshot (downloaded into memory, saved to disk in the background) ---
+        started = time.perf_counter()
+        snapshot, snapshot_on_time = TapPipeline._snapshot_stage(tap)
+        TapPipeline._span(tap, "snapshot", started,
+                          "missing" if snapshot is None else ("on_time" if snapshot_on_time else "late"))
+
+        # --- Stage 3: face verification ---
+        # Only proceed if access was granted by NFC and we have a snapshot
+        if access == "granted" and snapshot is not None:
+            if snapshot_on_time:
+                started = time.perf_counter()
+                access = TapPipeline._face_stage(tap, snapshot)
+                TapPipeline._span(tap, "face_check", started, access)
+            else:
+                # Too late for a face verdict to matter at the door
+                access = "granted_no_face"
+                TapPipeline._publish(tap, access, stage="follow_up")
+
+        # --- Stage 4: logging ---
+        started = time.perf_counter()
+        TapPipeline._log(tap, access)
+        TapPipeline._span(tap, "log", started)
+
+        TapPipeline._publish(tap, access, stage="final")
+        TapPipeline._span(tap, "tap_total", tap.started, access)
+        TraceStore.record(tap.tap_id, "server", tap.received_at.timestamp(), tap.spans)
+
+        message_queue.put(json.dumps({
+            "type": "access_decision", "nfc_uid": tap.uid, "access": access, "label": tap.label,
+            "booking_id": tap.booking_id, "snapshot": tap.snapshot_path
+        }), DOOR_BNB_ID, "access")
+
+    @staticmethod
+    def _snapshot_stage(tap: Tap) -> tuple[bytes | str | None, bool]:
+        """Returns (snapshot bytes or local path or None, whether it arrived within SNAPSHOT_DEADLINE)."""
+        deadline = time.monotonic() + SNAPSHOT_DEADLINE
+        on_time = True
+
+        if not tap.s3_key and tap.tap_id:
+            # Publish-first tap: the key arrives in the Pi's follow-up message
+            follow_up = TapPipeline._follow_up(tap.tap_id)
+            try:
+                tap.s3_key = follow_up.result(timeout=SNAPSHOT_DEADLINE)
+            except FutureTimeout:
+                print(f"[TapPipeline] Snapshot for {tap.uid} missed its {SNAPSHOT_DEADLINE}s deadline.")
+                on_time = False
+                try:
+                    tap.s3_key = follow_up.result(timeout=FOLLOW_UP_TIMEOUT)
+                except FutureTimeout:
+                    print(f"[TapPipeline] No snapshot received for tap {tap.tap_id}, logging without it.")
+                    LateSnapshots.remember(tap.tap_id, "AccessLog", "fob", event_id=tap.tap_id)
+            finally:
+                with TapPipeline._follow_ups_lock:
+                    TapPipeline._follow_ups.pop(tap.tap_id, None)
+
+        if not tap.s3_key:
+            return (None, on_time)
+
+        snapshot = None
+        download = TapPipeline._stages.submit(s3_download_to_memory, tap.s3_key, "fob")
+        try:
+            tap.snapshot_path, snapshot = download.result(timeout=max(deadline - time.monotonic(), 0) if on_time else None)
+        except FutureTimeout:
+            print(f"[TapPipeline] Snapshot for {tap.uid} missed its {SNAPSHOT_DEADLINE}s deadline.")
+            on_time = False
+            tap.snapshot_path, snapshot = download.result()
+
+        if snapshot is None and not tap.snapshot_path.startswith("error"):
+            # Too large for memory, so it was downloaded to disk instead
+            local_snapshot_path = os.path.join(IMAGE_DIR, os.path.basename(tap.snapshot_path))
+            if os.path.exists(local_snapshot_path):
+                snapshot = local_snapshot_path
+
+        return (snapshot, on_time)
+
+    @staticmethod
+    def _face_stage(tap: Tap, snapshot: bytes | str) -> str:
+        verification = TapPipeline._stages.submit(TapPipeline._verify_face, tap, snapshot)
+
+        try:
+            is_match = verification.result(timeout=FACE_DEADLINE)
+        except FutureTimeout:
+            # Fall back exactly as a Rekognition failure would, then act on the late verdict.
+            print(f"[TapPipeline] Face check for {tap.uid} missed its {FACE_DEADLINE}s deadline.")
+            TapPipeline._publish(tap, "granted_no_face", stage="follow_up")
+            is_match = verification.result()
+
+            if is_match:
+                # Verified after all: logged as a face grant, and the final decision replaces granted_no_face on the Pi
+                return "granted"
+            if FACE_MISMATCH_ACTION != tap.sent_access:
+                TapPipeline._publish(tap, FACE_MISMATCH_ACTION, stage="follow_up")
+            return FACE_MISMATCH_ACTION
+
+        if is_match:
+            return "granted"
+
+        TapPipeline._publish(tap, FACE_MISMATCH_ACTION, stage="follow_up")
+        return FACE_MISMATCH_ACTION
+
+    @staticmethod
+    def _verify_face(tap: Tap, snapshot: bytes | str) -> bool:
+        app_instance = HardwareService._app_instance
+
+        with app_instance.app_context():
+            from . import db
+            from .models import User, UserBooking
+
+            guests = []
+            if tap.booking_id:
+                # Every guest linked to the active Booking, primary guest first
+                guests = (
+                    db.session.query(User.id, User.photo_path)
+                    .join(UserBooking, User.id == UserBooking.user_id)
+                    .filter(UserBooking.booking_id == tap.booking_id)
+                    .order_by(UserBooking.is_primary_guest.desc(), UserBooking.id.asc())
+                    .all()
+                )
+
+        if guests:
+            tap.user_id = guests[0][0]
+
+        # Usually preloaded before the guest arrives, so no disk read here
+        candidates = []
+        for user_id, photo_path in guests:
+            if not photo_path:
+                continue
+            reference_bytes = FaceCache.get(user_id, photo_path)
+            if reference_bytes is None:
+                print(f"[TapPipeline] DB path found, but file not on disk: {resolve_reference_path(photo_path)}")
+                continue
+            candidates.append((user_id, reference_bytes))
+
+        if not candidates:
+            print(f"[TapPipeline] No User or photo_path linked to active booking {tap.booking_id}.")
+            return False
+
+        # One pass over all guests on the booking (a single vectorised scoring for the local backend)
+        is_match, matched_user_id, similarity = match_faces(snapshot, candidates)
+        if is_match:
+            tap.user_id = matched_user_id
+            tap.face_confidence = similarity
+        return is_match
+
+    @staticmethod
+    def _log(tap: Tap, access: str):
+        app_instance = HardwareService._app_instance
+
+        with app_instance.app_context():
+            from .models import Fob
+
+            fob_record = Fob.query.filter_by(uid=tap.uid).first()
+
+            # Buffered and bulk-inserted by the write-behind writer
+            EventWriter.add(
+                "AccessLog",
+                bnb_id=DOOR_BNB_ID,
+                raw_uid=tap.uid,
+                fob_id=fob_record.id if fob_record else None,
+                booking_id=tap.booking_id,
+                user_id=tap.user_id,
+                time_logged=tap.received_at,
+                match_result=access,
+                face_confidence=tap.face_confidence,
+                snapshot_path=tap.snapshot_path,
+                event_type="fob_tap",
+                event_id=tap.tap_id
+            )
+            print(f"[TapPipeline] LOGGED: Access {access} for UID {tap.uid}")
@@ -0,0 +1,133 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+# Access-log pages must cost the same number of queries whatever their size:
+# names, BnBs and fobs for the whole page are fetched together, not per row.
+
+LOG_COUNT = 60
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    monkeypatch.setenv("JWT_SECRET_KEY", "test-secret-key-at-least-32-bytes-long")
+    monkeypatch.setenv("WEBSITE_PATH", "http://localhost")
+    # Debug mode without the reloader keeps create_app from starting PubNub and the background services
+    monkeypatch.setenv("FLASK_DEBUG", "1")
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+
+    from Server import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def seeded(app):
+    """A host with three BnBs and LOG_COUNT logs, each with its own booking, guest and fob,
+    plus one booking whose LOG_COUNT logs each used a different fob."""
+    from Server import db
+    from Server.models import User, BnB, Booking, UserBooking, Fob, AccessLog
+
+    host = User(name="Host", email="host@example.com", role="host", password_hash="x")
+    db.session.add(host)
+    db.session.flush()
+
+    bnbs = [BnB(unique_code=f"BNB{i}", name=f"BnB {i}", host_id=host.id) for i in range(3)]
+    db.session.add_all(bnbs)
+    db.session.flush()
+
+    now = datetime.utcnow()
+    history_booking = Booking(bnb_id=bnbs[0].id, booking_code="HISTORY",
+                              check_in_time=now - timedelta(days=1), check_out_time=now + timedelta(days=1))
+    db.session.add(history_booking)
+    db.session.flush()
+
+    for i in range(LOG_COUNT):
+        bnb = bnbs[i % len(bnbs)]
+        guest = User(name=f"Guest {i}", email=f"guest{i}@example.com", password_hash="x")
+        booking = Booking(bnb_id=bnb.id, booking_code=f"BK{i}",
+                          check_in_time=now - timedelta(days=1), check_out_time=now + timedelta(days=1))
+        fob = Fob(uid=f"FOB{i:04d}", label=f"Fob {i}")
+        history_fob = Fob(uid=f"HIST{i:04d}", label=f"History fob {i}")
+        db.session.add_all([guest, booking, fob, history_fob])
+        db.session.flush()
+
+        db.session.add(UserBooking(user_id=guest.id, booking_id=booking.id, is_primary_guest=True))
+        db.session.add(AccessLog(bnb_id=bnb.id, raw_uid=fob.uid, fob_id=fob.id, booking_id=booking.id,
+                                 time_logged=now - timedelta(minutes=i), match_result="granted", event_type="fob"))
+        db.session.add(AccessLog(bnb_id=history_booking.bnb_id, raw_uid=history_fob.uid, fob_id=history_fob.id,
+                                 booking_id=history_booking.id, time_logged=now - timedelta(minutes=i),
+                                 match_result="denied", event_type="fob"))
+    db.session.commit()
+    return host.id
+
+
+def _statements_for(app, url, token):
+    """Number of SQL statements executed while serving one request, and the rows it returned."""
+    from Server import db
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        response = app.test_client().get(url, headers={"Authorization": f"Bearer {token}"})
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+    assert response.status_code == 200, response.get_json()
+    return len(statements), len(response.get_json())
+
+
+@pytest.mark.parametrize("url", [
+    "/host/access/logs",
+    "/guest/access/HISTORY/history",
+])
+def test_query_count_does_not_grow_with_page_size(app, seeded, url):
+    from flask_jwt_extended import create_access_token
+    token = create_access_token(identity=str(seeded))
+
+    small_count, small_rows = _statements_for(app, f"{url}?limit=5", token)
+    large_count, large_rows = _statements_for(app, f"{url}?limit=50", token)
+
+    assert (small_rows, large_rows) == (5, 50)
+    assert small_count == large_count
+
+
+def test_booking_history_is_unpaged_unless_asked(app, seeded):
+    from flask_jwt_extended import create_access_token
+    token = create_access_token(identity=str(seeded))
+
+    _, rows = _statements_for(app, "/guest/access/HISTORY/history", token)
+    _, paged_rows = _statements_for(app, "/guest/access/HISTORY/history?limit=10", token)
+
+    assert (rows, paged_rows) == (LOG_COUNT, 10)
+
+
+def test_logs_name_the_primary_guest(app, seeded):
+    from flask_jwt_extended import create_access_token
+    from Server import db
+    from Server.models import User, Booking, UserBooking
+
+    booking = Booking.query.filter_by(booking_code="HISTORY").one()
+    companion = User(name="Aaron Companion", email="companion@example.com", password_hash="x")
+    primary = User(name="Zoe Primary", email="primary@example.com", password_hash="x")
+    db.session.add_all([companion, primary])
+    db.session.flush()
+    db.session.add(UserBooking(user_id=companion.id, booking_id=booking.id, is_primary_guest=False))
+    db.session.add(UserBooking(user_id=primary.id, booking_id=booking.id, is_primary_guest=True))
+    db.session.commit()
+
+    token = create_access_token(identity=str(seeded))
+    response = app.test_client().get("/guest/access/HISTORY/history?limit=5",
+                                     headers={"Authorization": f"Bearer {token}"})
+
+    assert {log["user"] for log in response.get_json()} == {"Zoe Primary"}
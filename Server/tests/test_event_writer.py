@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+# A redelivered event (same event_id) is skipped, but any other bad row must
+# still fail the insert so it is retried or dead-lettered, not silently lost.
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    monkeypatch.setenv("JWT_SECRET_KEY", "test-secret-key-at-least-32-bytes-long")
+    monkeypatch.setenv("WEBSITE_PATH", "http://localhost")
+    # Debug mode without the reloader keeps create_app from starting PubNub and the background services
+    monkeypatch.setenv("FLASK_DEBUG", "1")
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+
+    from Server import create_app, db
+    from Server.models import User, BnB
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        host = User(name="Host", email="host@example.com", role="host", password_hash="x")
+        db.session.add(host)
+        db.session.flush()
+        db.session.add(BnB(unique_code="BNB", name="BnB", host_id=host.id))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _log(event_id, **row):
+    from Server.models import BnB
+    values = dict(bnb_id=BnB.query.one().id, raw_uid="AABB", time_logged=datetime(2026, 1, 1),
+                  match_result="granted", event_type="fob", event_id=event_id)
+    values.update(row)
+    return "AccessLog", values
+
+
+def test_redelivered_event_is_skipped(app):
+    from Server.event_writer import EventWriter
+    from Server.models import AccessLog
+
+    EventWriter._insert([_log("tap-1")])
+    EventWriter._insert([_log("tap-1"), _log("tap-2")])
+
+    assert sorted(log.event_id for log in AccessLog.query.all()) == ["tap-1", "tap-2"]
+
+
+def test_other_errors_are_not_ignored(app):
+    from Server.event_writer import EventWriter
+    from Server.models import AccessLog
+
+    with pytest.raises(IntegrityError):
+        EventWriter._insert([_log("tap-1", match_result=None)])
+
+    assert AccessLog.query.count() == 0
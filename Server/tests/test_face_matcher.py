@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from Server.face_matcher import LocalEmbeddingMatcher
+
+# The local backend runs fully offline: a stand-in embedder turns each
+# "image" (a few bytes) straight into its vector, so no model or AWS is needed.
+
+
+def embed(image: bytes):
+    return np.frombuffer(image, dtype=np.uint8).astype(np.float32)
+
+
+GUEST_A = bytes([200, 10, 10, 10])
+GUEST_B = bytes([10, 200, 10, 10])
+GUEST_C = bytes([10, 10, 200, 10])
+
+
+@pytest.fixture()
+def matcher(tmp_path):
+    matcher = LocalEmbeddingMatcher(embed, embeddings_path=str(tmp_path / "embeddings.npz"), threshold=0.9)
+    for user_id, reference in ((1, GUEST_A), (2, GUEST_B), (3, GUEST_C)):
+        matcher.enroll(user_id, reference)
+    return matcher
+
+
+def test_matches_the_closest_guest(matcher):
+    candidates = [(1, GUEST_A), (2, GUEST_B), (3, GUEST_C)]
+
+    is_match, user_id, similarity = matcher.match(bytes([12, 190, 15, 10]), candidates)
+
+    assert (is_match, user_id) == (True, 2)
+    assert similarity > 90
+
+
+def test_no_match_below_threshold(matcher):
+    is_match, user_id, similarity = matcher.match(bytes([100, 100, 100, 100]), [(1, GUEST_A), (2, GUEST_B)])
+
+    assert (is_match, user_id) == (False, None)
+    assert similarity < 90
+
+
+def test_only_the_booking_candidates_are_scored(matcher):
+    is_match, user_id, _ = matcher.match(GUEST_C, [(1, GUEST_A), (2, GUEST_B)])
+
+    assert (is_match, user_id) == (False, None)
+
+
+def test_verification_does_not_enroll(matcher):
+    new_reference = bytes([10, 10, 10, 200])
+    changed_reference = bytes([150, 150, 10, 10])
+
+    assert matcher.match(new_reference, [(4, new_reference)])[:2] == (True, 4)
+    assert matcher.match(changed_reference, [(1, changed_reference)])[:2] == (True, 1)
+
+    assert 4 not in matcher._rows
+    # The stored embedding for guest 1 is still the enrolled photo
+    assert matcher.match(GUEST_A, [(1, GUEST_A)])[:2] == (True, 1)
+    assert matcher.stats()["matches"] == 3
+
+
+def test_embeddings_survive_a_restart(matcher, tmp_path):
+    embedded = []
+
+    def counting_embed(image):
+        embedded.append(image)
+        return embed(image)
+
+    reloaded = LocalEmbeddingMatcher(counting_embed, embeddings_path=str(tmp_path / "embeddings.npz"), threshold=0.9)
+
+    assert reloaded.match(GUEST_B, [(1, GUEST_A), (2, GUEST_B)])[:2] == (True, 2)
+    # Only the snapshot was embedded; the references came from the saved matrix
+    assert embedded == [GUEST_B]
@@ -0,0 +1,68 @@
+import pytest
+
+# Diagnostics live in each worker's memory and only the leader handles the Pi,
+# so a standby worker refuses to answer rather than report empty counters.
+
+
+@pytest.fixture()
+def app(monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", "sqlite://")
+    monkeypatch.setenv("JWT_SECRET_KEY", "test-secret-key-at-least-32-bytes-long")
+    monkeypatch.setenv("WEBSITE_PATH", "http://localhost")
+    # Debug mode without the reloader keeps create_app from starting PubNub and the background services
+    monkeypatch.setenv("FLASK_DEBUG", "1")
+    monkeypatch.delenv("WERKZEUG_RUN_MAIN", raising=False)
+
+    from Server import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture()
+def tokens(app):
+    from flask_jwt_extended import create_access_token
+    from Server import db
+    from Server.models import User
+
+    admin = User(name="Admin", email="admin@example.com", role="admin", password_hash="x")
+    host = User(name="Host", email="host@example.com", role="host", password_hash="x")
+    db.session.add_all([admin, host])
+    db.session.commit()
+    return {user.role: {"Authorization": f"Bearer {create_access_token(identity=str(user.id))}"}
+            for user in (admin, host)}
+
+
+@pytest.mark.parametrize("url", ["/metrics", "/hardware/latency", "/hardware/traces", "/hardware/fob_index"])
+def test_diagnostics_need_an_admin(app, tokens, url):
+    client = app.test_client()
+
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=tokens["host"]).status_code == 403
+    assert client.get(url, headers=tokens["admin"]).status_code == 200
+
+
+@pytest.mark.parametrize("url", ["/metrics", "/hardware/traces", "/hardware/dispatcher", "/hardware/fob_index"])
+def test_standby_worker_does_not_serve_diagnostics(app, tokens, monkeypatch, url):
+    from Server.hardware_service import HardwareService
+    monkeypatch.setattr(HardwareService, "_app_instance", app)
+    monkeypatch.setattr(HardwareService, "_leader_lock", None)
+
+    response = app.test_client().get(url, headers=tokens["admin"])
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+def test_leader_route_answers_on_every_worker(app, tokens, monkeypatch):
+    from Server.hardware_service import HardwareService
+    monkeypatch.setattr(HardwareService, "_app_instance", app)
+    monkeypatch.setattr(HardwareService, "_leader_lock", None)
+
+    response = app.test_client().get("/hardware/leader", headers=tokens["admin"])
+
+    assert response.status_code == 200
+    assert response.get_json()["leader"] is False
@@ -0,0 +1,202 @@
+import os
+import json
+import threading
+from collections import OrderedDict
+
+# ------------------------------------------------------
+# Configuration & Constants
+# ------------------------------------------------------
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "1") == "1"
+TRACE_MAX_MB = float(os.getenv("TRACE_MAX_MB", "50"))
+TRACE_CACHE_SIZE = int(os.getenv("TRACE_CACHE_SIZE", "2000"))
+
+BASE_DIR = os.path.dirname(__file__)
+SPOOL_DIR = os.path.join(BASE_DIR, "spool")
+TRACE_PATH = os.path.join(SPOOL_DIR, "traces.jsonl")
+ROTATED_PATH = TRACE_PATH + ".1"
+
+# Pi effects that mean the door was unlocked
+UNLOCK_SPANS = ("effect_granted", "effect_granted_no_face")
+# Server spans covering several stages; left out when picking the slowest hop
+AGGREGATE_SPANS = ("tap_total", "tap_to_decision")
+
+
+# ------------------------------------------------------
+# Tap Trace Store
+# ------------------------------------------------------
+class TraceStore:
+    """
+    Stores the spans of each tap, from the Pi and from the server, keyed by
+    the tap_id, as compact JSONL: one line per batch of spans,
+    {"id", "source", "t0", "spans": [[name, start_ms, duration_ms(, outcome)], ...]}
+    with t0 the wall-clock anchor the span offsets count from.
+
+    The file is rotated once at TRACE_MAX_MB; recent traces are also kept in
+    memory (TRACE_CACHE_SIZE) so lookups rarely read the file. timeline()
+    merges the batches into one tap-to-unlock timeline on the Pi's clock.
+    """
+    _lock = threading.Lock()
+    _cache = OrderedDict()      # trace id -> [record, ...]
+    _file = None
+
+    _records = 0
+    _write_errors = 0
+
+    @staticmethod
+    def record(trace_id: str | None, source: str, t0: float, spans: list):
+        if not TRACE_ENABLED or not trace_id:
+            return
+
+        entry = {"id": trace_id, "source": source, "t0": t0, "spans": spans}
+        line = json.dumps(entry, separators=(",", ":"))
+
+        with TraceStore._lock:
+            TraceStore._cache.setdefault(trace_id, []).append(entry)
+            TraceStore._cache.move_to_end(trace_id)
+            while len(TraceStore._cache) > TRACE_CACHE_SIZE:
+                TraceStore._cache.popitem(last=False)
+
+            try:
+                TraceStore._append(line)
+                TraceStore._records += 1
+            except OSError as e:
+                TraceStore._write_errors += 1
+                print(f"[TraceStore] ERROR writing trace {trace_id}: {e}")
+
+    @staticmethod
+    def record_pi(trace: dict):
+        """Spans the Pi attached to a message as {"id", "t0", "spans"}."""
+        if isinstance(trace, dict) and trace.get("t0") is not None:
+            TraceStore.record(trace.get("id"), "pi", trace["t0"], trace.get("spans") or [])
+
+    @staticmethod
+    def _append(line: str):
+        """Caller holds _lock."""
+        if TraceStore._file is None:
+            os.makedirs(SPOOL_DIR, exist_ok=True)
+            TraceStore._file = open(TRACE_PATH, "a")
+
+        TraceStore._file.write(line + "\n")
+        TraceStore._file.flush()
+
+        if TraceStore._file.tell() > TRACE_MAX_MB * 1024 * 1024:
+            TraceStore._file.close()
+            os.replace(TRACE_PATH, ROTATED_PATH)
+            TraceStore._file = open(TRACE_PATH, "a")
+
+    @staticmethod
+    def _records_for(trace_id: str) -> list:
+        with TraceStore._lock:
+            cached = TraceStore._cache.get(trace_id)
+            if cached is not None:
+                return list(cached)
+
+        found = []
+        for path in (ROTATED_PATH, TRACE_PATH):
+            if not os.path.exists(path):
+                continue
+            needle = f'"id":"{trace_id}"'
+            with open(path) as traces:
+                for line in traces:
+                    if needle not in line:
+                        continue
+                    try:
+                        found.append(json.loads(line))
+                    except ValueError:
+                        continue
+        return found
+
+    @staticmethod
+    def timeline(trace_id: str) -> dict | None:
+        """
+        The tap's spans on one axis, in ms after the card was read. Server
+        spans are placed using the round trip the Pi saw (publish to first
+        decision) minus the server's own time, split evenly each way; without
+        a round trip (e.g. a local allow-list grant) the wall clocks are used.
+        """
+        records = TraceStore._records_for(trace_id)
+        if not records:
+            return None
+
+        pi = [r for r in records if r["source"] == "pi"]
+        server = [r for r in records if r["source"] == "server"]
+        pi_t0 = pi[0]["t0"] if pi else None
+
+        spans = []
+        for record in pi:
+            shift = (record["t0"] - pi_t0) * 1000
+            spans += [_span("pi", s, shift) for s in record["spans"]]
+
+        alignment, one_way_ms, server_shift = "server_only", None, 0.0
+        if server and pi_t0 is not None:
+            server_t0 = server[0]["t0"]
+            publish = next((s for s in spans if s["name"] == "publish"), None)
+            decision = min((s["start_ms"] for s in spans if s["name"].startswith("decision_")), default=None)
+            server_publish = min(
+                (s[1] + s[2] for r in server for s in r["spans"] if s[0].startswith("publish_")), default=None
+            )
+            if publish and decision is not None and server_publish is not None:
+                one_way_ms = max((decision - publish["start_ms"] - server_publish) / 2, 0.0)
+                server_shift = publish["start_ms"] + one_way_ms
+                alignment = "round_trip"
+            else:
+                server_shift = (server_t0 - pi_t0) * 1000
+                alignment = "wall_clock"
+
+        for record in server:
+            shift = server_shift + (record["t0"] - server[0]["t0"]) * 1000
+            spans += [_span("server", s, shift) for s in record["spans"]]
+
+        spans.sort(key=lambda s: (s["start_ms"], s["source"]))
+        unlocked = [s["end_ms"] for s in spans if s["source"] == "pi" and s["name"] in UNLOCK_SPANS]
+        slowest = max((s for s in spans if s["name"] not in AGGREGATE_SPANS), key=lambda s: s["duration_ms"], default=None)
+
+        return {
+            "trace_id": trace_id,
+            "alignment": alignment,
+            "network_one_way_ms": round(one_way_ms, 1) if one_way_ms is not None else None,
+            "tap_to_unlock_ms": min(unlocked) if unlocked else None,
+            "slowest_span": f"{slowest['source']}:{slowest['name']}" if slowest else None,
+            "spans": spans,
+        }
+
+    @staticmethod
+    def recent(limit: int = 50) -> list:
+        """Newest cached traces first, with their tap-to-unlock time."""
+        with TraceStore._lock:
+            trace_ids = list(reversed(TraceStore._cache.keys()))[:limit]
+        summaries = []
+        for trace_id in trace_ids:
+            timeline = TraceStore.timeline(trace_id)
+            if timeline:
+                summaries.append({
+                    "trace_id": trace_id,
+                    "tap_to_unlock_ms": timeline["tap_to_unlock_ms"],
+                    "slowest_span": timeline["slowest_span"],
+                    "spans": len(timeline["spans"]),
+                })
+        return summaries
+
+    @staticmethod
+    def stats() -> dict:
+        with TraceStore._lock:
+            return {
+                "enabled": TRACE_ENABLED,
+                "cached_traces": len(TraceStore._cache),
+                "records_written": TraceStore._records,
+                "write_errors": TraceStore._write_errors,
+            }
+
+
+def _span(source: str, span: list, shift_ms: float) -> dict:
+    name, start_ms, duration_ms = span[0], span[1] + shift_ms, span[2]
+    entry = {
+        "source": source,
+        "name": name,
+        "start_ms": round(start_ms, 1),
+        "duration_ms": duration_ms,
+        "end_ms": round(start_ms + duration_ms, 1),
+    }
+    if len(span) > 3:
+        entry["outcome"] = span[3]
+    return entry